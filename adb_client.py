@@ -0,0 +1,395 @@
+import os
+import re
+import time
+import socket
+import subprocess
+import threading
+import logging
+import uuid
+
+ADB_HOST = os.environ.get("ADB_SERVER_HOST", "127.0.0.1")
+ADB_PORT = int(os.environ.get("ADB_SERVER_PORT", "5037"))
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+getprop_line = re.compile(r'^\[([^\]]+)\]: \[(.*)\]$')
+# Sortie de 'date +%s.%N' (toybox) ; sans %N, seules les secondes sont lues
+device_time_line = re.compile(r'(\d{9,})(?:\.(\d+))?')
+# Boucle côté box : rend la main quand la box a redémarré (boot_id différent) et fini de démarrer,
+# puis donne l'heure de la box à cet instant
+boot_wait_script = (
+    'while [ "$(cat {boot_id_path})" = "{boot_id}" ] || [ "$(getprop sys.boot_completed)" != "1" ]; '
+    'do sleep {interval}; done; date +%s.%N'
+)
+
+
+class AdbError(Exception):
+    """ Erreur renvoyée par le serveur adb (FAIL) ou connexion perdue. """
+
+
+class AdbConnectionLost(AdbError):
+    """ La connexion avec le serveur ou la box a été fermée en cours de commande. """
+
+
+def device_serial(ip, port=5555):
+    """ Numéro de série adb d'une box joignable en TCP ('ip' ou 'ip:port'). """
+    return ip if ':' in ip else f"{ip}:{port}"
+
+
+def parse_getprop(output):
+    """ Sortie de 'getprop' ([clé]: [valeur] par ligne) -> dict. """
+    properties = {}
+    for line in output.splitlines():
+        match = getprop_line.match(line.strip())
+        if match:
+            properties[match.group(1)] = match.group(2)
+    return properties
+
+
+def parse_device_time(output):
+    """ Epoch (float) de la dernière heure 'date +%s.%N' de la sortie, None si absente. """
+    matches = device_time_line.findall(output)
+    if not matches:
+        return None
+    seconds, fraction = matches[-1]
+    return float(f"{seconds}.{fraction}") if fraction else float(seconds)
+
+
+def _recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise AdbConnectionLost("connexion fermée par le serveur adb")
+        data += chunk
+    return data
+
+
+def _send_request(sock, request):
+    payload = request.encode()
+    sock.sendall(b'%04x' % len(payload) + payload)
+
+
+def _read_status(sock):
+    status = _recv_exact(sock, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        raise AdbError(_read_length_prefixed(sock))
+    raise AdbError(f"réponse adb inattendue : {status!r}")
+
+
+def _read_length_prefixed(sock):
+    length = int(_recv_exact(sock, 4), 16)
+    return _recv_exact(sock, length).decode(errors='replace')
+
+
+def _read_to_end(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+class ShellSession:
+    """
+    Shell 'sh' persistant sur une box : une seule connexion transport pour
+    une suite de commandes. Chaque commande est suivie d'un marqueur unique
+    portant son code de retour, qui délimite sa sortie.
+    """
+
+    def __init__(self, sock, serial):
+        self.sock = sock
+        self.serial = serial
+        self.marker = f"__adb_end_{uuid.uuid4().hex}__"
+        self._buffer = b''
+
+    def run(self, command, timeout=None):
+        """ Exécute la commande et retourne (sortie, code_retour). """
+        self.sock.settimeout(timeout)
+        # stderr écarté comme la sortie capturée par 'adb shell' (stdout seul)
+        self.sock.sendall(f"{{ {command}; }} 2>/dev/null; echo {self.marker} $?\n".encode())
+        marker = self.marker.encode()
+        while True:
+            position = self._buffer.find(marker)
+            if position != -1:
+                end = self._buffer.find(b'\n', position)
+                if end != -1:
+                    break
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise AdbConnectionLost(f"session shell fermée sur {self.serial}")
+            self._buffer += chunk
+
+        output = self._buffer[:position].decode(errors='replace')
+        status = self._buffer[position + len(marker):end].strip()
+        self._buffer = self._buffer[end + 1:]
+        return output, int(status) if status.lstrip(b'-').isdigit() else None
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class AdbClient:
+    """
+    Client du serveur adb parlant directement son protocole sur socket
+    (host:*, host:transport, shell:, exec:, reboot:), sans lancer le binaire
+    adb à chaque appel. Les commandes shell passent par des sessions 'sh'
+    persistantes, jusqu'à max_sessions par box utilisées en parallèle.
+    """
+
+    def __init__(self, host=ADB_HOST, port=ADB_PORT, timeout=10, max_sessions=4):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self._sessions = {}  # serial -> sessions libres
+        self._opened = {}  # serial -> nombre de sessions ouvertes
+        self._condition = threading.Condition()
+        self._server_started = False
+        self._properties = {}  # serial -> (boot_id, propriétés) de la session en cours
+
+    def _connect(self, timeout=None):
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=timeout or self.timeout)
+        except ConnectionRefusedError:
+            if self._server_started:
+                raise
+            # Même comportement que le binaire : démarrage du serveur à la demande
+            logging.debug("serveur adb absent, lancement de 'adb start-server'")
+            subprocess.run(['adb', 'start-server'], capture_output=True)
+            self._server_started = True
+            sock = socket.create_connection((self.host, self.port), timeout=timeout or self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def host_command(self, request, timeout=None):
+        """ Requête 'host:' qui retourne une chaîne préfixée par sa longueur. """
+        with self._connect(timeout) as sock:
+            _send_request(sock, request)
+            _read_status(sock)
+            return _read_length_prefixed(sock)
+
+    def transport(self, serial, timeout=None):
+        """ Socket relié à la box, prêt à recevoir une requête de service. """
+        sock = self._connect(timeout)
+        try:
+            _send_request(sock, f"host:transport:{serial}")
+            _read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def open_stream(self, serial, service, timeout=None):
+        """ Ouvre un service longue durée (ex. 'shell:logcat') et retourne le socket. """
+        sock = self.transport(serial, timeout)
+        try:
+            _send_request(sock, service)
+            _read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+
+    def version(self):
+        return int(self.host_command("host:version"), 16)
+
+    def devices(self):
+        """ {serial: état} des box connues du serveur. """
+        devices = {}
+        for line in self.host_command("host:devices").splitlines():
+            if '\t' in line:
+                serial, state = line.split('\t', 1)
+                devices[serial] = state
+        return devices
+
+    def connect(self, ip, port=5555):
+        """ Retourne le message du serveur ('connected to ...', 'failed to ...'). """
+        return self.host_command(f"host:connect:{ip}:{port}", timeout=30)
+
+    def disconnect(self, serial):
+        self.close_sessions(serial)
+        self.invalidate_properties(serial)
+        return self.host_command(f"host:disconnect:{serial}")
+
+    def get_state(self, serial):
+        return self.host_command(f"host-serial:{serial}:get-state")
+
+    def wait_for_device(self, serial, timeout=None):
+        """
+        Bloque (côté serveur, sans polling) jusqu'à ce que la box soit en
+        ligne, au plus timeout secondes (sans limite si None).
+        """
+        # Connexion au serveur bornée par self.timeout ; l'attente de la box, par timeout seul
+        with self._connect() as sock:
+            sock.settimeout(timeout)
+            _send_request(sock, f"host-serial:{serial}:wait-for-any-device")
+            _read_status(sock)
+            # Deuxième OKAY quand la box est effectivement disponible
+            _read_status(sock)
+
+    def _acquire_session(self, serial):
+        with self._condition:
+            while True:
+                idle = self._sessions.setdefault(serial, [])
+                if idle:
+                    return idle.pop()
+                if self._opened.get(serial, 0) < self.max_sessions:
+                    self._opened[serial] = self._opened.get(serial, 0) + 1
+                    break
+                self._condition.wait()
+
+        try:
+            sock = self.transport(serial)
+            _send_request(sock, "shell:sh")
+            _read_status(sock)
+        except Exception:
+            self._discard_session(serial, None)
+            raise
+        return ShellSession(sock, serial)
+
+    def _release_session(self, session):
+        with self._condition:
+            self._sessions.setdefault(session.serial, []).append(session)
+            self._condition.notify()
+
+    def _discard_session(self, serial, session):
+        if session is not None:
+            session.close()
+        with self._condition:
+            self._opened[serial] = max(0, self._opened.get(serial, 0) - 1)
+            self._condition.notify()
+
+    def close_sessions(self, serial=None):
+        """ Ferme les sessions persistantes (d'une box, ou de toutes). """
+        with self._condition:
+            serials = [serial] if serial else list(self._sessions)
+            for s in serials:
+                for session in self._sessions.pop(s, []):
+                    session.close()
+                    self._opened[s] = max(0, self._opened.get(s, 0) - 1)
+            self._condition.notify_all()
+
+    def run(self, serial, command, timeout=None):
+        """ Exécute une commande shell et retourne (sortie, code_retour). """
+        for attempt in (1, 2):
+            session = self._acquire_session(serial)
+            try:
+                result = session.run(command, timeout or self.timeout)
+            except AdbConnectionLost:
+                # Session périmée (reboot, déconnexion) : les autres sessions et les propriétés
+                # en cache le sont aussi, nouvelle tentative avec une session neuve
+                self._discard_session(serial, session)
+                self.close_sessions(serial)
+                self.invalidate_properties(serial)
+                if attempt == 2:
+                    raise
+                continue
+            except (OSError, ValueError) as e:
+                self._discard_session(serial, session)
+                raise AdbError(f"commande '{command}' sur {serial} : {e}") from e
+            self._release_session(session)
+            return result
+
+    def shell(self, serial, command, timeout=None):
+        """ Sortie standard d'une commande shell. """
+        return self.run(serial, command, timeout)[0]
+
+    def exec_out(self, serial, command, timeout=None):
+        """ Sortie binaire brute d'une commande (service exec:), ex. screencap. """
+        with self.transport(serial, timeout) as sock:
+            _send_request(sock, f"exec:{command}")
+            _read_status(sock)
+            return _read_to_end(sock)
+
+    def properties(self, serial, refresh=False, check_boot=False):
+        """
+        Propriétés système de la box, lues en un seul appel 'getprop' et
+        gardées pour la session. Le cache est invalidé au reboot, à la
+        déconnexion ou à la perte de session ; check_boot compare en plus le
+        boot_id de la box (un aller-retour) pour détecter un reboot externe.
+        Une box qui n'a pas fini de démarrer n'est pas mise en cache.
+        """
+        with self._condition:
+            cached = self._properties.get(serial)
+        if cached is not None and not refresh:
+            if not check_boot or self.shell(serial, f"cat {BOOT_ID_PATH}").strip() == cached[0]:
+                return dict(cached[1])
+
+        output = self.shell(serial, f"cat {BOOT_ID_PATH}; getprop")
+        boot_id, _, getprop_output = output.partition('\n')
+        properties = parse_getprop(getprop_output)
+        if properties.get("sys.boot_completed") == "1":
+            with self._condition:
+                self._properties[serial] = (boot_id.strip(), properties)
+        else:
+            self.invalidate_properties(serial)
+        return dict(properties)
+
+    def invalidate_properties(self, serial=None):
+        with self._condition:
+            if serial is None:
+                self._properties.clear()
+            else:
+                self._properties.pop(serial, None)
+
+    def boot_id(self, serial):
+        return self.shell(serial, f"cat {BOOT_ID_PATH}").strip()
+
+    def wait_for_boot_completed(self, serial, timeout=None, previous_boot_id="", interval=0.1):
+        """
+        Attend la fin du démarrage (sys.boot_completed=1) sans polling côté
+        PC : wait-for-device bloquant sur le serveur adb, puis une boucle
+        getprop sur la box (toutes les interval secondes) dans un flux shell
+        qui ne répond qu'à la fin du démarrage. Avec previous_boot_id, le
+        démarrage attendu est celui d'après le reboot, même si la box n'est
+        pas encore tombée. Retourne l'heure (epoch, horloge de la box) de fin
+        du démarrage, ou None après timeout secondes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        script = boot_wait_script.format(boot_id_path=BOOT_ID_PATH, boot_id=previous_boot_id, interval=interval)
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                self.wait_for_device(serial, remaining)
+                with self.open_stream(serial, "shell:" + script, remaining) as stream:
+                    stream.settimeout(remaining)
+                    completed = parse_device_time(_read_to_end(stream).decode(errors='replace'))
+                if completed is not None:
+                    return completed
+                # Flux fermé avant la fin du démarrage (nouveau reboot, lien adb perdu)
+            except (AdbError, OSError) as e:
+                logging.debug(f"attente du démarrage de {serial} interrompue : {e}")
+            # Box en cours de redémarrage : nouvelle tentative après une courte pause
+            time.sleep(0.5 if remaining is None else max(0, min(0.5, deadline - time.monotonic())))
+
+    def clock_offset(self, serial):
+        """ Avance (s) de l'horloge de la box sur celle du PC, à la demi-durée d'aller-retour près. """
+        sent = time.time()
+        device_time = parse_device_time(self.shell(serial, "date +%s.%N"))
+        received = time.time()
+        if device_time is None:
+            raise AdbError(f"heure de {serial} illisible")
+        return device_time - (sent + received) / 2
+
+    def reboot(self, serial, mode=""):
+        self.close_sessions(serial)
+        self.invalidate_properties(serial)
+        with self.transport(serial) as sock:
+            _send_request(sock, f"reboot:{mode}")
+            _read_status(sock)
+            try:
+                _read_to_end(sock)
+            except OSError:
+                pass
+
+
+# Client partagé par le processus
+adb = AdbClient()
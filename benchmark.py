@@ -0,0 +1,291 @@
+"""
+Banc de mesure des chemins chauds de détection, sur les vidéos et frames
+synthétiques de synthetic.py (aucune box ni carte de capture nécessaire).
+
+Pour chaque détecteur : latence par frame (p50, p90, p99, max), débit en
+frames/s et pic mémoire (allocations Python et numpy, tracemalloc, mesuré
+dans une passe séparée pour ne pas fausser les temps). Pour les vidéos
+complètes : durée d'analyse, débit et écart à la vérité terrain.
+
+    python3 benchmark.py --save bench.json                  # référence
+    python3 benchmark.py --baseline bench.json --tolerance 0.2  # code 1 si régression
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import resource
+import logging
+import synthetic
+
+# Passe mémoire limitée à quelques frames
+memory_frames = 20
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(name, latencies, frames, elapsed, peak_memory, **extra):
+    latencies = sorted(latencies)
+    result = {
+        "name": name,
+        "calls": len(latencies),
+        "frames": frames,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "peak_mb": peak_memory / 2 ** 20,
+    }
+    result.update(extra)
+    return result
+
+
+def peak_memory_of(func, items):
+    tracemalloc.start()
+    try:
+        for item in items:
+            func(item)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def cycle(frames, count):
+    """ count références prises en boucle dans frames (sans copie : peu de frames 1080p en mémoire). """
+    return [frames[i % len(frames)] for i in range(count)]
+
+
+def bench_frames(name, func, frames, warmup=3, setup=None):
+    """
+    func(frame) appelée sur chaque frame de la liste. setup() remet l'état
+    du détecteur à zéro avant chaque passe.
+    """
+    if setup:
+        setup()
+    for frame in frames[:warmup]:
+        func(frame)
+
+    if setup:
+        setup()
+    latencies = []
+    start = time.perf_counter()
+    for frame in frames:
+        t0 = time.perf_counter()
+        func(frame)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    if setup:
+        setup()
+    peak = peak_memory_of(func, frames[:memory_frames])
+    return summarize(name, latencies, len(frames), elapsed, peak)
+
+
+def bench_file(name, func, frames, expected=None, repeat=1):
+    """ func() analyse une vidéo complète de frames frames ; retourne la valeur mesurée. """
+    latencies = []
+    measured = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        measured = func()
+        latencies.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Débit d'une analyse, sur la durée médiane
+    elapsed = sorted(latencies)[len(latencies) // 2]
+    extra = {"measured": measured, "expected": expected}
+    if isinstance(measured, (int, float)) and expected is not None:
+        extra["error_s"] = round(measured - expected, 3)
+    return summarize(name, latencies, frames, elapsed, peak, **extra)
+
+
+def zap_benchmarks(frame_count):
+    import zap2
+    from ocr import ocr_engine
+
+    def reset():
+        zap2.detect_stream.active = False
+        zap2.detect_stream.frames_after_detection = 0
+
+    stream_time = 1.0
+    duration = max(frame_count / synthetic.default_fps, 2.0)
+    zap = [zap2.zap_layout.extract(frame) for _, frame, _ in
+           synthetic.zap_frames(duration=duration, logo_time=0.5, stream_time=stream_time)]
+    logo = zap[len(zap) // 4:len(zap) // 4 + 1] * frame_count
+    error = [zap2.zap_layout.extract(synthetic.error_frame())] * frame_count
+
+    results = [bench_frames("zap2.detect_logo", zap2.detect_logo, logo)]
+
+    # Vérité terrain : le flux doit être trouvé peu après stream_time
+    reset()
+    detected = next((index for index, frame in enumerate(zap) if zap2.detect_zap(frame) == "flux"), None)
+    result = bench_frames("zap2.detect_zap", zap2.detect_zap, zap, setup=reset)
+    result.update(measured=None if detected is None else round(detected / synthetic.default_fps, 3),
+                  expected=stream_time)
+    results.append(result)
+
+    try:
+        # Cache OCR vidé à chaque passe : une lecture tesseract, puis l'écran inchangé repris du cache
+        results.append(bench_frames("zap2.detect_error", zap2.detect_error, error, setup=ocr_engine.clear))
+    except Exception as e:
+        # OCR indisponible (tesseract absent)
+        logging.warning(f"zap2.detect_error non mesuré : {e}")
+    return results
+
+
+def reboot_benchmarks(frame_count, workdir, repeat=3):
+    import script_reboot
+    from video_analysis import analyze_video, LogoDetector, StreamDetector
+
+    logo_time, stream_time = 2.0, 4.0
+    distinct = [frame for index, frame, _ in synthetic.boot_frames(duration=2.0, logo_time=0.0, stream_time=1.0)
+                if index % 6 == 0]
+    frames = cycle(distinct, frame_count)
+    results = [bench_frames("script_reboot.compare_images",
+                            lambda frame: script_reboot.compare_images(frame, script_reboot.reference_image_path),
+                            frames)]
+
+    video = os.path.join(workdir, "boot.mp4")
+    count = synthetic.write_video(video, synthetic.boot_frames(duration=8.0, logo_time=logo_time,
+                                                               stream_time=stream_time))
+    results.append(bench_file("detect_logo_in_video", lambda: script_reboot.detect_logo_in_video(video),
+                              count, logo_time, repeat))
+    results.append(bench_file("detect_logo_in_video (grossier/fin)",
+                              lambda: script_reboot.detect_logo_in_video(video, coarse_to_fine=True),
+                              count, logo_time, repeat))
+    results.append(bench_file("detect_stream_from_video",
+                              lambda: script_reboot.detect_stream_from_video(video, *synthetic.reboot_stream_region)[1],
+                              count, stream_time, repeat))
+
+    def single_pass():
+        logo = LogoDetector(lambda frame: script_reboot.compare_images(frame, script_reboot.reference_image_path))
+        stream = StreamDetector(*synthetic.reboot_stream_region, after=logo)
+        events = analyze_video(video, [logo, stream])
+        return round(events["flux"][0][2], 2) if events and events["flux"] else None
+
+    results.append(bench_file("analyze_video (logo + flux)", single_pass, count, stream_time, repeat))
+    return results
+
+
+def save_frame_benchmark(frame_count, workdir):
+    import zap_functions
+    from blackscreen import BlackScreenMonitor
+
+    if shutil.which("ffmpeg") is None:
+        logging.warning("zap_functions.save_frame non mesuré : ffmpeg introuvable")
+        return []
+    distinct = [frame for index, frame, _ in synthetic.zap_frames(duration=2.0) if index % 3 == 0]
+    frames = cycle(distinct, frame_count)
+    height, width = frames[0].shape[:2]
+    with open(os.path.join(workdir, "blackscreen.log"), 'a') as log_f:
+        # Même ordre que les scripts (cap.get(3), cap.get(4)) : largeur puis hauteur
+        ffmpeg_process = zap_functions.setup_ffmpeg(width, height, synthetic.default_fps,
+                                                    os.path.join(workdir, "save_frame.mp4"))
+        black_monitor = BlackScreenMonitor(log_f, []).start()
+        try:
+            result = bench_frames("zap_functions.save_frame",
+                                  lambda frame: zap_functions.save_frame(frame, ffmpeg_process, black_monitor),
+                                  frames)
+        finally:
+            black_monitor.stop()
+            encoder_stats = zap_functions.close_ffmpeg(ffmpeg_process)
+    result["encoder"] = zap_functions.format_encoder_stats(encoder_stats)
+    return [result]
+
+
+def run(frame_count=150, repeat=3):
+    with tempfile.TemporaryDirectory(prefix="ivs_bench_") as workdir:
+        results = []
+        results += zap_benchmarks(frame_count)
+        results += reboot_benchmarks(frame_count, workdir, repeat)
+        results += save_frame_benchmark(frame_count, workdir)
+    return {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "frames": frame_count,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "results": results,
+    }
+
+
+def print_report(report):
+    print(f"{'mesure':<38} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'frames/s':>9} {'pic Mo':>7}  vérité")
+    for r in report["results"]:
+        truth = ""
+        if "expected" in r:
+            truth = f"{r['measured']} (attendu {r['expected']})"
+        print(f"{r['name']:<38} {r['p50_ms']:8.2f} {r['p90_ms']:8.2f} {r['p99_ms']:8.2f} {r['max_ms']:8.2f} "
+              f"{r['fps']:9.1f} {r['peak_mb']:7.1f}  {truth}")
+    print(f"RSS maximale du processus : {report['max_rss_mb']:.0f} Mo")
+
+
+def compare(report, baseline, tolerance, min_delta_ms=0.1):
+    """
+    Mesures dont la latence p50 ou le débit se dégradent de plus de
+    tolerance (et d'au moins min_delta_ms, sous lequel c'est du bruit), ou
+    dont le résultat de détection change.
+    """
+    previous = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for r in report["results"]:
+        old = previous.get(r["name"])
+        if old is None:
+            continue
+        slower = r["p50_ms"] - old["p50_ms"] >= min_delta_ms
+        if slower and r["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{r['name']} : p50 {old['p50_ms']:.2f} -> {r['p50_ms']:.2f} ms")
+        if slower and r["fps"] < old["fps"] * (1 - tolerance):
+            regressions.append(f"{r['name']} : {old['fps']:.1f} -> {r['fps']:.1f} frames/s")
+        if old.get("measured") != r.get("measured"):
+            regressions.append(f"{r['name']} : résultat {old.get('measured')} -> {r.get('measured')}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de mesure des détecteurs sur vidéos synthétiques")
+    parser.add_argument("--frames", type=int, default=150, help="frames par mesure de détecteur")
+    parser.add_argument("--save", help="écrit les résultats (JSON)")
+    parser.add_argument("--baseline", help="résultats de référence (JSON) à comparer")
+    parser.add_argument("--repeat", type=int, default=3, help="analyses de chaque vidéo complète")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    # Templates (ref.png) relatifs au dossier des scripts, comme pour les tests sur banc
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # Importé avant le réglage du niveau : zap_functions configure le logging à l'import
+    import zap_functions  # noqa: F401
+    logging.getLogger().setLevel(args.log_level)
+
+    report = run(args.frames, args.repeat)
+    print_report(report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"RÉGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
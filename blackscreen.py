@@ -0,0 +1,131 @@
+import time
+import queue
+import threading
+import logging
+from datetime import datetime
+import cv2
+import numpy as np
+from segments import report_incident
+
+
+def luma_sample(frame, step=16):
+    """
+    Un pixel sur step dans chaque direction, copié dans un tableau contigu :
+    ~8000 pixels (~24 ko) au lieu de 2 millions en 1080p.
+    """
+    return np.ascontiguousarray(frame[::step, ::step])
+
+
+def luma_estimate(frame, step=16):
+    """
+    Luminance moyenne (0-255) estimée sur un pixel sur step dans chaque
+    direction (step=1 pour un échantillon déjà réduit par luma_sample).
+    cv2.mean recopie la vue sous-échantillonnée, mais seulement ses
+    ~8000 pixels. Même pondération que cv2.COLOR_BGR2GRAY.
+    """
+    sample = frame[::step, ::step] if step > 1 else frame
+    b, g, r, _ = cv2.mean(sample)
+    if sample.ndim == 2:
+        return b
+    return 0.114 * b + 0.587 * g + 0.299 * r
+
+
+class BlackScreenMonitor:
+    """
+    Détection d'écran noir hors du thread de capture : submit() ne fait que
+    déposer l'échantillon réduit de la frame (luma_sample, ~24 ko en 1080p
+    au lieu de 6 Mo) et son heure de capture dans une file, un thread
+    dédié estime la luminance et applique l'hystérésis historique (écran
+    noir signalé après min_duration secondes de frames noires, fin au
+    premier retour de l'image). Les événements sont ajoutés à
+    blackscreen_events et écrits dans log_f comme avant.
+
+    Si le thread prend du retard, les frames en trop sont ignorées (dropped)
+    plutôt que de ralentir la capture.
+    """
+
+    def __init__(self, log_f, blackscreen_events, threshold=10, min_duration=5, step=16,
+                 max_pending=60, frame_budget=1 / 30):
+        self.log_f = log_f
+        self.blackscreen_events = blackscreen_events
+        self.threshold = threshold
+        self.min_duration = min_duration
+        self.step = step
+        self.frame_budget = frame_budget
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.black_since = None
+        self.est_noir = False
+        self.dropped = 0
+        # Coût par frame
+        self.frames = 0
+        self.total_cost = 0.0
+        self.max_cost = 0.0
+        self.over_budget = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, frame, capture_time=None):
+        try:
+            self.pending.put_nowait((luma_sample(frame, self.step), capture_time or datetime.now()))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """ Traite les frames en attente puis arrête le thread. """
+        if self._thread is not None:
+            self.pending.put((None, None))
+            self._thread.join()
+            self._thread = None
+        self.log_stats()
+
+    def _run(self):
+        while True:
+            sample, capture_time = self.pending.get()
+            if sample is None:
+                return
+            self.process(sample, capture_time)
+
+    def process(self, sample, capture_time):
+        """ sample : échantillon déjà réduit par luma_sample(). """
+        start = time.perf_counter()
+        if luma_estimate(sample, step=1) < self.threshold:
+            if self.black_since is None:
+                self.black_since = capture_time
+            if not self.est_noir and (capture_time - self.black_since).total_seconds() >= self.min_duration:
+                self.est_noir = True
+                self.blackscreen_events.append((capture_time, 'début'))
+                report_incident(self.black_since, "écran noir")
+                self.log_f.write(f"{capture_time} - Écran noir détecté pendant plus de {self.min_duration} secondes\n")
+                print(f"[DEBUG] Écran noir détecté pendant plus de {self.min_duration} secondes")
+        else:
+            if self.est_noir:
+                self.blackscreen_events.append((capture_time, 'fin'))
+                report_incident(capture_time, "fin de l'écran noir")
+                self.log_f.write(f"{capture_time} - Fin de l'écran noir\n")
+            self.black_since = None
+            self.est_noir = False
+
+        cost = time.perf_counter() - start
+        self.frames += 1
+        self.total_cost += cost
+        self.max_cost = max(self.max_cost, cost)
+        if cost > self.frame_budget:
+            self.over_budget += 1
+
+    def stats(self):
+        """ Coût par frame en microsecondes. """
+        mean = self.total_cost / self.frames if self.frames else 0.0
+        return {
+            "frames": self.frames,
+            "mean_us": round(mean * 1e6, 1),
+            "max_us": round(self.max_cost * 1e6, 1),
+            "over_budget": self.over_budget,
+            "dropped": self.dropped,
+        }
+
+    def log_stats(self, name="écran noir"):
+        logging.debug(f"Coût détecteur {name} : {self.stats()}")
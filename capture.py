@@ -0,0 +1,259 @@
+import time
+import logging
+import threading
+from collections import deque, namedtuple
+import cv2
+import numpy as np
+
+# Frame lue par CaptureThread, horodatée (time.time()) au retour de cap.read()
+CapturedFrame = namedtuple("CapturedFrame", ["index", "frame", "timestamp"])
+
+
+def tap_size(width, height, scale):
+    """ Dimensions (paires, exigées par ffmpeg) d'un flux réduit d'un facteur scale. """
+    return int(width * scale) // 2 * 2, int(height * scale) // 2 * 2
+
+
+class RoiLayout:
+    """
+    Flux d'analyse limité à l'union des zones d'intérêt des détecteurs.
+    Les zones sont déclarées par nom en coordonnées pleine résolution
+    (y1, y2, x1, x2) ; les détecteurs récupèrent leurs coordonnées dans la
+    frame réduite (union recadrée, éventuellement en niveaux de gris et
+    redimensionnée) avec slices(nom).
+    """
+
+    def __init__(self, rois, scale=1.0, gray=False):
+        self.rois = dict(rois)
+        self.scale = scale
+        self.gray = gray
+        # Union alignée sur des coordonnées paires pour le filtre crop de ffmpeg
+        self.y1 = min(r[0] for r in self.rois.values()) // 2 * 2
+        self.x1 = min(r[2] for r in self.rois.values()) // 2 * 2
+        self.y2 = -(-max(r[1] for r in self.rois.values()) // 2) * 2
+        self.x2 = -(-max(r[3] for r in self.rois.values()) // 2) * 2
+        self.width, self.height = tap_size(self.x2 - self.x1, self.y2 - self.y1, scale)
+        channels = 1 if gray else 3
+        self.shape = (self.height, self.width) if gray else (self.height, self.width, channels)
+        self.frame_size = self.width * self.height * channels
+
+    def local(self, name):
+        """ Zone (y1, y2, x1, x2) dans la frame réduite. """
+        y1, y2, x1, x2 = self.rois[name]
+        s = self.scale
+        return (int((y1 - self.y1) * s), int((y2 - self.y1) * s),
+                int((x1 - self.x1) * s), int((x2 - self.x1) * s))
+
+    def slices(self, name):
+        y1, y2, x1, x2 = self.local(name)
+        return slice(y1, y2), slice(x1, x2)
+
+    def ffmpeg_filter(self):
+        crop = f'crop={self.x2 - self.x1}:{self.y2 - self.y1}:{self.x1}:{self.y1}'
+        scale = f',scale={self.width}:{self.height}' if self.scale != 1.0 else ''
+        pix_fmt = 'gray' if self.gray else 'bgr24'
+        return f'{crop}{scale},format={pix_fmt}'
+
+    def extract(self, frame, out=None):
+        """
+        Frame réduite à partir d'une frame pleine résolution (capture OpenCV).
+        Passer out pour réutiliser un buffer, à condition qu'aucun détecteur
+        ne garde de référence sur la frame précédente.
+        """
+        region = frame[self.y1:self.y2, self.x1:self.x2]
+        if self.gray:
+            region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        if self.scale != 1.0:
+            cv2.resize(region, (self.width, self.height), dst=out, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(out, region)
+        return out
+
+
+def tap_output_args(width, height, scale=0.5, layout=None):
+    """
+    Arguments ffmpeg d'une seconde sortie 'rawvideo' écrite sur stdout, à
+    ajouter après la sortie d'enregistrement principale : frame entière en
+    niveaux de gris réduite d'un facteur scale, ou seulement l'union des
+    zones d'un RoiLayout.
+    """
+    if layout is not None:
+        video_filter = layout.ffmpeg_filter()
+        pix_fmt = 'gray' if layout.gray else 'bgr24'
+    else:
+        tap_width, tap_height = tap_size(width, height, scale)
+        video_filter = f'scale={tap_width}:{tap_height},format=gray'
+        pix_fmt = 'gray'
+    return [
+        '-map', '0:v',
+        '-vf', video_filter,
+        '-f', 'rawvideo', '-pix_fmt', pix_fmt,
+        'pipe:1'
+    ]
+
+
+class FrameTap:
+    """
+    Lecture des frames brutes (niveaux de gris) qu'un ffmpeg écrit sur son
+    stdout. Chaque frame correspond à une frame de l'enregistrement, son
+    timestamp est donc sa position dans la vidéo : index / fps.
+
+    Quand les frames sont fournies à ffmpeg par le programme (broker),
+    capture_times reçoit au fur et à mesure l'heure de capture de chacune :
+    le timestamp est alors l'écart à la première, trous compris.
+    """
+
+    def __init__(self, pipe, width, height, fps=30, channels=1, capture_times=None):
+        self.pipe = pipe
+        self.fps = fps
+        self.capture_times = capture_times
+        self.shape = (height, width) if channels == 1 else (height, width, channels)
+        self.frame_size = width * height * channels
+        self.frames_read = 0
+
+    def read(self):
+        """ Retourne la frame suivante, ou None à la fin du flux. """
+        buffer = bytearray(self.frame_size)
+        view = memoryview(buffer)
+        received = 0
+        while received < self.frame_size:
+            n = self.pipe.readinto(view[received:])
+            if not n:
+                if received:
+                    logging.debug(f"Frame incomplète en fin de flux ({received}/{self.frame_size} octets)")
+                return None
+            received += n
+        self.frames_read += 1
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(self.shape)
+
+    def frames(self):
+        """ Générateur de (index, frame, timestamp_s) jusqu'à la fin du flux. """
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            index = self.frames_read - 1
+            yield index, frame, self.timestamp(index)
+
+    def timestamp(self, index):
+        times = self.capture_times
+        if times is not None and index < len(times):
+            return times[index] - times[0]
+        return index / self.fps
+
+
+class FrameQueue:
+    """
+    File bornée d'un consommateur de CaptureThread. Quand elle est pleine,
+    la frame la plus ancienne est écartée et comptée dans dropped : un
+    consommateur lent perd des frames mais ne ralentit jamais la capture.
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.received = 0
+        self.dropped = 0
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._condition:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.received += 1
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """ Prochaine CapturedFrame, ou None en fin de capture (ou après timeout). """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            yield item
+
+
+class CaptureThread:
+    """
+    Lecture de la capture (cv2.VideoCapture) dans un thread dédié, qui
+    horodate chaque frame et la dépose dans la file de chaque consommateur
+    (enregistrement, détection...). Le rythme de lecture ne dépend donc pas
+    du coût des traitements.
+
+        capture = CaptureThread(cap)
+        frames = capture.subscribe("detection", maxsize=5)
+        capture.start()
+        for item in frames: ...
+        capture.stop()
+    """
+
+    def __init__(self, cap, name="hdmi"):
+        self.cap = cap
+        self.name = name
+        self.queues = []
+        self.frames_read = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, name, maxsize=10):
+        """ Nouveau consommateur, possible aussi pendant la capture. """
+        queue = FrameQueue(name, maxsize)
+        with self._lock:
+            self.queues = self.queues + [queue]
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self.queues = [q for q in self.queues if q is not queue]
+        queue.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    logging.debug(f"Fin de la capture {self.name}")
+                    break
+                # Heure de capture donnée par la source si elle la connaît (broker), sinon heure de lecture
+                timestamp = getattr(self.cap, "timestamp", None) or time.time()
+                item = CapturedFrame(self.frames_read, frame, timestamp)
+                self.frames_read += 1
+                for queue in self.queues:
+                    queue.put(item)
+        finally:
+            for queue in self.queues:
+                queue.close()
+
+    def stats(self):
+        return {queue.name: {"received": queue.received, "dropped": queue.dropped} for queue in self.queues}
+
+    def log_stats(self):
+        logging.debug(f"Capture {self.name} : {self.frames_read} frames lues, par consommateur {self.stats()}")
@@ -0,0 +1,237 @@
+"""
+Broker de capture HDMI : un processus par carte de capture ouvre le
+périphérique V4L2 une seule fois et diffuse les frames horodatées à tous
+les clients locaux (enregistrement, détecteurs, aperçu) par une socket
+Unix. Un test KPI et un moniteur peuvent ainsi tourner en même temps sur
+la même box, sans erreur 'device busy'.
+
+    python3 capture_broker.py serve /dev/video0     # broker du périphérique
+    python3 capture_broker.py preview /dev/video0   # aperçu (remplace ffplay /dev/video0)
+
+Côté scripts, open_capture(hdmi) retourne un client du broker s'il tourne,
+sinon un cv2.VideoCapture classique.
+"""
+import os
+import sys
+import json
+import socket
+import struct
+import argparse
+import threading
+import subprocess
+import logging
+import cv2
+import numpy as np
+from capture import CaptureThread
+
+socket_dir = os.environ.get("IVS_BROKER_DIR", "/tmp")
+# Entête de chaque frame : index, heure de capture (epoch)
+frame_header = struct.Struct("<Qd")
+# Description du flux envoyée à la connexion : longueur puis JSON
+info_header = struct.Struct("<I")
+
+
+def broker_socket_path(device):
+    return os.path.join(socket_dir, f"ivs_capture_{os.path.basename(str(device))}.sock")
+
+
+def _recv_exact_into(sock, view):
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:])
+        if not n:
+            return False
+        received += n
+    return True
+
+
+class CaptureBroker:
+    """
+    Possède la capture du périphérique et sert chaque client connecté
+    depuis sa propre file bornée (CaptureThread) : un client lent perd des
+    frames sans ralentir la capture ni les autres clients.
+    """
+
+    def __init__(self, device, width=1920, height=1080, fps=30, max_pending=5):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.max_pending = max_pending
+        self.path = broker_socket_path(device)
+        self.capture = None
+        self.clients = 0
+
+    def _open(self):
+        source = int(self.device) if str(self.device).isdigit() else self.device
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise OSError(f"impossible d'ouvrir {self.device}")
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+        return cap
+
+    def serve_forever(self):
+        cap = self._open()
+        self.capture = CaptureThread(cap, name=str(self.device))
+        self.capture.start()
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen()
+        logging.info(f"Broker {self.device} ({self.width}x{self.height} @ {self.fps} fps) sur {self.path}")
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            os.remove(self.path)
+            self.capture.stop()
+            cap.release()
+
+    def _serve_client(self, conn):
+        self.clients += 1
+        name = f"client{self.clients}"
+        queue = self.capture.subscribe(name, self.max_pending)
+        logging.info(f"Broker {self.device} : {name} connecté")
+        try:
+            info = json.dumps({"width": self.width, "height": self.height, "channels": 3, "fps": self.fps}).encode()
+            conn.sendall(info_header.pack(len(info)) + info)
+            for item in queue:
+                conn.sendall(frame_header.pack(item.index, item.timestamp))
+                conn.sendall(memoryview(np.ascontiguousarray(item.frame)).cast('B'))
+        except OSError:
+            pass
+        finally:
+            self.capture.unsubscribe(queue)
+            conn.close()
+            logging.info(f"Broker {self.device} : {name} déconnecté ({queue.dropped} frames perdues)")
+
+
+class BrokerCapture:
+    """
+    Client du broker avec l'interface de cv2.VideoCapture utilisée par les
+    scripts (isOpened, read, get, set, release). timestamp donne l'heure de
+    capture de la dernière frame lue ; dropped compte les frames que le
+    broker a écartées pour ce client (trous dans les index de capture).
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(broker_socket_path(device))
+        length = bytearray(info_header.size)
+        if not _recv_exact_into(self.sock, memoryview(length)):
+            raise OSError(f"broker {device} fermé à la connexion")
+        data = bytearray(info_header.unpack(length)[0])
+        if not _recv_exact_into(self.sock, memoryview(data)):
+            raise OSError(f"broker {device} fermé à la connexion")
+        info = json.loads(data)
+        self.width, self.height, self.channels = info["width"], info["height"], info["channels"]
+        self.fps = info["fps"]
+        self.frame_size = self.width * self.height * self.channels
+        self.index = None
+        self.timestamp = None
+        self.dropped = 0
+        self._header = bytearray(frame_header.size)
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        buffer = bytearray(self.frame_size)
+        try:
+            if not _recv_exact_into(self.sock, memoryview(self._header)) or \
+                    not _recv_exact_into(self.sock, memoryview(buffer)):
+                self.release()
+                return False, None
+        except OSError:
+            self.release()
+            return False, None
+        previous = self.index
+        self.index, self.timestamp = frame_header.unpack(self._header)
+        if previous is not None and self.index > previous + 1:
+            self.dropped += self.index - previous - 1
+        return True, np.frombuffer(buffer, dtype=np.uint8).reshape(self.height, self.width, self.channels)
+
+    def get(self, prop):
+        return {
+            cv2.CAP_PROP_FRAME_WIDTH: self.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+            cv2.CAP_PROP_FPS: self.fps,
+        }.get(prop, 0)
+
+    def set(self, prop, value):
+        # Réglages fixés par le broker
+        return False
+
+    def release(self):
+        if self._opened:
+            self._opened = False
+            self.sock.close()
+
+
+def broker_running(device):
+    return os.path.exists(broker_socket_path(device))
+
+
+def open_capture(device):
+    """ Client du broker du périphérique s'il tourne, sinon ouverture directe. """
+    if broker_running(device):
+        try:
+            cap = BrokerCapture(device)
+            logging.debug(f"Capture {device} via le broker")
+            return cap
+        except (OSError, ValueError) as e:
+            logging.debug(f"Broker {device} injoignable ({e}), ouverture directe")
+    return cv2.VideoCapture(device)
+
+
+def preview(device):
+    """ Aperçu en direct par ffplay, alimenté par le broker. """
+    cap = BrokerCapture(device)
+    player = subprocess.Popen(['ffplay', '-loglevel', 'error', '-f', 'rawvideo', '-pixel_format', 'bgr24',
+                               '-video_size', f"{cap.width}x{cap.height}", '-framerate', f"{cap.fps}", '-i', '-'],
+                              stdin=subprocess.PIPE)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            player.stdin.write(memoryview(frame).cast('B'))
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        cap.release()
+        player.terminate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Broker de capture HDMI")
+    parser.add_argument("command", choices=["serve", "preview"])
+    parser.add_argument("device")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        CaptureBroker(args.device, args.width, args.height, args.fps).serve_forever()
+    else:
+        preview(args.device)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
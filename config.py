@@ -8,4 +8,15 @@ PDU = "192.168.11.144 1.3.6.1.4.1.318.1.1.26.9.2.4.1.5.1"
 PDU_STATUT = "On"
 LAST_STOP_REASON = "N/A"
 lien = "/home/bytel/IVS/results/UZW4020BYT/8.30.43_214021113554404_7AB_test_20250401_1459"
-PID_FFMPEG=746677
\ No newline at end of file
+PID_FFMPEG=746677
+# Réglages libx264 du plus coûteux au plus léger (l'enregistrement passe au suivant
+# s'il ne tient pas le temps réel pendant encoder_adapt_after secondes)
+encoder_levels = [
+    {"preset": "medium", "crf": 23, "fps_divider": 1},
+    {"preset": "veryfast", "crf": 23, "fps_divider": 1},
+    {"preset": "superfast", "crf": 23, "fps_divider": 1},
+    {"preset": "ultrafast", "crf": 26, "fps_divider": 1},
+    {"preset": "ultrafast", "crf": 28, "fps_divider": 2},
+]
+comfortable_speed = 1.5
+encoder_adapt_after = 30
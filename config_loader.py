@@ -0,0 +1,24 @@
+"""
+Chargement des fichiers de configuration des tests (config.py), sans
+dépendance lourde : utilisable par l'ordonnanceur sans importer OpenCV
+ni la configuration du logging de zap_functions. Les réglages
+d'encodage qu'ils définissent (encoder_levels...) sont appliqués au
+chargement.
+"""
+import importlib.util
+import logging
+import os
+import sys
+import encoder
+
+
+def load_config(config_path):
+    if not os.path.isfile(config_path):
+        logging.error(f"le fichier de configuration {config_path} n'existe pas")
+        sys.exit(1)
+
+    spec = importlib.util.spec_from_file_location("config", config_path)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    encoder.configure(config)
+    return config
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import threading
+import logging
+
+# Réglages libx264 du plus coûteux au plus léger, et seuils d'adaptation.
+# Valeurs par défaut, remplacées par celles du fichier de configuration
+# (encoder_levels, comfortable_speed, encoder_adapt_after ; voir configure).
+# Un encodeur qui ne tient pas le temps réel pendant adapt_after secondes
+# est relancé au niveau suivant en cours d'enregistrement ; un encodeur
+# largement en avance fait revenir d'un niveau à l'enregistrement suivant.
+encoder_settings = {
+    "levels": [
+        {"preset": "medium", "crf": 23, "fps_divider": 1},
+        {"preset": "veryfast", "crf": 23, "fps_divider": 1},
+        {"preset": "superfast", "crf": 23, "fps_divider": 1},
+        {"preset": "ultrafast", "crf": 26, "fps_divider": 1},
+        {"preset": "ultrafast", "crf": 28, "fps_divider": 2},
+    ],
+    # Vitesse d'encodage (x temps réel) au-dessus de laquelle on revient d'un niveau
+    "comfortable_speed": 1.5,
+    # Secondes de retard continu avant de passer au niveau suivant en cours d'enregistrement
+    "adapt_after": 30,
+}
+# Niveau atteint sur ce banc, gardé d'un processus à l'autre : un nouveau test
+# démarre au dernier niveau qui a tenu le temps réel
+STATE_FILE = os.path.expanduser("~/IVS/encoder_state.json")
+
+
+def _load_level():
+    try:
+        with open(STATE_FILE) as f:
+            return int(json.load(f)["level"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+encoder_state = {"level": _load_level()}
+
+
+def configure(config):
+    """ Reprend les réglages d'encodage définis dans un fichier de configuration (config_loader). """
+    for name, key in (("encoder_levels", "levels"), ("comfortable_speed", "comfortable_speed"),
+                      ("encoder_adapt_after", "adapt_after")):
+        value = getattr(config, name, None)
+        if value:
+            encoder_settings[key] = value
+
+
+def set_level(level):
+    """ Change le niveau des prochains encodeurs et l'enregistre pour les tests suivants du banc. """
+    level = max(0, min(level, len(encoder_settings["levels"]) - 1))
+    if level == encoder_state["level"]:
+        return level
+    logging.info(f"Encodeur : passage du niveau {encoder_state['level']} au niveau {level} "
+                 f"({encoder_settings['levels'][level]})")
+    encoder_state["level"] = level
+    try:
+        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+        with open(STATE_FILE, 'w') as f:
+            json.dump({"level": level}, f)
+    except OSError as e:
+        logging.warning(f"Niveau d'encodage non enregistré : {e}")
+    return level
+
+
+def current_encoder_settings():
+    levels = encoder_settings["levels"]
+    level = min(encoder_state["level"], len(levels) - 1)
+    return level, levels[level]
+
+
+class EncoderMonitor:
+    """
+    Suit un ffmpeg qui encode des frames reçues sur stdin :
+
+    - durée de chaque écriture dans le pipe : une écriture plus longue que
+      l'intervalle entre deux frames compte comme frame retardée ; au-delà
+      de max_latency_frames intervalles, la frame suivante est abandonnée
+      pour que la capture rattrape son retard (le flux est horodaté par
+      l'horloge murale, la vidéo garde donc sa durée réelle) ;
+    - vitesse d'encodage lue sur la sortie '-progress' de ffmpeg.
+
+    stats est un dict tenu à jour pendant l'enregistrement, à passer au
+    fichier de résultats. Un même dict passé aux encodeurs successifs d'un
+    enregistrement (changement de niveau) cumule leurs compteurs.
+    """
+
+    def __init__(self, process, frame_rate, level=0, fps_divider=1, max_latency_frames=2, stats=None):
+        self.process = process
+        self.interval = 1 / frame_rate
+        self.level = level
+        self.fps_divider = fps_divider
+        self.max_latency = self.interval * max_latency_frames
+        self.stats = stats if stats is not None else {}
+        for key, value in (("frames_written", 0), ("delayed", 0), ("dropped", 0), ("max_write_ms", 0.0),
+                           ("encoder_dropped", 0), ("level_changes", 0)):
+            self.stats.setdefault(key, value)
+        self.stats.update({"level": level, "speed": None})
+        self._frames_seen = 0
+        self._skip_next = False
+        self._written = 0
+        self._total_write = 0.0
+        self._dropped_start = self.stats["dropped"]
+        self._encoder_dropped_start = self.stats["encoder_dropped"]
+        self._last_check = time.monotonic()
+        self._last_dropped = self.stats["dropped"]
+        self._behind_since = None
+        self._finished = False
+        self._progress = threading.Thread(target=self._read_progress, daemon=True)
+        self._progress.start()
+
+    def write(self, data):
+        """ Écrit une frame dans le pipe de ffmpeg, ou l'abandonne si l'encodeur est en retard. """
+        self._frames_seen += 1
+        if self.fps_divider > 1 and self._frames_seen % self.fps_divider:
+            return False
+        if self._skip_next:
+            self._skip_next = False
+            self.stats["dropped"] += 1
+            return False
+
+        start = time.perf_counter()
+        self.process.stdin.write(data)
+        latency = time.perf_counter() - start
+
+        self._total_write += latency
+        self._written += 1
+        self.stats["frames_written"] += 1
+        self.stats["max_write_ms"] = round(max(self.stats["max_write_ms"], latency * 1000), 2)
+        if latency > self.interval:
+            self.stats["delayed"] += 1
+        if latency > self.max_latency:
+            self._skip_next = True
+        return True
+
+    def _read_progress(self):
+        # Blocs 'clé=valeur' terminés par 'progress=continue|end', toutes les ~0,5 s
+        for line in self.process.stdout:
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            if key == "speed" and value.endswith('x'):
+                try:
+                    self.stats["speed"] = float(value[:-1])
+                except ValueError:
+                    pass
+            elif key == "drop_frames" and value.isdigit():
+                self.stats["encoder_dropped"] = self._encoder_dropped_start + int(value)
+
+    def behind(self):
+        """ Vrai si cet encodeur a perdu des frames ou n'a pas tenu le temps réel. """
+        speed = self.stats["speed"]
+        return self.stats["dropped"] > self._dropped_start or (speed is not None and speed < 0.98)
+
+    def needs_lighter_level(self):
+        """
+        À appeler à chaque frame : vrai quand l'encodeur est en retard
+        (frames abandonnées ou vitesse sous le temps réel, vérifié chaque
+        seconde) depuis adapt_after secondes et qu'un niveau plus léger existe.
+        """
+        now = time.monotonic()
+        if now - self._last_check < 1:
+            return False
+        speed, dropped = self.stats["speed"], self.stats["dropped"]
+        lagging = dropped > self._last_dropped or (speed is not None and speed < 0.98)
+        self._last_check, self._last_dropped = now, dropped
+        if not lagging:
+            self._behind_since = None
+            return False
+        if self._behind_since is None:
+            self._behind_since = now
+        return (now - self._behind_since >= encoder_settings["adapt_after"]
+                and self.level < len(encoder_settings["levels"]) - 1)
+
+    def detach_stats(self):
+        """
+        Relance à un autre niveau : la fin de cet encodeur (vitesse, frames
+        perdues par ffmpeg) n'écrase plus le dict partagé avec le suivant.
+        """
+        self.stats = dict(self.stats)
+
+    def finish(self):
+        """ À appeler après la fin de ffmpeg : ajuste le niveau du prochain enregistrement. """
+        if self._finished:
+            return self.stats
+        self._finished = True
+        self._progress.join(timeout=5)
+        written = self._written
+        self.stats["mean_write_ms"] = round(self._total_write / written * 1000, 2) if written else 0.0
+
+        speed = self.stats["speed"]
+        if self.behind():
+            set_level(self.level + 1)
+        elif speed is not None and speed >= encoder_settings["comfortable_speed"] and not self.stats["delayed"]:
+            set_level(self.level - 1)
+        logging.debug(f"Encodeur : {self.stats}")
+        return self.stats
+
+
+def format_encoder_stats(stats):
+    """ Ligne du fichier de résultats. """
+    return (f"{stats.get('frames_written', 0)} frames écrites, {stats.get('delayed', 0)} retardées, "
+            f"{stats.get('dropped', 0) + stats.get('encoder_dropped', 0)} perdues, "
+            f"vitesse {stats.get('speed')}x, niveau {stats.get('level', 0)}")
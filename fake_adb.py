@@ -0,0 +1,446 @@
+"""
+Faux serveur adb local pour tester adb_client (et le code qui l'utilise) sans box.
+
+Seul le protocole du serveur adb est reproduit. Les commandes shell ne
+sont pas exécutées : FakeDevice répond aux commandes connues, et les
+scripts de ProcessWatcher et de l'attente de fin de démarrage sont
+reconnus par expressions régulières puis émulés (watch_lines,
+boot_wait_lines). Un script faux sur une vraie box peut donc passer ici.
+
+    server = FakeAdbServer()
+    server.add_device("192.168.1.81:5555", FakeDevice(properties={"ro.product.device": "UZW4020BYT"}))
+    server.start()
+    client = AdbClient(port=server.port)
+    ...
+    server.stop()
+"""
+import re
+import time
+import uuid
+import queue
+import socketserver
+import threading
+import logging
+
+session_line = re.compile(r'^\{ (.*); \} 2>/dev/null; echo (\S+) \$\?$')
+# Boucle de ProcessWatcher.script()
+watch_pidof = re.compile(r'\$\(pidof (\S+)\)')
+watch_sleep = re.compile(r'sleep (\d+(?:\.\d+)?); done')
+watch_beats = re.compile(r'\$i -ge (\d+) \]')
+watch_focus_beats = re.compile(r'\$n -ge (\d+) \]')
+# Boucle d'attente de fin de démarrage (adb_client.boot_wait_script)
+boot_wait_id = re.compile(r'random/boot_id\)" = "([^"]*)"')
+
+
+class FakeDevice:
+    """
+    Box simulée : répond aux commandes shell à partir de ses propriétés
+    (getprop) et d'un dictionnaire commande -> sortie ou fonction.
+
+    Elle simule aussi le cycle de vie d'une box :
+    - reboot (adb ou PDU) : hors ligne pendant offline_time secondes, puis en
+      ligne avec sys.boot_completed vide pendant boot_time secondes, puis '1'
+    - processes : paquet -> PID (pidof), nouveaux PID au démarrage ou après
+      crash(paquet)
+    - focus : paquet au premier plan (dumpsys window)
+    - logcat : flux synthétique au format threadtime, logcat_rate lignes par
+      seconde, plus les lignes injectées avec log() ou log_error()
+    """
+
+    def __init__(self, properties=None, responses=None, processes=None, focus=None,
+                 boot_time=0, offline_time=0, logcat_rate=10):
+        self.properties = dict(properties or {})
+        self.responses = dict(responses or {})
+        self.processes = dict(processes or {})
+        self.focus = focus
+        self.boot_time = boot_time
+        self.offline_time = offline_time
+        self.logcat_rate = logcat_rate
+        self.online = True
+        self.powered = True
+        self.booted_at = time.time()
+        self.boot_id = str(uuid.uuid4())
+        self.commands = []  # historique des commandes reçues
+        self.lock = threading.Lock()
+        self.serial = None
+        self.server = None
+        self._next_pid = 1000
+        self._logcat_queues = []
+        self._boot_timer = None
+
+    def shell(self, command):
+        """ Retourne (sortie, code_retour). """
+        with self.lock:
+            self.commands.append(command)
+        if command in self.responses:
+            response = self.responses[command]
+            return response(command) if callable(response) else (response, 0)
+        if command not in self.responses and '; ' in command:
+            # Commandes enchaînées : sorties concaténées, code de retour de la dernière
+            output, code = '', 0
+            for part in command.split('; '):
+                part_output, code = self.shell(part)
+                output += part_output
+            return output, code
+        if ' | grep ' in command:
+            command, pattern = command.rsplit(' | grep ', 1)
+            output, _ = self.shell(command)
+            lines = [line for line in output.splitlines(keepends=True) if pattern.strip() in line]
+            return ''.join(lines), 0 if lines else 1
+        if command == "cat /proc/sys/kernel/random/boot_id":
+            return self.boot_id + "\n", 0
+        if command == "getprop":
+            return ''.join(f"[{k}]: [{v}]\n" for k, v in sorted(self.current_properties().items())), 0
+        if command.startswith("getprop "):
+            return self.current_properties().get(command.split(None, 1)[1].strip(), "") + "\n", 0
+        if command.startswith("input keyevent "):
+            return "", 0
+        if command.startswith("pidof "):
+            pid = self.processes.get(command.split(None, 1)[1].strip())
+            return (f"{pid}\n", 0) if pid is not None else ("", 1)
+        if command == "dumpsys window":
+            return self.dumpsys_window(), 0
+        if command == "date +%s":
+            return f"{int(time.time())}\n", 0
+        if command == "date +%s.%N":
+            return f"{time.time():.9f}\n", 0
+        if command == "logcat -c" or command.startswith("logcat -G "):
+            return "", 0
+        return "", 127
+
+    def current_properties(self):
+        properties = dict(self.properties)
+        properties["sys.boot_completed"] = "1" if self.boot_completed() else ""
+        return properties
+
+    def boot_completed(self):
+        return self.booted_at is not None and time.time() >= self.booted_at
+
+    def dumpsys_window(self):
+        focus = f"Window{{1a2b3c u0 {self.focus}/{self.focus}.MainActivity}}" if self.focus else "null"
+        return (
+            "WINDOW MANAGER WINDOWS (dumpsys window windows)\n"
+            f"  mCurrentFocus={focus}\n"
+            f"  mFocusedApp=ActivityRecord{{4d5e6f u0 {self.focus}}}\n"
+        )
+
+    def _set_online(self, online):
+        if self.server is not None:
+            self.server.set_online(self.serial, online)
+        else:
+            self.online = online
+
+    def power_off(self):
+        """ Coupure secteur (PDU) : hors ligne, plus de processus. """
+        with self.lock:
+            if self._boot_timer is not None:
+                self._boot_timer.cancel()
+                self._boot_timer = None
+            self.powered = False
+            self.booted_at = None
+        self._set_online(False)
+
+    def power_on(self):
+        """ Démarrage : en ligne après offline_time, démarrage complet boot_time plus tard. """
+        with self.lock:
+            if self.powered:
+                return None
+            self.powered = True
+            self.boot_id = str(uuid.uuid4())
+            timer = self._boot_timer = threading.Timer(self.offline_time, self._come_online)
+            timer.daemon = True
+            timer.start()
+        return timer
+
+    def _come_online(self):
+        with self.lock:
+            self._boot_timer = None
+            if not self.powered:
+                return
+            self.booted_at = time.time() + self.boot_time
+            for package in self.processes:
+                self.processes[package] = self._new_pid()
+        self._set_online(True)
+
+    def reboot(self):
+        with self.lock:
+            self.commands.append("reboot")
+        self.power_off()
+        timer = self.power_on()
+        if not self.offline_time:
+            # Sans temps hors ligne, la box est de nouveau joignable au retour de reboot()
+            timer.join()
+
+    def _new_pid(self):
+        self._next_pid += 1
+        return self._next_pid
+
+    def crash(self, package, restart=True):
+        """ Crash d'un processus : nouveau PID (ou plus de processus si restart est faux). """
+        with self.lock:
+            old_pid = self.processes.get(package)
+            if restart:
+                self.processes[package] = self._new_pid()
+            else:
+                self.processes.pop(package, None)
+        self.log("libc", f"Fatal signal 11 (SIGSEGV), code 1, fault addr 0x0 in tid {old_pid} ({package})",
+                 level="F", pid=old_pid)
+
+    @staticmethod
+    def logcat_line(tag, message, level="I", pid=None):
+        """ Ligne logcat au format threadtime, horodatée maintenant. """
+        now = time.time()
+        stamp = time.strftime("%m-%d %H:%M:%S", time.localtime(now)) + f".{int(now * 1000) % 1000:03d}"
+        pid = pid or 1
+        return f"{stamp} {pid:5d} {pid:5d} {level} {tag}: {message}\n"
+
+    def log(self, tag, message, level="I", pid=None):
+        """ Ajoute une ligne au flux logcat de tous les lecteurs. """
+        line = self.logcat_line(tag, message, level, pid)
+        with self.lock:
+            for q in self._logcat_queues:
+                q.put(line)
+
+    def log_error(self, message):
+        self.log("ivs", f"LOG_ERROR: {message}", level="E")
+
+    def watch_lines(self, script, stop):
+        """
+        Émulation de la boucle shell de ProcessWatcher (le script n'est pas
+        exécuté, seuls ses paramètres en sont extraits) : mêmes lignes
+        '<epoch>|<pid>|...|<focus>', avec le premier plan relu seulement
+        quand un PID change ou toutes les 'focus_beats' itérations, émises
+        quand l'état change ou toutes les 'beats' itérations.
+        """
+        packages = watch_pidof.findall(script)
+        interval = float(watch_sleep.search(script).group(1)) if watch_sleep.search(script) else 1
+        beats = int(watch_beats.search(script).group(1)) if watch_beats.search(script) else 30
+        focus_beats = int(watch_focus_beats.search(script).group(1)) if watch_focus_beats.search(script) else 1
+        previous, count = None, 0
+        focus_pids, focus, focus_count = None, "", 0
+        while self.online and not stop():
+            pids = '|'.join(str(self.processes.get(package, "")) for package in packages)
+            count += 1
+            focus_count += 1
+            if pids != focus_pids or focus_count >= focus_beats:
+                focus_lines = [line for line in self.dumpsys_window().splitlines() if "mCurrentFocus" in line]
+                focus = focus_lines[0] if focus_lines else ""
+                focus_pids, focus_count = pids, 0
+            state = f"{pids}|{focus}"
+            if state != previous or count >= beats:
+                yield f"{int(time.time())}|{state}\n"
+                previous, count = state, 0
+            time.sleep(interval)
+
+    def boot_wait_lines(self, script, stop, interval=0.05):
+        """
+        Émulation de adb_client.boot_wait_script (non exécuté, seul le
+        boot_id en est extrait) : l'heure de fin du démarrage, une fois atteinte.
+        """
+        match = boot_wait_id.search(script)
+        previous_boot_id = match.group(1) if match else ""
+        while self.online and not stop():
+            if self.boot_id != previous_boot_id and self.boot_completed():
+                yield f"{max(time.time(), self.booted_at):.9f}\n"
+                return
+            time.sleep(interval)
+
+    def logcat_lines(self, stop):
+        """ Générateur des lignes du flux logcat jusqu'à stop() ou l'arrêt de la box. """
+        lines = queue.Queue()
+        with self.lock:
+            self._logcat_queues.append(lines)
+        interval = 1 / self.logcat_rate if self.logcat_rate else None
+        count = 0
+        try:
+            while self.online and not stop():
+                try:
+                    yield lines.get(timeout=interval or 1)
+                except queue.Empty:
+                    if interval:
+                        count += 1
+                        yield self.logcat_line("ActivityManager", f"synthetic event {count}")
+        finally:
+            with self.lock:
+                self._logcat_queues.remove(lines)
+
+
+class _AdbRequestHandler(socketserver.BaseRequestHandler):
+
+    def _read_request(self):
+        length = self._recv_exact(4)
+        if length is None:
+            return None
+        data = self._recv_exact(int(length, 16))
+        return data.decode() if data is not None else None
+
+    def _recv_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _okay(self, payload=None):
+        data = b'OKAY'
+        if payload is not None:
+            encoded = payload.encode()
+            data += b'%04x' % len(encoded) + encoded
+        self.request.sendall(data)
+
+    def _fail(self, message):
+        encoded = message.encode()
+        self.request.sendall(b'FAIL' + b'%04x' % len(encoded) + encoded)
+
+    def handle(self):
+        server = self.server.fake
+        request = self._read_request()
+        if request is None:
+            return
+
+        if request == "host:version":
+            self._okay("0029")
+        elif request == "host:devices":
+            self._okay(''.join(f"{serial}\tdevice\n" for serial, device in server.devices.items() if device.online))
+        elif request.startswith("host:connect:"):
+            serial = request[len("host:connect:"):]
+            if serial in server.devices:
+                server.connected.add(serial)
+                self._okay(f"connected to {serial}")
+            else:
+                self._okay(f"failed to connect to '{serial}': Connection refused")
+        elif request.startswith("host:disconnect:"):
+            server.connected.discard(request[len("host:disconnect:"):])
+            self._okay("disconnected")
+        elif request.startswith("host-serial:"):
+            serial, command = request[len("host-serial:"):].rsplit(':', 1)
+            self._host_serial(server, serial, command)
+        elif request.startswith("host:transport:"):
+            device = server.online_device(request[len("host:transport:"):])
+            if device is None:
+                self._fail(f"device '{request[len('host:transport:'):]}' not found")
+                return
+            self._okay()
+            self._service(server, device, self._read_request())
+        else:
+            self._fail(f"unknown host service {request}")
+
+    def _host_serial(self, server, serial, command):
+        if command == "get-state":
+            if server.online_device(serial) is None:
+                self._fail(f"device '{serial}' not found")
+            else:
+                self._okay("device")
+        elif command.startswith("wait-for-"):
+            self._okay()
+            server.wait_online(serial)
+            self._okay()
+        else:
+            self._fail(f"unknown host service {command}")
+
+    def _service(self, server, device, service):
+        if service is None:
+            return
+        if service == "shell:sh":
+            self._okay()
+            self._shell_session(device)
+        elif service == "shell:logcat":
+            self._okay()
+            self._stream_lines(server, device.logcat_lines)
+        elif service.startswith("shell:") and "while [" in service and "sys.boot_completed" in service:
+            self._okay()
+            self._stream_lines(server, lambda stop: device.boot_wait_lines(service, stop))
+        elif service.startswith("shell:") and "while :; do" in service:
+            self._okay()
+            self._stream_lines(server, lambda stop: device.watch_lines(service, stop))
+        elif service.startswith("shell:") or service.startswith("exec:"):
+            self._okay()
+            output, _ = device.shell(service.split(':', 1)[1])
+            self.request.sendall(output.encode())
+        elif service.startswith("reboot:"):
+            self._okay()
+            device.reboot()
+        else:
+            self._fail(f"unknown service {service}")
+
+    def _stream_lines(self, server, lines):
+        # Service longue durée : jusqu'à la fermeture par le client, l'arrêt de la box ou du serveur
+        try:
+            for line in lines(server.stopping.is_set):
+                self.request.sendall(line.encode())
+        except OSError:
+            pass
+
+    def _shell_session(self, device):
+        buffer = b''
+        while True:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return
+            buffer += chunk
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                if not device.online:
+                    return
+                match = session_line.match(line.decode())
+                if match is None:
+                    device.shell(line.decode())
+                    continue
+                output, code = device.shell(match.group(1))
+                try:
+                    self.request.sendall(f"{output}{match.group(2)} {code}\n".encode())
+                except OSError:
+                    return
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Dizaines de box simulées qui se connectent en même temps (défaut : 5)
+    request_queue_size = 128
+
+
+class FakeAdbServer:
+    """ Serveur parlant le protocole du serveur adb, sur un port local libre. """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.devices = {}
+        self.connected = set()
+        self._online = threading.Condition()
+        self._server = _ThreadingServer((host, port), _AdbRequestHandler)
+        self._server.fake = self
+        self.stopping = threading.Event()
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def add_device(self, serial, device):
+        device.serial = serial
+        device.server = self
+        self.devices[serial] = device
+        return device
+
+    def online_device(self, serial):
+        device = self.devices.get(serial)
+        return device if device is not None and device.online else None
+
+    def set_online(self, serial, online):
+        with self._online:
+            self.devices[serial].online = online
+            self._online.notify_all()
+
+    def wait_online(self, serial, timeout=None):
+        with self._online:
+            return self._online.wait_for(lambda: self.online_device(serial) is not None, timeout)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logging.debug(f"faux serveur adb sur {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self._server.shutdown()
+        self._server.server_close()
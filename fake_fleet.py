@@ -0,0 +1,431 @@
+"""
+Parc de box simulées pour tester l'orchestration en charge, sans matériel :
+un faux serveur adb (fake_adb) avec count box, et une fausse PDU qui
+accepte les SNMP set (snmpset -v1 -c public 127.0.0.1:<port> <oid> i 1|2|3).
+
+    python3 fake_fleet.py --boxes 50 --cycles 3
+
+Pour chaque box, un thread enchaîne ce que font les scripts de test :
+connect_adb, initialize_logcat, surveillance des PID (ProcessWatcher),
+crash injecté, reboot (adb ou PDU), wait_for_device, record_logs. Le
+rapport donne la latence adb, le délai de détection des crashs, l'écart
+entre le démarrage simulé et celui mesuré par wait_for_device, le CPU du
+processus et les octets écrits.
+
+Limites : c'est un test de l'orchestration côté PC (adb_client, threads,
+fichiers), pas des box. Les scripts shell envoyés aux box (boucle de
+ProcessWatcher, attente de fin de démarrage) ne sont pas exécutés :
+fake_adb reconnaît leur forme et produit la sortie qu'ils devraient
+donner. Leur syntaxe et leur comportement sur une vraie box ne sont donc
+pas vérifiés ici, et l'écart de démarrage ne mesure que la chaîne
+adb_client -> script_reboot face à une heure fournie par la simulation.
+Le reboot PDU passe par reboot_via_pdu des scripts (snmpset) quand
+snmpset est installé et le module importable, sinon par le client SNMP
+interne (snmp_set) : le rapport indique lequel a servi.
+"""
+import os
+import sys
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import socketserver
+import logging
+from fake_adb import FakeAdbServer, FakeDevice
+
+# Sortie de prise PDU APC (PowerNet-MIB sPDUOutletCtl) : 1 on, 2 off, 3 reboot
+pdu_outlet_oid = "1.3.6.1.4.1.318.1.1.26.9.2.4.1.5"
+outlet_on, outlet_off, outlet_reboot = 1, 2, 3
+fleet_packages = {
+    'bbui': 'fr.bouyguestelecom.tv.bbui',
+    'middleware': 'fr.bouyguestelecom.tv.middleware',
+    'comedia': 'com.rtrk.comedia.service',
+    'tr069': 'insight.tr069.client',
+    'custo': 'fr.bouyguestelecom.agent.custo',
+    'power': 'fr.bouyguestelecom.tv.power',
+    'system_server': 'system_server'
+}
+
+
+# --- BER minimal (SNMPv1) ---
+
+def _ber_length(data, pos):
+    length = data[pos]
+    pos += 1
+    if length & 0x80:
+        count = length & 0x7f
+        length = int.from_bytes(data[pos:pos + count], 'big')
+        pos += count
+    return length, pos
+
+
+def ber_decode(data, pos=0):
+    """ (tag, valeur brute, position suivante) du TLV à pos. """
+    tag = data[pos]
+    length, pos = _ber_length(data, pos + 1)
+    return tag, data[pos:pos + length], pos + length
+
+
+def ber_items(data):
+    pos = 0
+    while pos < len(data):
+        tag, value, pos = ber_decode(data, pos)
+        yield tag, value
+
+
+def ber_encode(tag, value):
+    if len(value) < 0x80:
+        length = bytes([len(value)])
+    else:
+        size = (len(value).bit_length() + 7) // 8
+        length = bytes([0x80 | size]) + len(value).to_bytes(size, 'big')
+    return bytes([tag]) + length + value
+
+
+def ber_integer(value):
+    return ber_encode(0x02, value.to_bytes((value.bit_length() + 8) // 8 or 1, 'big', signed=True))
+
+
+def decode_oid(value):
+    parts = [value[0] // 40, value[0] % 40]
+    n = 0
+    for byte in value[1:]:
+        n = (n << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            parts.append(n)
+            n = 0
+    return '.'.join(map(str, parts))
+
+
+def encode_oid(oid):
+    parts = [int(p) for p in oid.split('.')]
+    data = bytearray([parts[0] * 40 + parts[1]])
+    for n in parts[2:]:
+        chunk = [n & 0x7f]
+        n >>= 7
+        while n:
+            chunk.append(0x80 | (n & 0x7f))
+            n >>= 7
+        data += bytes(reversed(chunk))
+    return ber_encode(0x06, bytes(data))
+
+
+def snmp_message(community, pdu_tag, request_id, varbinds, error_status=0):
+    """ Message SNMPv1 ; varbinds : [(oid, entier ou None)]. """
+    bindings = b''.join(
+        ber_encode(0x30, encode_oid(oid) + (ber_integer(value) if value is not None else b'\x05\x00'))
+        for oid, value in varbinds)
+    pdu = ber_encode(pdu_tag, ber_integer(request_id) + ber_integer(error_status) + ber_integer(0)
+                     + ber_encode(0x30, bindings))
+    return ber_encode(0x30, ber_integer(0) + ber_encode(0x04, community.encode()) + pdu)
+
+
+def snmp_set(host, port, oid, value, community="public", timeout=2):
+    """ Équivalent de 'snmpset -v1 -c public host:port oid i value'. Retourne le statut d'erreur. """
+    request_id = int(time.time() * 1000) & 0x7fffffff
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(snmp_message(community, 0xa3, request_id, [(oid, value)]), (host, port))
+        data, _ = sock.recvfrom(65535)
+    _, message, _ = ber_decode(data)
+    _, _, (_, pdu) = list(ber_items(message))
+    _, (_, error_status) = list(ber_items(pdu))[:2]
+    return int.from_bytes(error_status, 'big')
+
+
+class _SnmpHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        data, sock = self.request
+        pdu_agent = self.server.pdu
+        try:
+            _, message, _ = ber_decode(data)
+            items = list(ber_items(message))
+            community = items[1][1].decode()
+            pdu_tag, pdu = items[2]
+            fields = list(ber_items(pdu))
+            request_id = int.from_bytes(fields[0][1], 'big', signed=True)
+            varbinds = []
+            for _, binding in ber_items(fields[3][1]):
+                (_, oid), (value_tag, value) = list(ber_items(binding))
+                varbinds.append((decode_oid(oid), int.from_bytes(value, 'big', signed=True) if value_tag == 0x02 else None))
+        except (IndexError, ValueError, UnicodeDecodeError):
+            logging.debug(f"PDU simulée : requête SNMP illisible de {self.client_address}")
+            return
+        if community != pdu_agent.community:
+            return
+
+        error_status = 0
+        results = []
+        for oid, value in varbinds:
+            if pdu_tag == 0xa3:
+                if not pdu_agent.set_outlet(oid, value):
+                    error_status = 2  # noSuchName
+                results.append((oid, value))
+            else:
+                results.append((oid, pdu_agent.outlet_state(oid)))
+        sock.sendto(snmp_message(community, 0xa2, request_id, results, error_status), self.client_address)
+
+
+class FakePdu:
+    """
+    PDU simulée (agent SNMPv1 sur UDP) : chaque prise pdu_outlet_oid.<n>
+    alimente une FakeDevice. set 2 coupe la box, 1 la rallume, 3 la
+    redémarre (coupure de reboot_delay secondes).
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, community="public", reboot_delay=1):
+        self.community = community
+        self.reboot_delay = reboot_delay
+        self.outlets = {}  # oid -> FakeDevice
+        self.commands = []  # historique (oid, valeur)
+        self._server = socketserver.ThreadingUDPServer((host, port), _SnmpHandler)
+        self._server.daemon_threads = True
+        self._server.pdu = self
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def add_outlet(self, number, device):
+        oid = f"{pdu_outlet_oid}.{number}"
+        self.outlets[oid] = device
+        return oid
+
+    def outlet_state(self, oid):
+        device = self.outlets.get(oid)
+        return None if device is None else (outlet_on if device.powered else outlet_off)
+
+    def set_outlet(self, oid, value):
+        device = self.outlets.get(oid)
+        if device is None:
+            return False
+        self.commands.append((oid, value))
+        if value == outlet_off:
+            device.power_off()
+        elif value == outlet_on:
+            device.power_on()
+        elif value == outlet_reboot:
+            device.power_off()
+            timer = threading.Timer(self.reboot_delay, device.power_on)
+            timer.daemon = True
+            timer.start()
+        else:
+            return False
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logging.debug(f"PDU simulée sur {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeFleet:
+    """
+    count box simulées (10.200.x.y:5555) derrière un faux serveur adb, une
+    prise de la PDU simulée chacune. config_pdu(i) donne la valeur PDU des
+    fichiers de configuration ("<ip:port> <oid>").
+    """
+
+    def __init__(self, count, boot_time=20, offline_time=5, logcat_rate=10, packages=fleet_packages):
+        self.adb_server = FakeAdbServer()
+        self.pdu = FakePdu()
+        self.devices = []
+        self.ips = []
+        self.oids = []
+        for i in range(count):
+            ip = f"10.200.{i // 250}.{i % 250 + 1}"
+            pids = {package: 2000 + 100 * i + n for n, package in enumerate(packages.values())}
+            device = FakeDevice(
+                properties={"ro.product.device": "UZW4020BYT", "ro.build.version.incremental": "1.0.0",
+                            "ro.serialno": f"SIM{i:05d}"},
+                processes=pids, focus=packages.get('bbui'),
+                boot_time=boot_time, offline_time=offline_time, logcat_rate=logcat_rate)
+            self.adb_server.add_device(f"{ip}:5555", device)
+            self.oids.append(self.pdu.add_outlet(i + 1, device))
+            self.devices.append(device)
+            self.ips.append(ip)
+
+    def config_pdu(self, i):
+        return f"{self.pdu.host}:{self.pdu.port} {self.oids[i]}"
+
+    def start(self):
+        self.adb_server.start()
+        self.pdu.start()
+        return self
+
+    def stop(self):
+        self.pdu.stop()
+        self.adb_server.stop()
+
+
+# --- Test de charge ---
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return "-"
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p / 100))]
+    return f"p50 {pick(50):.3f}s p90 {pick(90):.3f}s p99 {pick(99):.3f}s max {values[-1]:.3f}s ({len(values)})"
+
+
+def write_bytes():
+    """ Octets écrits par le processus (/proc/self/io), None si indisponible. """
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def wait_for_pid(watcher, name, pid, timeout):
+    """ Secondes jusqu'à ce que la surveillance voie le PID pid pour name, None après timeout. """
+    start = time.time()
+    while time.time() - start < timeout:
+        snapshot = watcher.get(timeout=timeout - (time.time() - start))
+        if snapshot is not None and snapshot.pids.get(name) == pid:
+            return time.time() - start
+    return None
+
+
+def repo_pdu_reboot():
+    """
+    reboot_via_pdu de script_reboot_orange (snmpset off puis on), ou None
+    avec la raison si snmpset ou le module manque.
+    """
+    if shutil.which("snmpset") is None:
+        return None, "snmpset introuvable"
+    try:
+        from script_reboot_orange import reboot_via_pdu
+    except ImportError as e:
+        # Import relatif au paquet des scripts de test : hors de ce paquet, le module ne se charge pas
+        return None, f"script_reboot_orange non importable ({e})"
+    return reboot_via_pdu, None
+
+
+def run_box(fleet, i, cycles, log_dir, metrics, use_pdu, pdu_reboot=None):
+    import zap_functions
+    import script_reboot
+    from adb_client import adb, device_serial
+    from process_watcher import ProcessWatcher
+
+    ip, device = fleet.ips[i], fleet.devices[i]
+    serial = device_serial(ip)
+    log_file = os.path.join(log_dir, f"logcat_{ip}.txt")
+    zap_functions.connect_adb(ip)
+    watcher = ProcessWatcher(ip, fleet_packages, interval=1).start()
+    pdu_host, pdu_port = fleet.pdu.host, fleet.pdu.port
+
+    for cycle in range(cycles):
+        zap_functions.initialize_logcat(log_file, ip)
+        for _ in range(5):
+            t0 = time.perf_counter()
+            adb.shell(serial, "getprop sys.boot_completed")
+            metrics["adb"].append(time.perf_counter() - t0)
+
+        # Crash injecté une fois la surveillance à jour (reconnectée après le reboot) :
+        # délai jusqu'au changement de PID vu par la surveillance
+        comedia = fleet_packages['comedia']
+        wait_for_pid(watcher, 'comedia', device.processes.get(comedia), 30)
+        device.crash(comedia)
+        device.log_error(f"LIVE;F3411;{ip};{cycle};crash")
+        detected = wait_for_pid(watcher, 'comedia', device.processes.get(comedia), 10)
+        if detected is None:
+            metrics["missed_crashes"] += 1
+        else:
+            metrics["crash"].append(detected)
+        time.sleep(1)
+        zap_functions.record_logs(log_file, None, ip)
+
+        # Reboot puis attente de fin de démarrage, comme script_reboot
+        boot_id = adb.boot_id(serial)
+        rebooted_at = time.time()
+        if use_pdu and pdu_reboot is not None:
+            # Chemin des scripts : off, 1 s, on, par snmpset sur la prise de la box
+            pdu_reboot(fleet.config_pdu(i))
+            off_time = time.time() - rebooted_at
+        elif use_pdu:
+            snmp_set(pdu_host, pdu_port, fleet.oids[i], outlet_reboot)
+            off_time = fleet.pdu.reboot_delay
+        else:
+            adb.reboot(serial)
+            off_time = 0
+        boot_duration = script_reboot.wait_for_device(ip, device.offline_time + device.boot_time + off_time + 60,
+                                                      boot_id=boot_id, since=rebooted_at)
+        if boot_duration is None:
+            metrics["boot_timeouts"] += 1
+        else:
+            # Écart de la durée de démarrage mesurée au démarrage simulé, et retard du retour de wait_for_device
+            expected = off_time + device.offline_time + device.boot_time
+            metrics["boot_error"].append(boot_duration - expected)
+            metrics["boot_overshoot"].append(time.time() - rebooted_at - expected)
+    watcher.stop()
+
+
+def load_test(boxes=50, cycles=2, boot_time=20, offline_time=5, logcat_rate=10, pdu_ratio=0.5):
+    from adb_client import adb
+
+    pdu_reboot, reason = repo_pdu_reboot()
+    fleet = FakeFleet(boxes, boot_time, offline_time, logcat_rate).start()
+    adb.host, adb.port = fleet.adb_server.host, fleet.adb_server.port
+    metrics = {"adb": [], "crash": [], "boot_error": [], "boot_overshoot": [], "missed_crashes": 0, "boot_timeouts": 0}
+    log_dir = tempfile.mkdtemp(prefix="ivs_fleet_")
+    times_start, wall_start, written_start = os.times(), time.time(), write_bytes()
+    peak_threads = 0
+    try:
+        threads = [threading.Thread(target=run_box, args=(fleet, i, cycles, log_dir, metrics, i < boxes * pdu_ratio, pdu_reboot),
+                                    daemon=True) for i in range(boxes)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.5)
+    finally:
+        times_end, wall = os.times(), time.time() - wall_start
+        written_end = write_bytes()
+        fleet.stop()
+
+    cpu = (times_end.user - times_start.user) + (times_end.system - times_start.system)
+    log_bytes = sum(os.path.getsize(os.path.join(log_dir, name)) for name in os.listdir(log_dir))
+    shutil.rmtree(log_dir, ignore_errors=True)
+    print(f"{boxes} box simulées, {cycles} cycles, {wall:.1f} s")
+    print(f"CPU du processus : {cpu:.1f} s ({100 * cpu / wall:.0f} % d'un cœur), {peak_threads} threads au maximum")
+    print(f"Latence adb (getprop)        : {percentiles(metrics['adb'])}")
+    print(f"Détection des crashs         : {percentiles(metrics['crash'])}, {metrics['missed_crashes']} manqués")
+    print(f"Reboot PDU                   : "
+          + ("reboot_via_pdu (snmpset)" if pdu_reboot else f"client SNMP interne, {reason}"))
+    print(f"Écart au démarrage simulé    : {percentiles(metrics['boot_error'])}, "
+          f"{metrics['boot_timeouts']} timeouts (scripts côté box émulés)")
+    print(f"Retard de wait_for_device    : {percentiles(metrics['boot_overshoot'])}")
+    written = f"{(written_end - written_start) / 2 ** 20:.1f} Mo écrits" if written_start is not None else ""
+    print(f"Fichiers logcat : {log_bytes / 2 ** 20:.1f} Mo {written}")
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge sur un parc de box simulées")
+    parser.add_argument("--boxes", type=int, default=50)
+    parser.add_argument("--cycles", type=int, default=2)
+    parser.add_argument("--boot-time", type=float, default=20)
+    parser.add_argument("--offline-time", type=float, default=5)
+    parser.add_argument("--logcat-rate", type=float, default=10, help="lignes logcat par seconde et par box")
+    parser.add_argument("--pdu-ratio", type=float, default=0.5, help="part des box redémarrées par la PDU")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    import zap_functions  # noqa: F401  (configure le logging à l'import)
+    logging.getLogger().setLevel(args.log_level)
+    load_test(args.boxes, args.cycles, args.boot_time, args.offline_time, args.logcat_rate, args.pdu_ratio)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
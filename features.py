@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+
+class FrameFeatures:
+    """
+    Représentations dérivées d'une frame, calculées à la demande et gardées
+    pour tous les détecteurs qui analysent la même frame :
+
+    - gray          : niveaux de gris (la frame elle-même si elle l'est déjà)
+    - gray_roi(roi) : niveaux de gris d'une zone seule, mémorisés par zone
+    - mean(roi)     : moyennes de zones (cv2.mean), mémorisées par zone
+    - small(stride) : sous-échantillonnage (1 pixel sur stride), contigu
+
+    Les zones sont des (slice_y, slice_x), comme RoiLayout.slices().
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._gray = None
+        self._means = {}
+        self._gray_rois = {}
+        self._small = {}
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = self.frame if self.frame.ndim == 2 else cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def gray_roi(self, roi):
+        """ Zone en niveaux de gris, sans convertir le reste de la frame. """
+        if self._gray is not None or self.frame.ndim == 2:
+            return self.gray[roi]
+        key = (roi[0].start, roi[0].stop, roi[1].start, roi[1].stop)
+        gray = self._gray_rois.get(key)
+        if gray is None:
+            gray = cv2.cvtColor(self.frame[roi], cv2.COLOR_BGR2GRAY)
+            self._gray_rois[key] = gray
+        return gray
+
+    def channel_means(self, roi):
+        """ Moyenne de chaque canal sur la zone (comme cv2.mean()[:3]). """
+        key = (roi[0].start, roi[0].stop, roi[1].start, roi[1].stop)
+        means = self._means.get(key)
+        if means is None:
+            channels = 1 if self.frame.ndim == 2 else self.frame.shape[2]
+            means = tuple(cv2.mean(self.frame[roi])[:channels])
+            self._means[key] = means
+        return means
+
+    def mean(self, roi):
+        """ Moyenne de tous les pixels et canaux de la zone (comme np.average(frame[roi])). """
+        means = self.channel_means(roi)
+        return sum(means) / len(means)
+
+    def small(self, stride):
+        if stride not in self._small:
+            self._small[stride] = np.ascontiguousarray(self.frame[::stride, ::stride])
+        return self._small[stride]
+
+
+def features_of(frame):
+    """ FrameFeatures partagées si la frame en est déjà une, sinon nouvelles. """
+    return frame if isinstance(frame, FrameFeatures) else FrameFeatures(frame)
@@ -0,0 +1,211 @@
+"""
+Anneau de frames en mémoire partagée (multiprocessing.shared_memory) :
+le processus de capture écrit chaque frame dans un emplacement de taille
+fixe, les processus de détection la lisent sur place, sans pickle ni copie
+de la frame. OCR, recherche de modèles et détection de mouvement tournent
+ainsi sur d'autres cœurs que la capture, hors du GIL du processus principal.
+
+Chaque emplacement porte un numéro de séquence (écrit avant et après la
+frame) et l'heure de capture : un lecteur sait si la frame qu'il lit est
+complète et si elle a été réécrite pendant qu'il l'analysait.
+"""
+import time
+import queue
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from capture import CapturedFrame
+
+# Par emplacement : séquence en début et en fin d'écriture, heure de capture
+slot_dtype = np.dtype([("begin", "<u8"), ("end", "<u8"), ("timestamp", "<f8")])
+# Entête : dernière séquence écrite, anneau fermé par l'écrivain
+control_size = 2 * 8
+alignment = 64
+
+
+def _layout(shape, slots):
+    meta_offset = control_size
+    frames_offset = -(-(meta_offset + slots * slot_dtype.itemsize) // alignment) * alignment
+    frame_size = int(np.prod(shape))
+    return meta_offset, frames_offset, frame_size, frames_offset + slots * frame_size
+
+
+class FrameRing:
+    """
+    Anneau de slots frames uint8 de forme shape. Un seul écrivain (le
+    processus qui le crée), autant de lecteurs que voulu, attachés avec
+    FrameRing.attach(ring.spec()).
+
+    Les frames lues sont des vues sur la mémoire partagée : valables tant
+    que l'écrivain n'a pas fait le tour de l'anneau (slots - 1 frames plus
+    tard). Un lecteur plus lent saute les frames trop anciennes (skipped)
+    et compte celles réécrites pendant leur analyse (overwritten).
+    """
+
+    def __init__(self, shape, slots=16, name=None, create=True):
+        self.shape = tuple(shape)
+        self.slots = slots
+        meta_offset, frames_offset, frame_size, total = _layout(self.shape, slots)
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=total if create else 0)
+        self.owner = create
+        buf = self.shm.buf
+        self._control = np.ndarray((2,), dtype="<u8", buffer=buf, offset=0)
+        self._meta = np.ndarray((slots,), dtype=slot_dtype, buffer=buf, offset=meta_offset)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=frames_offset)
+        if create:
+            self._control[:] = 0
+            self._meta[:] = 0
+        self.written = 0
+        self.read_count = 0
+        self.skipped = 0
+        self.overwritten = 0
+
+    def spec(self):
+        """ Ce qu'il faut passer à un autre processus pour s'attacher à l'anneau. """
+        return self.shm.name, self.shape, self.slots
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, slots = spec
+        return cls(shape, slots, name=name, create=False)
+
+    @property
+    def head(self):
+        """ Séquence de la dernière frame écrite (0 : aucune). """
+        return int(self._control[0])
+
+    @property
+    def closed(self):
+        return bool(self._control[1])
+
+    def write(self, frame, timestamp, extract=None):
+        """
+        Écrit la frame dans le prochain emplacement. extract(frame, out=...)
+        (RoiLayout.extract par exemple) écrit directement dans l'emplacement
+        au lieu d'une copie de la frame entière.
+        """
+        seq = self.head + 1
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        meta["begin"] = seq
+        if extract is not None:
+            extract(frame, out=self._frames[slot])
+        else:
+            np.copyto(self._frames[slot], frame)
+        meta["timestamp"] = timestamp
+        meta["end"] = seq
+        self._control[0] = seq
+        self.written += 1
+        return seq
+
+    def read(self, seq):
+        """ CapturedFrame (vue) de la séquence seq, ou None si elle n'est plus (ou pas encore) dans l'anneau. """
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        if int(meta["end"]) != seq or int(meta["begin"]) != seq:
+            return None
+        return CapturedFrame(seq, self._frames[slot], float(meta["timestamp"]))
+
+    def valid(self, seq):
+        """ Faux si l'écrivain a commencé à réécrire l'emplacement de seq. """
+        return int(self._meta[seq % self.slots]["begin"]) == seq
+
+    def frames(self, poll=0.002):
+        """
+        Générateur des nouvelles frames, jusqu'à la fermeture de l'anneau.
+        Sans notification entre processus, l'arrivée d'une frame est guettée
+        toutes les poll secondes.
+        """
+        next_seq = max(self.head, 1)
+        while True:
+            head = self.head
+            if head < next_seq:
+                if self.closed:
+                    return
+                time.sleep(poll)
+                continue
+            if head - next_seq >= self.slots - 1:
+                # Emplacements sur le point d'être réécrits : reprise à la plus récente
+                self.skipped += head - next_seq
+                next_seq = head
+            item = self.read(next_seq)
+            if item is None:
+                self.skipped += 1
+                next_seq += 1
+                continue
+            self.read_count += 1
+            yield item
+            if not self.valid(item.index):
+                self.overwritten += 1
+            next_seq += 1
+
+    def close_writer(self):
+        """ Signale aux lecteurs la fin du flux. """
+        self._control[1] = 1
+
+    def close(self):
+        # Les vues numpy doivent disparaître avant de fermer la mémoire partagée
+        self._control = self._meta = self._frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def stats(self):
+        return {"written": self.written, "read": self.read_count,
+                "skipped": self.skipped, "overwritten": self.overwritten}
+
+
+class DetectionProcess:
+    """
+    Détection dans un processus dédié, alimenté par un FrameRing.
+
+    target(ring_spec, start, results) tourne dans le processus fils : il
+    s'attache à l'anneau, analyse les frames capturées à partir de
+    start.value (0 : en attente) et dépose ses résultats, de petits tuples,
+    dans la file results. Le processus est lancé en 'spawn' : il ne
+    reprend pas les threads (capture, encodeur) ni les verrous du parent.
+    """
+
+    def __init__(self, target, shape, slots=16, extract=None):
+        context = multiprocessing.get_context("spawn")
+        self.ring = FrameRing(shape, slots)
+        self.extract = extract
+        self.start_time = context.Value('d', 0.0)
+        self.results = context.Queue()
+        self.process = context.Process(target=target, args=(self.ring.spec(), self.start_time, self.results),
+                                       daemon=True)
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def submit(self, item):
+        """ Écrit une CapturedFrame dans l'anneau. """
+        self.ring.write(item.frame, item.timestamp, self.extract)
+
+    def analyse_from(self, timestamp):
+        """ Analyse des frames capturées à partir de timestamp ; 0 arrête l'analyse. """
+        if timestamp:
+            # Résultats d'une analyse précédente pas encore lus
+            while self.poll() is not None:
+                pass
+        self.start_time.value = timestamp
+
+    def poll(self):
+        """ Prochain résultat du processus fils, ou None. """
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def stop(self, timeout=5):
+        self.ring.close_writer()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logging.debug("Processus de détection toujours actif, arrêt forcé")
+            self.process.terminate()
+            self.process.join()
+        logging.debug(f"Anneau de frames : {self.ring.stats()}")
+        self.results.close()
+        self.ring.close()
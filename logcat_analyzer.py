@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import logging
+from collections import Counter
+
+log_error_pattern = re.compile(rb'LOG_ERROR: (.*)')
+
+
+class LogcatAnalyzer:
+    """
+    Analyse incrémentale du fichier logcat d'un test d'endurance. Chaque
+    appel à update() ne lit que ce qui a été ajouté depuis le dernier appel
+    (à partir d'un offset en octets), par blocs de taille fixe : la mémoire
+    et le temps d'un rapport ne dépendent pas de la taille du fichier.
+    Les compteurs F3411/F3413 et les signatures d'erreur sont cumulés.
+
+    Avec checkpoint_file, l'état (offset, compteurs) est sauvegardé après
+    chaque update() et rechargé à la création, pour reprendre l'analyse
+    après un redémarrage du script sans relire le début du fichier.
+    """
+
+    def __init__(self, log_file, checkpoint_file=None, chunk_size=1 << 20):
+        self.log_file = log_file
+        self.checkpoint_file = checkpoint_file
+        self.chunk_size = chunk_size
+        self.reset()
+        if checkpoint_file and os.path.isfile(checkpoint_file):
+            self.load_checkpoint()
+
+    def reset(self):
+        self.offset = 0
+        self.f3411_count = 0
+        self.f3413_count = 0
+        self.error_counts = Counter()
+        self._partial = b''
+
+    def update(self):
+        """ Analyse les nouvelles lignes du fichier et retourne le nombre de lignes lues. """
+        try:
+            size = os.path.getsize(self.log_file)
+        except OSError as e:
+            logging.error(f"Lecture impossible du fichier de logs {self.log_file} : {e}")
+            return 0
+        if size < self.offset:
+            # Fichier recréé (nouveau logcat) : on repart du début
+            logging.debug(f"{self.log_file} a été tronqué, reprise de l'analyse au début")
+            self.reset()
+
+        lines = 0
+        with open(self.log_file, 'rb') as lf:
+            lf.seek(self.offset)
+            while True:
+                chunk = lf.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.offset += len(chunk)
+                data = self._partial + chunk
+                # La dernière ligne peut être incomplète : elle est gardée pour le bloc suivant
+                end = data.rfind(b'\n')
+                if end == -1:
+                    self._partial = data
+                    continue
+                self._partial = data[end + 1:]
+                lines += self._process(data[:end])
+        self.save_checkpoint()
+        logging.debug(f"{lines} nouvelles lignes analysées dans {self.log_file} (offset {self.offset})")
+        return lines
+
+    def _process(self, data):
+        lines = data.split(b'\n')
+        if b'LOG_ERROR' not in data:
+            return len(lines)
+        for line in lines:
+            if b'LOG_ERROR' not in line:
+                continue
+            match = log_error_pattern.search(line)
+            if match is None:
+                continue
+            log_error_content = match.group(1).decode(errors='replace').strip()
+            if 'LIVE;F3411' in log_error_content:
+                self.f3411_count += 1
+            if 'LIVE;F3413' in log_error_content:
+                self.f3413_count += 1
+
+            elements = log_error_content.split(';')
+            if len(elements) >= 4:
+                self.error_counts[';'.join(elements[-4:])] += 1
+        return len(lines)
+
+    def grep_output(self):
+        """ Signatures d'erreur au format du fichier de résultats ('erreur=nombre|...'). """
+        return '|'.join([f"{error}={count}" if count > 1 else error for error, count in self.error_counts.items()])
+
+    def results(self):
+        return self.f3411_count, self.f3413_count, self.grep_output()
+
+    def save_checkpoint(self):
+        if not self.checkpoint_file:
+            return
+        state = {
+            "offset": self.offset - len(self._partial),
+            "f3411_count": self.f3411_count,
+            "f3413_count": self.f3413_count,
+            "error_counts": dict(self.error_counts),
+        }
+        temporary = self.checkpoint_file + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.checkpoint_file)
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Checkpoint {self.checkpoint_file} illisible, analyse depuis le début : {e}")
+            return
+        self.offset = state["offset"]
+        self.f3411_count = state["f3411_count"]
+        self.f3413_count = state["f3413_count"]
+        self.error_counts = Counter(state["error_counts"])
+        self._partial = b''
+        logging.debug(f"Reprise de l'analyse de {self.log_file} à l'offset {self.offset}")
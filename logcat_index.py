@@ -0,0 +1,163 @@
+"""
+Index temporel d'un fichier logcat (format threadtime), écrit à côté du
+fichier pendant la capture (<log_file>.idx) :
+
+    T <epoch> <offset>   première ligne de chaque seconde
+    E <epoch> <offset>   chaque ligne LOG_ERROR
+
+Les requêtes sur une fenêtre de temps se font ensuite par seek, sans
+relire le fichier depuis le début.
+"""
+import os
+import bisect
+import logging
+from collections import deque
+from datetime import datetime
+from segments import report_incident
+
+timestamp_length = len("MM-DD HH:MM:SS")
+
+
+def index_path(log_file):
+    return f"{log_file}.idx"
+
+
+def parse_timestamp(line, year):
+    """ Epoch (secondes) d'une ligne logcat 'MM-DD HH:MM:SS.mmm ...', None sinon. """
+    try:
+        return datetime.strptime(line[:timestamp_length].decode(), "%m-%d %H:%M:%S").replace(year=year).timestamp()
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class LogcatIndexWriter:
+    """
+    Construit l'index au fil des blocs écrits dans le fichier logcat.
+    Une rafale de burst_count LOG_ERROR en moins de burst_window secondes
+    est signalée comme incident (segments vidéo conservés).
+    """
+
+    def __init__(self, log_file, year=None, burst_count=5, burst_window=10):
+        self.index_file = open(index_path(log_file), 'w')
+        self.year = year or datetime.now().year
+        self.offset = 0
+        self.burst_count = burst_count
+        self.burst_window = burst_window
+        self._recent_errors = deque()
+        self._partial = b''
+        self._last_second = None
+
+    def feed(self, chunk):
+        """ À appeler avec chaque bloc, dans l'ordre, juste après son écriture. """
+        data = self._partial + chunk
+        line_start = self.offset - len(self._partial)
+        entries = []
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end == -1:
+                break
+            line = data[start:end]
+            second = line[:timestamp_length]
+            if second != self._last_second:
+                epoch = parse_timestamp(line, self.year)
+                if epoch is not None:
+                    self._last_second = second
+                    entries.append(f"T {epoch:.0f} {line_start + start}\n")
+            if b'LOG_ERROR' in line:
+                epoch = parse_timestamp(line, self.year)
+                if epoch is not None:
+                    entries.append(f"E {epoch:.0f} {line_start + start}\n")
+                    self._error_at(epoch)
+            start = end + 1
+        self._partial = data[start:]
+        self.offset += len(chunk)
+        if entries:
+            self.index_file.write(''.join(entries))
+            self.index_file.flush()
+
+    def _error_at(self, epoch):
+        recent = self._recent_errors
+        recent.append(epoch)
+        while recent and recent[0] < epoch - self.burst_window:
+            recent.popleft()
+        if len(recent) >= self.burst_count:
+            report_incident(datetime.fromtimestamp(recent[0]), f"rafale de {len(recent)} LOG_ERROR")
+            recent.clear()
+
+    def close(self):
+        self.index_file.close()
+
+
+class LogcatIndex:
+    """
+    Lecture d'un fichier logcat par fenêtre de temps à l'aide de son index.
+    t1 et t2 sont des datetime ou des epoch en secondes (bornes incluses, à
+    la seconde près). L'index est relu à chaque requête s'il a grandi,
+    l'analyse est donc possible pendant la capture.
+    """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.index_file = index_path(log_file)
+        self._size = -1
+        self.seconds = []  # (epoch, offset) triés
+        self.errors = []
+
+    def _load(self):
+        try:
+            size = os.path.getsize(self.index_file)
+        except OSError:
+            logging.error(f"Index logcat absent : {self.index_file}")
+            return
+        if size == self._size:
+            return
+        self.seconds, self.errors = [], []
+        with open(self.index_file) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 3:
+                    continue
+                entry = (int(fields[1]), int(fields[2]))
+                (self.seconds if fields[0] == 'T' else self.errors).append(entry)
+        self._size = size
+
+    @staticmethod
+    def _epoch(t):
+        return t.timestamp() if isinstance(t, datetime) else t
+
+    def lines(self, t1, t2):
+        """ Lignes (str) dont l'horodatage est entre t1 et t2. """
+        self._load()
+        t1, t2 = self._epoch(t1), self._epoch(t2)
+        position = bisect.bisect_left(self.seconds, (int(t1), -1))
+        if position == len(self.seconds):
+            return []
+        selected = []
+        with open(self.log_file, 'rb') as lf:
+            lf.seek(self.seconds[position][1])
+            for line in lf:
+                epoch = parse_timestamp(line, datetime.fromtimestamp(t1).year)
+                if epoch is not None and epoch > t2:
+                    break
+                selected.append(line.decode(errors='replace').rstrip('\r\n'))
+        return selected
+
+    def error_lines(self, t1, t2):
+        """ Lignes LOG_ERROR entre t1 et t2, lues directement à leur offset. """
+        self._load()
+        t1, t2 = self._epoch(t1), self._epoch(t2)
+        start = bisect.bisect_left(self.errors, (int(t1), -1))
+        end = bisect.bisect_right(self.errors, (int(t2), float('inf')))
+        selected = []
+        with open(self.log_file, 'rb') as lf:
+            for _, offset in self.errors[start:end]:
+                lf.seek(offset)
+                selected.append(lf.readline().decode(errors='replace').rstrip('\r\n'))
+        return selected
+
+    def around(self, t, before=30, after=30, errors_only=False):
+        """ Fenêtre autour d'un incident (écran noir, changement de PID...). """
+        t = self._epoch(t)
+        query = self.error_lines if errors_only else self.lines
+        return query(t - before, t + after)
@@ -0,0 +1,128 @@
+import time
+import logging
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """
+    Pourcentage de pixels qui changent d'une frame à l'autre dans une zone.
+    Tous les buffers (référence, frame courante, différence, masque) sont
+    alloués au premier appel puis réutilisés : aucune allocation par frame.
+    L'état est propre à l'instance, une instance par zone et par box.
+
+    roi            : (slice_y, slice_x) dans la frame reçue, None pour toute la frame
+    pixel_threshold: écart minimal (0-255) pour qu'un pixel compte comme changé
+    gray           : conversion en niveaux de gris avant comparaison
+    downsample     : facteur de sous-échantillonnage (plus proche voisin)
+    hold_reference : la référence n'est mise à jour que quand la zone est
+                     statique (comportement historique de zap2.detect_stream)
+    motion_threshold: pourcentage au-delà duquel la frame compte comme en mouvement
+    """
+
+    def __init__(self, roi=None, pixel_threshold=10, gray=False, downsample=1,
+                 hold_reference=False, motion_threshold=5, frame_budget=1 / 30):
+        self.roi = roi
+        self.pixel_threshold = pixel_threshold
+        self.gray = gray
+        self.downsample = downsample
+        self.hold_reference = hold_reference
+        self.motion_threshold = motion_threshold
+        self.frame_budget = frame_budget
+        self._shape = None
+        self._has_reference = False
+        # Coût par frame
+        self.frames = 0
+        self.total_cost = 0.0
+        self.max_cost = 0.0
+        self.last_cost = 0.0
+        self.over_budget = 0
+
+    def _allocate(self, region):
+        height, width = region.shape[:2]
+        if self.downsample > 1:
+            height, width = height // self.downsample, width // self.downsample
+        channels = 1 if self.gray or region.ndim == 2 else region.shape[2]
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        self._source_shape = region.shape
+        self._shape = shape
+        self._small = np.empty((height, width) + region.shape[2:], dtype=np.uint8) if self.downsample > 1 else None
+        self._reference = np.empty(shape, dtype=np.uint8)
+        self._current = np.empty(shape, dtype=np.uint8)
+        self._diff = np.empty(shape, dtype=np.uint8)
+        self._mask = np.empty(shape, dtype=np.uint8)
+        # Vue 2D du masque pour countNonZero (mono-canal uniquement)
+        self._mask_2d = self._mask.reshape(height, -1)
+        self._size = self._mask.size
+
+    def _prepare(self, frame):
+        """ Copie la zone (réduite, en gris) dans le buffer courant sans allocation. """
+        region = frame[self.roi] if self.roi is not None else frame
+        if self._shape is None or region.shape != self._source_shape:
+            self._allocate(region)
+            self._has_reference = False
+        dst = self._current
+        if self._small is not None:
+            cv2.resize(region, (self._small.shape[1], self._small.shape[0]), dst=self._small,
+                       interpolation=cv2.INTER_NEAREST)
+            region = self._small
+        if self.gray and region.ndim == 3:
+            cv2.cvtColor(region, cv2.COLOR_BGR2GRAY, dst=dst)
+        else:
+            np.copyto(dst, region)
+        return dst
+
+    def reset(self, frame=None):
+        """ Oublie la référence ; si une frame est donnée, elle devient la référence. """
+        self._has_reference = False
+        if frame is not None:
+            self._prepare(frame)
+            self._reference, self._current = self._current, self._reference
+            self._has_reference = True
+
+    def update(self, frame):
+        """
+        Compare la frame à la référence et retourne le pourcentage de pixels
+        changés, ou None si la frame sert de première référence.
+        """
+        start = time.perf_counter()
+        current = self._prepare(frame)
+        if not self._has_reference:
+            self._reference, self._current = current, self._reference
+            self._has_reference = True
+            return None
+
+        cv2.absdiff(current, self._reference, dst=self._diff)
+        cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._mask)
+        percentage = cv2.countNonZero(self._mask_2d) / self._size * 100
+
+        if not (self.hold_reference and percentage > self.motion_threshold):
+            # Échange des buffers : la frame courante devient la référence
+            self._reference, self._current = current, self._reference
+
+        cost = time.perf_counter() - start
+        self.frames += 1
+        self.total_cost += cost
+        self.last_cost = cost
+        self.max_cost = max(self.max_cost, cost)
+        if cost > self.frame_budget:
+            self.over_budget += 1
+        return percentage
+
+    def is_moving(self, frame):
+        percentage = self.update(frame)
+        return percentage is not None and percentage > self.motion_threshold
+
+    def stats(self):
+        """ Coût par frame en millisecondes. """
+        mean = self.total_cost / self.frames if self.frames else 0.0
+        return {
+            "frames": self.frames,
+            "mean_ms": round(mean * 1000, 3),
+            "max_ms": round(self.max_cost * 1000, 3),
+            "last_ms": round(self.last_cost * 1000, 3),
+            "over_budget": self.over_budget,
+        }
+
+    def log_stats(self, name="mouvement"):
+        logging.debug(f"Coût détecteur {name} : {self.stats()}")
@@ -0,0 +1,117 @@
+import threading
+import logging
+from collections import OrderedDict
+import cv2
+import numpy as np
+import pytesseract
+
+try:
+    # Liaison directe à libtesseract : le moteur reste chargé entre deux appels (pip install tesserocr)
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Vignette du contrôle au pixel : zone réduite d'un facteur 4 (moyenne, le bruit s'y efface)
+thumbnail_factor = 4
+
+
+def dhash(image, size=8):
+    """ Hash perceptuel (différence horizontale sur une vignette (size+1)xsize) sur size² bits. """
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def thumbnail(image, factor=thumbnail_factor):
+    """ Vignette en niveaux de gris réduite de factor (moyenne par bloc). """
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape[:2]
+    return cv2.resize(gray, (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA)
+
+
+class OcrEngine:
+    """
+    OCR avec un moteur tesseract persistant (tesserocr s'il est installé,
+    sinon pytesseract, qui lance un processus par appel) et un cache des
+    résultats par zone : une image dont le hash perceptuel est à moins de
+    max_distance bits d'une image déjà lue n'est pas relue. Un écran
+    d'erreur qui reste affiché n'est donc lu qu'une fois.
+
+    Une zone dont le texte doit être exact (un code d'erreur, où un seul
+    chiffre change à peine le hash) se règle avec configure_zone : un
+    résultat du cache n'y est repris que si la vignette en niveaux de gris
+    de l'image ne s'écarte nulle part de plus de pixel_check de celle lue.
+    Le bruit de capture, moyenné par la vignette, reste bien en dessous ;
+    un caractère différent le dépasse largement.
+    """
+
+    def __init__(self, lang="eng", cache_size=64, max_distance=4):
+        self.lang = lang
+        self.cache_size = cache_size
+        self.max_distance = max_distance
+        self._zones = {}  # nom de zone -> (distance maximale, écart maximal de la vignette)
+        self._cache = {}  # nom de zone -> OrderedDict(hash -> (vignette, texte))
+        self._lock = threading.Lock()
+        self._api = None
+        self.hits = 0
+        self.misses = 0
+        if tesserocr is None:
+            logging.warning("OCR : tesserocr absent, un processus tesseract (pytesseract) par lecture")
+
+    def _recognize(self, image):
+        if tesserocr is not None:
+            if self._api is None:
+                self._api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            image = np.ascontiguousarray(image)
+            height, width = image.shape[:2]
+            channels = 1 if image.ndim == 2 else image.shape[2]
+            self._api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+            return self._api.GetUTF8Text()
+        return pytesseract.image_to_string(image, lang=self.lang)
+
+    def configure_zone(self, name, max_distance=None, pixel_check=None):
+        """ Distance maximale du hash et contrôle au pixel (écart de vignette maximal) propres à la zone name. """
+        with self._lock:
+            self._zones[name] = (self.max_distance if max_distance is None else max_distance, pixel_check)
+            self._cache.pop(name, None)
+
+    def read(self, image, name):
+        """ Texte de l'image (RGB ou gris) de la zone name, depuis le cache si possible. """
+        max_distance, pixel_check = self._zones.get(name, (self.max_distance, None))
+        key = dhash(image)
+        small = thumbnail(image) if pixel_check is not None else None
+        with self._lock:
+            cache = self._cache.setdefault(name, OrderedDict())
+            for cached_key, (cached_small, text) in cache.items():
+                if bin(cached_key ^ key).count('1') > max_distance:
+                    continue
+                if small is not None and (cached_small.shape != small.shape or
+                                          cv2.absdiff(cached_small, small).max() > pixel_check):
+                    continue
+                cache.move_to_end(cached_key)
+                self.hits += 1
+                return text
+
+            self.misses += 1
+            text = self._recognize(image)
+            cache[key] = (small, text)
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+            return text
+
+    def clear(self):
+        """ Vide le cache (les prochaines lectures repassent par tesseract). """
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        with self._lock:
+            if self._api is not None:
+                self._api.End()
+                self._api = None
+        logging.debug(f"OCR : {self.misses} lectures, {self.hits} résultats repris du cache")
+
+
+# Moteur partagé par le processus
+ocr_engine = OcrEngine()
@@ -0,0 +1,118 @@
+import queue
+import threading
+import logging
+from collections import namedtuple
+from datetime import datetime
+from adb_client import adb, device_serial, AdbError
+
+# État des processus surveillés à un instant donné, horodaté par la box
+ProcessSnapshot = namedtuple("ProcessSnapshot", ["timestamp", "pids", "focus"])
+
+
+def parse_pid(output):
+    """ Premier PID de la sortie de pidof, None si le processus n'existe pas. """
+    fields = output.split()
+    return int(fields[0]) if fields and fields[0].isdigit() else None
+
+
+class ProcessWatcher:
+    """
+    Surveille les PID d'une liste de paquets et l'activité au premier plan
+    via une seule session shell longue durée sur la box. Une boucle côté box
+    n'écrit une ligne que quand quelque chose change (ou toutes les
+    heartbeat secondes), horodatée par l'horloge de la box :
+
+        <epoch>|<pid paquet 1>|...|<pid paquet n>|<ligne mCurrentFocus>
+
+    Les changements arrivent donc à la seconde près, sans un appel adb par
+    paquet et par cycle. Les pidof sont faits à chaque tour, mais le
+    'dumpsys window' (lourd : toutes les fenêtres) seulement quand un PID
+    change ou toutes les focus_interval secondes. La session est rouverte
+    automatiquement si la box redémarre ou se déconnecte.
+    """
+
+    def __init__(self, ip, packages, interval=1, heartbeat=30, focus_interval=5, client=adb):
+        self.serial = device_serial(ip)
+        self.names = list(packages)
+        self.packages = [packages[name] for name in self.names]
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.focus_interval = focus_interval
+        self.client = client
+        self.snapshots = queue.Queue()
+        self._stop = threading.Event()
+        self._stream = None
+        self._thread = None
+
+    def script(self):
+        pids = '|'.join(f'$(pidof {package})' for package in self.packages)
+        beats = max(1, int(self.heartbeat / self.interval))
+        focus_beats = max(1, int(self.focus_interval / self.interval))
+        # q : PID du dernier dumpsys ("-" force le premier), f : sa ligne mCurrentFocus
+        return (
+            'p=""; q="-"; f=""; i=0; n=0; while :; do '
+            f's="{pids}"; i=$((i+1)); n=$((n+1)); '
+            f'if [ "$s" != "$q" ] || [ $n -ge {focus_beats} ]; then '
+            'f="$(dumpsys window | grep mCurrentFocus)"; q="$s"; n=0; fi; '
+            f'if [ "$s|$f" != "$p" ] || [ $i -ge {beats} ]; then echo "$(date +%s)|$s|$f"; p="$s|$f"; i=0; fi; '
+            f'sleep {self.interval}; done'
+        )
+
+    def parse(self, line):
+        fields = line.split('|', len(self.packages) + 1)
+        if len(fields) != len(self.packages) + 2 or not fields[0].isdigit():
+            return None
+        pids = {name: parse_pid(field) for name, field in zip(self.names, fields[1:-1])}
+        return ProcessSnapshot(datetime.fromtimestamp(int(fields[0])), pids, fields[-1].strip())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def get(self, timeout=None):
+        """ Prochain état reçu, ou None après timeout secondes. """
+        try:
+            return self.snapshots.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._stream = self.client.open_stream(self.serial, "shell:" + self.script())
+                # Sans heartbeat pendant trois périodes, la connexion est considérée perdue
+                self._stream.settimeout(self.heartbeat * 3)
+                self._read(self._stream)
+            except (AdbError, OSError) as e:
+                if not self._stop.is_set():
+                    logging.debug(f"surveillance des processus de {self.serial} interrompue : {e}")
+            finally:
+                if self._stream is not None:
+                    self._stream.close()
+                    self._stream = None
+            self._stop.wait(self.interval * 5)
+
+    def _read(self, stream):
+        buffer = b''
+        while not self._stop.is_set():
+            chunk = stream.recv(4096)
+            if not chunk:
+                return
+            buffer += chunk
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                snapshot = self.parse(line.decode(errors='replace').strip())
+                if snapshot is not None:
+                    self.snapshots.put(snapshot)
@@ -0,0 +1,342 @@
+"""
+Ordonnanceur des campagnes de tests (remplace le lancement en arrière-plan
+de reboot.sh). Les tests sont lancés par un pool de workers, dans la limite
+des encodeurs/décodeurs vidéo que la machine peut tenir en temps réel, et
+jamais deux à la fois sur la même carte de capture ou la même PDU.
+L'état de la campagne (file, PID, statuts) est tenu par l'ordonnanceur seul,
+dans <log_dir>/campaign_state.json, qui met aussi à jour STATUT dans les
+fichiers de configuration.
+
+    python3 -m function.reboot.scheduler                  # toutes les configurations
+    python3 -m function.reboot.scheduler config.py        # une configuration
+    python3 -m function.reboot.scheduler stop config.py   # arrête un test en cours
+    python3 -m function.reboot.scheduler stop_all
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import signal
+import argparse
+import threading
+import subprocess
+import logging
+from datetime import datetime
+from config_loader import load_config
+
+CONFIG_DIR = os.path.expanduser("~/IVS/config")
+LOG_DIR = os.path.expanduser("~/IVS/logs")
+STATE_FILE = "campaign_state.json"
+test_module = "function.reboot.script_reboot"
+# Tests qui coupent l'alimentation de la box par la PDU (les autres redémarrent par adb)
+power_cycle_modules = {"function.reboot.script_reboot_orange"}
+status_line = re.compile(r'^STATUT *= *.*$', re.MULTILINE)
+
+# Un test reboot encode l'enregistrement et décode la capture HDMI
+job_costs = {"encoder": 1, "decoder": 1}
+
+
+def update_status(config_file, status):
+    """ Même effet que le sed de reboot.sh : STATUT = "<status>" dans la configuration. """
+    with open(config_file) as f:
+        content = f.read()
+    if status_line.search(content):
+        content = status_line.sub(f'STATUT = "{status}"', content)
+    else:
+        content = content.rstrip('\n') + f'\nSTATUT = "{status}"\n'
+    with open(config_file, 'w') as f:
+        f.write(content)
+    logging.info(f"Mise à jour du statut de {config_file} à \"{status}\"")
+
+
+def job_resources(config, module=test_module):
+    """
+    Ressources à accès exclusif d'un test : carte de capture, et PDU pour
+    les seuls tests qui coupent l'alimentation.
+    """
+    resources = set()
+    if getattr(config, "hdmi", None):
+        resources.add(f"hdmi:{config.hdmi}")
+    if module in power_cycle_modules and getattr(config, "PDU", None):
+        resources.add(f"pdu:{config.PDU.split()[0]}")
+    return resources
+
+
+class Job:
+
+    def __init__(self, config_file, resources, costs=None):
+        self.config_file = config_file
+        self.resources = resources
+        self.costs = dict(costs or job_costs)
+        self.status = "attente"
+        self.process = None
+        self.started = None
+        self.ended = None
+        self.returncode = None
+
+    def state(self):
+        return {
+            "status": self.status,
+            "pid": self.process.pid if self.process is not None else None,
+            "resources": sorted(self.resources),
+            "started": self.started,
+            "ended": self.ended,
+            "returncode": self.returncode,
+        }
+
+
+class Scheduler:
+    """
+    Pool de workers qui prend, dans l'ordre de la file, le premier test dont
+    toutes les ressources sont libres : plafonds d'encodeurs et de décodeurs
+    (budget CPU de la machine) et ressources exclusives (carte de capture,
+    PDU). Un test bloqué sur une ressource ne bloque pas les suivants.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, max_workers=None, max_encoders=None, max_decoders=None):
+        cpus = os.cpu_count() or 1
+        self.log_dir = log_dir
+        self.capacity = {
+            "encoder": max_encoders or max(1, cpus // 4),
+            "decoder": max_decoders or max(1, cpus // 2),
+        }
+        self.max_workers = max_workers or self.capacity["encoder"]
+        self.in_use = {name: 0 for name in self.capacity}
+        self.held = set()
+        self.jobs = []
+        self.stopping = False
+        self._condition = threading.Condition()
+        self.state_file = os.path.join(log_dir, STATE_FILE)
+        os.makedirs(log_dir, exist_ok=True)
+
+    def submit(self, config_file):
+        config = load_config(config_file)
+        job = Job(config_file, job_resources(config))
+        with self._condition:
+            self.jobs.append(job)
+            self._save_state()
+        logging.info(f"Test {config_file} ajouté à la file (ressources : {sorted(job.resources)})")
+        return job
+
+    def _fits(self, job):
+        if job.resources & self.held:
+            return False
+        return all(self.in_use[name] + cost <= self.capacity[name] for name, cost in job.costs.items())
+
+    def _take_next(self):
+        with self._condition:
+            while True:
+                pending = [job for job in self.jobs if job.status == "attente"]
+                if self.stopping or not pending:
+                    return None
+                for job in pending:
+                    if self._fits(job):
+                        job.status = "reboot"
+                        self.held |= job.resources
+                        for name, cost in job.costs.items():
+                            self.in_use[name] += cost
+                        return job
+                self._condition.wait()
+
+    def _release(self, job):
+        with self._condition:
+            self.held -= job.resources
+            for name, cost in job.costs.items():
+                self.in_use[name] -= cost
+            self._save_state()
+            self._condition.notify_all()
+
+    def _run_job(self, job):
+        logfile = os.path.join(self.log_dir, os.path.basename(job.config_file) + ".log")
+        update_status(job.config_file, "reboot")
+        try:
+            with open(logfile, 'w') as log:
+                logging.info(f"Lancement de {test_module} avec la configuration {job.config_file} "
+                             f"et redirection des logs vers {logfile}")
+                with self._condition:
+                    job.process = subprocess.Popen(
+                        [sys.executable, '-m', test_module, job.config_file, self.log_dir],
+                        stdout=log, stderr=subprocess.STDOUT)
+                    job.started = datetime.now().isoformat(timespec='seconds')
+                    self._save_state()
+                job.returncode = job.process.wait()
+        except OSError as e:
+            logging.error(f"Lancement de {job.config_file} impossible : {e}")
+        finally:
+            job.status = "termine" if job.returncode == 0 else "echec"
+            job.ended = datetime.now().isoformat(timespec='seconds')
+            update_status(job.config_file, "dispo")
+            logging.info(f"Script {job.config_file} terminé (code {job.returncode}), statut mis à jour à 'dispo'")
+            self._release(job)
+
+    def _worker(self):
+        while True:
+            job = self._take_next()
+            if job is None:
+                return
+            self._run_job(job)
+
+    def run(self):
+        """ Exécute toute la file et retourne quand tous les tests sont terminés. """
+        logging.info(f"{len(self.jobs)} tests, {self.max_workers} workers, plafonds {self.capacity}")
+        workers = [threading.Thread(target=self._worker) for _ in range(self.max_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.clear_state()
+
+    def clear_state(self):
+        """ Campagne terminée : plus rien à arrêter, le fichier d'état disparaît. """
+        try:
+            os.remove(self.state_file)
+        except FileNotFoundError:
+            pass
+
+    def stop_all(self, *_):
+        """ Vide la file et arrête les tests en cours (CTRL+C). """
+        logging.info("Arrêt de tous les scripts en cours...")
+        with self._condition:
+            self.stopping = True
+            for job in self.jobs:
+                if job.status == "attente":
+                    job.status = "annule"
+                elif job.status == "reboot" and job.process is not None:
+                    job.process.terminate()
+            self._save_state()
+            self._condition.notify_all()
+
+    def _save_state(self):
+        # Appelé avec self._condition verrouillé
+        state = {
+            "updated": datetime.now().isoformat(timespec='seconds'),
+            "scheduler_pid": os.getpid(),
+            "capacity": self.capacity,
+            "jobs": {job.config_file: job.state() for job in self.jobs},
+        }
+        temporary = self.state_file + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temporary, self.state_file)
+
+
+def read_state(log_dir=LOG_DIR):
+    try:
+        with open(os.path.join(log_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def mark_stopped_in_results(config_file):
+    """ Ajoute le message d'arrêt prématuré sur la ligne 'Comments:' du fichier de résultats. """
+    link = getattr(load_config(config_file), "lien", None)
+    if not link:
+        logging.error(f"Aucun lien trouvé dans {config_file}.")
+        return
+    results = glob.glob(os.path.join(link, "**", "*_results.txt"), recursive=True)
+    if not results:
+        logging.error(f"Aucun fichier *_results.txt trouvé dans {link}.")
+        return
+    message = f"Test arrêté prématurément par l'utilisateur via 'stop' ({time.strftime('%Y-%m-%d %H:%M:%S')})"
+    with open(results[0]) as f:
+        lines = f.read().split('\n')
+    lines = [f"{line} {message}" if line.startswith("Comments:") else line for line in lines]
+    with open(results[0], 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def process_matches(pid, marker):
+    """ Vrai si le processus pid tourne encore et que sa ligne de commande contient marker. """
+    try:
+        with open(f"/proc/{pid}/cmdline", 'rb') as f:
+            cmdline = f.read().replace(b'\0', b' ').decode(errors='replace')
+    except OSError:
+        return False
+    return marker in cmdline
+
+
+def signal_process(pid, sig, marker):
+    """
+    Envoie sig à pid s'il s'agit bien du processus attendu : un PID lu dans
+    un état périmé peut avoir été repris par un tout autre programme.
+    """
+    if not process_matches(pid, marker):
+        logging.error(f"Le processus {pid} n'est plus en cours (ou n'est pas {marker})")
+        return False
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        logging.error(f"Le processus {pid} vient de se terminer")
+        return False
+    return True
+
+
+def stop_running(config_file=None, log_dir=LOG_DIR):
+    """ Arrête un test (ou tous) d'une campagne lancée par un autre processus. """
+    state = read_state(log_dir)
+    if state is None:
+        logging.error("Aucun processus en cours trouvé.")
+        return False
+    if config_file is None:
+        # L'ordonnanceur vide sa file et arrête ses tests lui-même
+        return signal_process(state["scheduler_pid"], signal.SIGINT, "scheduler")
+    job = state["jobs"].get(config_file)
+    if job is None or job["status"] != "reboot" or job["pid"] is None:
+        logging.error(f"Aucun processus trouvé pour {config_file}")
+        return False
+    if not process_matches(job["pid"], test_module):
+        logging.error(f"Le processus {job['pid']} de {config_file} n'est plus en cours")
+        return False
+    mark_stopped_in_results(config_file)
+    logging.info(f"Arrêt du script {config_file} avec PID {job['pid']}")
+    return signal_process(job["pid"], signal.SIGTERM, test_module)
+
+
+def resolve_config(config_file):
+    return config_file if os.path.isabs(config_file) else os.path.join(CONFIG_DIR, config_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ordonnanceur des tests reboot")
+    parser.add_argument("command", nargs='*', help="[config.py] | stop <config.py> | stop_all")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-encoders", type=int, default=None)
+    parser.add_argument("--max-decoders", type=int, default=None)
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == ["stop_all"]:
+        return 0 if stop_running(log_dir=args.log_dir) else 1
+    if len(args.command) == 2 and args.command[0] == "stop":
+        return 0 if stop_running(resolve_config(args.command[1]), args.log_dir) else 1
+
+    if args.command:
+        configs = [resolve_config(args.command[0])]
+        if not os.path.isfile(configs[0]):
+            logging.error(f"Le fichier de configuration {configs[0]} n'existe pas.")
+            return 1
+    else:
+        if not os.path.isdir(CONFIG_DIR):
+            logging.error(f"Le dossier de configurations {CONFIG_DIR} n'existe pas.")
+            return 1
+        configs = sorted(glob.glob(os.path.join(CONFIG_DIR, "*.py")))
+        if not configs:
+            logging.info(f"Aucun fichier de configuration trouvé dans {CONFIG_DIR}")
+            return 0
+
+    scheduler = Scheduler(args.log_dir, args.workers, args.max_encoders, args.max_decoders)
+    for config_file in configs:
+        scheduler.submit(config_file)
+    signal.signal(signal.SIGINT, scheduler.stop_all)
+    signal.signal(signal.SIGTERM, scheduler.stop_all)
+    scheduler.run()
+    logging.info("Tous les tests sont terminés.")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
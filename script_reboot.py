@@ -4,8 +4,16 @@ import os
 import subprocess
 import sys
 import logging
-import numpy as np
+from threading import Thread
 from zap_functions import get_os_version, get_device_model, load_config, connect_adb
+from templates import get_template
+from capture import FrameTap, RoiLayout, tap_output_args
+from motion import MotionDetector
+from features import features_of
+from capture_broker import BrokerCapture, broker_running
+from adb_client import adb, device_serial, AdbError
+from video_analysis import (find_first_frame, default_strides, frame_timestamp, read_ffmpeg_start_time,
+                            run_detectors, LogoDetector, StreamDetector, BlackScreenDetector, FrozenDetector)
 
 # Paramètres
 max_wait_time = 180  # Timeout max pour éviter boucle infinie
@@ -13,19 +21,45 @@ result_base_dir = "results/"  # Chemin de stockage des résultats
 reference_image_path = "ref.png"  # Image de référence du menu
 focus_region = (77, 36, 177, 136)  # (x1, y1, x2, y2) : zone d'intérêt pour la détection
 expected_kpi = 90.00
+live_analysis_scale = 0.5  # Facteur de réduction du flux d'analyse en direct
+stream_region = (150, 563, 1025, 1868)  # (y1, y2, x1, x2) : zone où le flux vidéo doit bouger
+post_detection_tail = 10  # Secondes enregistrées après la détection du flux
 
-def compare_images(frame, template):
-    """ Compare une image extraite de la vidéo avec le template du logo. """
+def analysis_layout(scale=live_analysis_scale):
+    """ Flux d'analyse en direct : union de la zone du logo (avec sa marge) et de la zone du flux. """
+    x1, y1, x2, y2 = focus_region
+    return RoiLayout({
+        "logo": (y1 - 10, y2 + 10, x1 - 10, x2 + 10),
+        "flux": stream_region,
+    }, scale=scale, gray=True)
+
+def compare_images(frame, template, scale=1.0, roi=None):
+    """
+    Compare une image extraite de la vidéo avec le template du logo.
+    La frame peut aussi être déjà en niveaux de gris et réduite d'un facteur
+    scale (flux d'analyse en direct), le template est alors réduit d'autant.
+    roi donne la zone de recherche (slices) quand la frame n'est pas une
+    frame entière mais un flux recadré (RoiLayout).
+    """
     threshold = 0.5
     try:
-        ref_image = cv2.imread(template, cv2.IMREAD_GRAYSCALE)
-        if ref_image is None:
+        ref = get_template(template)
+        if ref is None:
             logging.error("Template image non trouvée !")
             return False
+        if ref.std == 0:
+            logging.error("Template uniforme, comparaison impossible !")
+            return False
+        ref_image = ref.scaled(scale)
 
-        grayscale_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        x1, y1, x2, y2 = focus_region
-        cropped_frame = grayscale_frame[y1-10:y2+10, x1-10:x2+10]
+        # Niveaux de gris calculés une seule fois par frame, partagés entre détecteurs
+        grayscale_frame = features_of(frame).gray
+        if roi is not None:
+            cropped_frame = grayscale_frame[roi]
+        else:
+            x1, y1, x2, y2 = (int(v * scale) for v in focus_region)
+            margin = int(10 * scale)
+            cropped_frame = grayscale_frame[y1-margin:y2+margin, x1-margin:x2+margin]
 
         # Log des dimensions
         logging.debug(f"Dimensions ROI: {cropped_frame.shape}, Dimensions Template: {ref_image.shape}")
@@ -42,8 +76,30 @@ def compare_images(frame, template):
         logging.error(f"Erreur lors de la comparaison : {e}")
         return False
 
-def detect_logo_in_video(video_path):
+# Analyse a posteriori d'une vidéo déjà enregistrée : measure_boot_time détecte en direct
+# et ne s'en sert plus ; gardées pour réanalyser une capture et pour benchmark.py
+
+def find_logo_in_video(video_path, strides=default_strides):
+    """
+    Recherche grossière puis fine du logo dans une vidéo finalisée.
+    Retourne (index_frame, timestamp_s) de la première frame avec le logo, ou None.
+    """
+    if not os.path.exists(video_path):
+        logging.error(f"Fichier vidéo introuvable : {video_path}")
+        return None
+
+    return find_first_frame(video_path, lambda frame: compare_images(frame, reference_image_path), strides)
+
+def detect_logo_in_video(video_path, coarse_to_fine=False):
     """ Détecte le logo dans une vidéo finalisée """
+    if coarse_to_fine:
+        result = find_logo_in_video(video_path)
+        if result is None:
+            return None
+        frame_index, logo_time = result
+        logging.debug(f"Logo trouvé à la frame {frame_index} ({logo_time:.2f}s dans la vidéo)")
+        return logo_time
+
     # Vérifier si le fichier vidéo existe
     if not os.path.exists(video_path):
         logging.error(f"Fichier vidéo introuvable : {video_path}")
@@ -63,9 +119,9 @@ def detect_logo_in_video(video_path):
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     logging.debug(f"Dimensions de la vidéo : {width}x{height}")
     # Initialisation des variables
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
     frame_count = 0
     logo_time = None
-    start_time = time.time()
     # Parcourir les frames
     while cap.isOpened():
         ret, frame = cap.read()
@@ -74,12 +130,12 @@ def detect_logo_in_video(video_path):
 
         if frame_count % 10 == 0:
             if compare_images(frame, reference_image_path):
-                logo_time = time.time() - start_time
+                logo_time = frame_timestamp(cap, frame_count, fps)
                 break
         frame_count += 1
     # Fermer la vidéo
     cap.release()
-    return logo_time # Retourne le temps de détection du logo
+    return logo_time # Retourne la position du logo dans la vidéo (s)
 
 def detect_stream_from_video(video_path, y1, y2, x1, x2, seuil_diff=5, frames_consecutives=20):
     cap = cv2.VideoCapture(video_path)
@@ -92,53 +148,101 @@ def detect_stream_from_video(video_path, y1, y2, x1, x2, seuil_diff=5, frames_co
         print("Erreur lecture première frame")
         return False, None
 
-    zone_precedente = frame[y1:y2, x1:x2]
+    motion = MotionDetector(roi=(slice(y1, y2), slice(x1, x2)), motion_threshold=seuil_diff)
+    motion.reset(frame)
     compteur = 0
-    start_time = time.time()
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frame_count = 0
 
     while True:
         ret, frame = cap.read()
         if not ret:
             break
+        frame_count += 1
 
-        zone_courante = frame[y1:y2, x1:x2]
-
-        if zone_courante.shape != zone_precedente.shape:
-            zone_precedente = zone_courante
-            continue
-
-        difference = cv2.absdiff(zone_courante, zone_precedente)
-        non_identiques = np.sum(difference > 10)
-        total = difference.size
-        pourcentage = (non_identiques / total) * 100
-
-        if pourcentage > seuil_diff:
+        if motion.is_moving(frame):
             compteur += 1
             if compteur >= frames_consecutives:
-                temps_detection = time.time() - start_time
+                temps_detection = frame_timestamp(cap, frame_count, fps)
+                cap.release()
+                motion.log_stats("flux")
                 return True, round(temps_detection, 2)
         else:
             compteur = 0
 
-        zone_precedente = zone_courante
-
+    cap.release()
+    motion.log_stats("flux")
     return False, None
 
-def wait_for_device(ip, timeout=max_wait_time):
-    """ Attend que le device soit prêt après un redémarrage """
-    start_time = time.time()
-    while time.time() - start_time < timeout:
+def wait_for_device(ip, timeout=max_wait_time, boot_id="", since=None):
+    """
+    Attend que le device soit prêt après un redémarrage (boot_id : celui
+    d'avant le reboot). Retourne le temps (s) écoulé depuis since (par
+    défaut l'appel) jusqu'à sys.boot_completed=1, horodaté par la box et
+    ramené à l'horloge du PC, ou None après timeout. Un temps hors de
+    [0, attente réelle] (horloge de la box resynchronisée au démarrage par
+    exemple) est remplacé par l'heure PC du retour de l'attente.
+    """
+    start_time = since or time.time()
+    serial = device_serial(ip)
+    completed = adb.wait_for_boot_completed(serial, timeout, previous_boot_id=boot_id)
+    returned = time.time()
+    if completed is None:
+        return None
+    elapsed = returned - start_time
+    try:
+        offset = adb.clock_offset(serial)
+    except (AdbError, OSError) as e:
+        logging.debug(f"Écart d'horloge avec la box inconnu ({e}), heure du PC utilisée")
+        return elapsed
+    boot_time = completed - offset - start_time
+    if not 0 <= boot_time <= elapsed:
+        logging.warning(f"Heure de fin de démarrage de la box incohérente ({boot_time:.2f}s, "
+                        f"attente de {elapsed:.2f}s), heure du PC utilisée")
+        return elapsed
+    return boot_time
+
+def live_analysis(tap, detectors, start_offset):
+    """
+    Analyse en direct le flux réduit écrit par ffmpeg (à lancer dans un thread).
+    Le flux est lu jusqu'au bout pour ne jamais bloquer l'enregistrement, mais
+    seules les frames postérieures à start_offset() (position du reboot dans
+    la vidéo, None tant qu'il n'a pas eu lieu) sont analysées.
+    """
+    def frames():
+        for index, frame, timestamp in tap.frames():
+            offset = start_offset()
+            if offset is not None and timestamp >= offset:
+                yield index, frame, timestamp
+
+    return run_detectors(frames(), detectors, stop_when_done=False)
+
+def feed_from_broker(cap, ffmpeg_process, capture_times):
+    """
+    Recopie les frames du broker de capture vers l'entrée rawvideo de ffmpeg
+    (à lancer dans un thread). capture_times reçoit l'heure de capture de
+    chaque frame, avant son écriture : FrameTap en tire les timestamps des
+    détecteurs, et la première sert d'ancre. ffmpeg ne voit qu'une cadence
+    fixe ; les frames écartées par le broker n'y laissent pas de trou.
+    """
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            capture_times.append(cap.timestamp)
+            ffmpeg_process.stdin.write(memoryview(frame).cast('B'))
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        if cap.dropped:
+            logging.warning(f"Broker : {cap.dropped} frames perdues pendant la mesure, "
+                            f"timestamps repris de la capture")
+        cap.release()
         try:
-            result = subprocess.run(
-                ['adb', '-s', f'{ip}:5555', 'shell', 'getprop', 'sys.boot_completed'],
-                capture_output=True, text=True, timeout=5
-            )
-            if result.stdout.strip() == "1":
-                return time.time() - start_time
-        except subprocess.TimeoutExpired:
+            ffmpeg_process.stdin.close()
+        except (BrokenPipeError, ValueError):
             pass
-        time.sleep(5)
-    return None
 
 def measure_boot_time(ip, log_dir, video_source):
     """ Mesure le temps de redémarrage de la box """
@@ -150,63 +254,117 @@ def measure_boot_time(ip, log_dir, video_source):
     result_file = os.path.join(base_dir, "results.txt")
     timestamp = int(time.time())
     video_filename = os.path.join(base_dir, f"capture_{timestamp}.mp4")
+    ffmpeg_log_filename = os.path.join(base_dir, f"capture_{timestamp}.ffmpeg.log")
+    width, height, fps = 1920, 1080, 30
     
     # Écrire l'entête avec la valeur par défaut 90.00
     if not os.path.exists(result_file):
         with open(result_file, 'w') as f:
             f.write(f"KPI,{expected_kpi}\n")
 
-    # Étape 1: Enregistrement vidéo
+    # Étape 1: Enregistrement vidéo pleine résolution et, par le même ffmpeg, flux d'analyse
+    # limité aux zones du logo et du flux, réduit et en niveaux de gris, sur stdout
     logging.debug("Démarrage de l'enregistrement vidéo...")
-    ffmpeg_cmd = [
-        'ffmpeg', '-y', '-f', 'v4l2', '-framerate', '30',
-        '-video_size', '1920x1080', '-i', video_source,
-        '-c:v', 'libx264', '-preset', 'ultrafast', video_filename
-    ]
-    ffmpeg_process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    layout = analysis_layout()
+    broker = None
+    if broker_running(video_source):
+        try:
+            broker = BrokerCapture(video_source)
+        except (OSError, ValueError) as e:
+            # Socket périmé (broker arrêté sans nettoyage) : ffmpeg ouvre le périphérique lui-même
+            logging.debug(f"Broker {video_source} injoignable ({e}), capture directe par ffmpeg")
+    if broker is not None:
+        # Carte déjà ouverte par le broker : frames brutes horodatées par le broker sur stdin
+        width, height, fps = broker.width, broker.height, round(broker.fps)
+        input_args = ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-video_size', f'{width}x{height}',
+                      '-framerate', str(fps), '-i', '-']
+    else:
+        # '-ts mono2abs' : ffmpeg affiche l'heure absolue de la première frame, qui sert d'ancre aux timestamps vidéo
+        input_args = ['-f', 'v4l2', '-framerate', str(fps), '-ts', 'mono2abs',
+                      '-video_size', f'{width}x{height}', '-i', video_source]
+    ffmpeg_cmd = ['ffmpeg', '-y'] + input_args + [
+        '-map', '0:v', '-c:v', 'libx264', '-preset', 'ultrafast', video_filename
+    ] + tap_output_args(width, height, layout=layout)
+    ffmpeg_log = open(ffmpeg_log_filename, 'w')
+    recording_start_time = time.time()
+    ffmpeg_process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE if broker else None,
+                                      stdout=subprocess.PIPE, stderr=ffmpeg_log)
+    capture_times = [] if broker else None
+    if broker:
+        Thread(target=feed_from_broker, args=(broker, ffmpeg_process, capture_times), daemon=True).start()
+
+    # Détecteurs en direct, sur le flux d'analyse (écran noir et image figée estimés sur l'union des zones)
+    logo_roi = layout.slices("logo")
+    logo_detector = LogoDetector(lambda frame: compare_images(frame, reference_image_path, layout.scale, logo_roi))
+    y1, y2, x1, x2 = layout.local("flux")
+    stream_detector = StreamDetector(y1=y1, y2=y2, x1=x1, x2=x2, after=logo_detector)
+    detectors = [logo_detector, stream_detector, BlackScreenDetector(), FrozenDetector()]
+    reboot = {"offset": None}
+    tap = FrameTap(ffmpeg_process.stdout, layout.width, layout.height, fps=fps, capture_times=capture_times)
+    analysis_thread = Thread(target=live_analysis, args=(tap, detectors, lambda: reboot["offset"]), daemon=True)
+    analysis_thread.start()
     time.sleep(10) # Attendre 10 secondes avant de redémarrer la box
     
     # Étape 2: Redémarrage
+    boot_id = adb.boot_id(device_serial(ip))
     reboot_start_time = time.time()
     logging.debug("Redémarrage de la box...")
-    subprocess.run(["adb", "-s", f"{ip}:5555", "reboot"])
-    time.sleep(5)
+    adb.reboot(device_serial(ip))
 
-    reboot_time = wait_for_device(ip)
+    # Ancre temporelle : heure réelle de la première frame enregistrée
+    first_frame_time = capture_times[0] if capture_times else read_ffmpeg_start_time(ffmpeg_log_filename)
+    if first_frame_time is None:
+        logging.debug("Heure de la première frame absente du log ffmpeg, ancrage sur le lancement de ffmpeg")
+        first_frame_time = recording_start_time
+    reboot["offset"] = reboot_offset = reboot_start_time - first_frame_time
+    logging.debug(f"Reboot lancé à {reboot_offset:.2f}s dans la vidéo")
+
+    reboot_time = wait_for_device(ip, boot_id=boot_id, since=reboot_start_time)
     if reboot_time is None:
         logging.error("La box ne s'est pas reconnectée.")
         ffmpeg_process.terminate()
+        analysis_thread.join()
+        ffmpeg_log.close()
         return
-    
-    # Étape 3: Arrêt propre de FFmpeg
+    logging.debug(f"Démarrage terminé (sys.boot_completed) {reboot_time:.2f}s après le reboot")
+
+    # Étape 3: Attente du flux détecté en direct, puis arrêt propre de FFmpeg après la marge
+    remaining = max(0, max_wait_time - (time.time() - reboot_start_time))
+    if stream_detector.detected.wait(remaining):
+        logging.debug(f"Flux détecté, enregistrement de {post_detection_tail}s supplémentaires...")
+        time.sleep(post_detection_tail)
+    else:
+        logging.debug("Flux non détecté avant le timeout.")
     logging.debug("Finalisation de l'enregistrement vidéo...")
-    time.sleep(40)
     ffmpeg_process.terminate()
     ffmpeg_process.wait()
-    time.sleep(2)
-    
-    # Étape 4: Détection du logo
-    logging.debug("Détection du logo...")
-    logo_time = detect_logo_in_video(video_filename)
-    
+    analysis_thread.join()
+    ffmpeg_log.close()
+
+    # Étape 4: Résultats de l'analyse en direct (logo, flux, écran noir, image figée)
+    results = {detector.name: detector.events for detector in detectors}
+    logo_events = results.get("logo")
+    logo_time = logo_events[0][2] - reboot_offset if logo_events else None
+    for name in ("ecran_noir", "image_figee"):
+        if results.get(name):
+            logging.debug(f"Événements {name} : {results[name]}")
+
     # Initialisation du temps total
     total_reboot_duration = None
 
     # Gestion des résultats
     if logo_time is not None:
-        logging.debug(f"Logo détecté après {logo_time:.2f}s.")
-        
-        # Étape 5: Détection du flux
-        logging.debug("Détection du flux dans la vidéo...")
-        flux_detecte, stream_time = detect_stream_from_video(
-            video_filename, y1=150, y2=563, x1=1025, x2=1868
-        )
+        logging.debug(f"Logo détecté {logo_time:.2f}s après le reboot.")
+
+        # Étape 5: Détection du flux (recherchée après le logo)
+        flux_events = results.get("flux")
+        flux_detecte = bool(flux_events)
+        stream_time = flux_events[0][2] if flux_events else None
 
         if flux_detecte:
-            total_reboot_duration = round(time.time() - reboot_start_time + reboot_time - 50, 2)
-            logging.debug(f"Flux détecté après {stream_time:.2f}s.")
+            total_reboot_duration = round(stream_time - reboot_offset, 2)
+            logging.debug(f"Flux détecté à {stream_time:.2f}s dans la vidéo.")
             logging.debug(f"Temps total de reboot (logo + flux) : {total_reboot_duration:.2f}s")
-            time.sleep(10)  # Attente pour capture complémentaire
         else:
             logging.debug("Flux non détecté.")
     else:
@@ -6,6 +6,7 @@ import sys
 import logging
 import numpy as np
 from ..zap_ayanleh.zap_functions import load_config
+from templates import get_template
 
 # Paramètres
 result_base_dir = "/home/benchmark/IVS/results/"
@@ -24,10 +25,14 @@ def reboot_via_pdu(pdu_config):
 def compare_images(frame, template):
     threshold = 0.3
     try:
-        ref_image = cv2.imread(template, cv2.IMREAD_GRAYSCALE)
-        if ref_image is None:
+        ref = get_template(template)
+        if ref is None:
             logging.error("Template image non trouvée !")
             return False
+        if ref.std == 0:
+            logging.error("Template uniforme, comparaison impossible !")
+            return False
+        ref_image = ref.image
 
         grayscale_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         x1, y1, x2, y2 = focus_region
@@ -145,15 +150,13 @@ def measure_boot_time(config, log_dir):
     # Capture initiale de 10 secondes avant le reboot
     initial_duration = 10  # secondes
     start_initial = time.time()
-    compteur_frames_noires = 0
-    est_noir = False
+    black_monitor = zap_functions.BlackScreenMonitor(log_f, blackscreen_events).start()
     while (time.time() - start_initial) < initial_duration:
         ret, frame = cap.read()
         if not ret:
             logging.error("Erreur de lecture pendant la capture initiale")
             break
-        compteur_frames_noires, est_noir = zap_functions.save_frame(
-            frame, ffmpeg_process, log_f, blackscreen_events, compteur_frames_noires, est_noir)
+        zap_functions.save_frame(frame, ffmpeg_process, black_monitor)
 
     # Reboot via PDU
     logging.info("Envoi reboot via PDU...")
@@ -173,8 +176,7 @@ def measure_boot_time(config, log_dir):
         if not ret:
             break
 
-        compteur_frames_noires, est_noir = zap_functions.save_frame(
-            frame, ffmpeg_process, log_f, blackscreen_events, compteur_frames_noires, est_noir)
+        zap_functions.save_frame(frame, ffmpeg_process, black_monitor)
 
         # Gestion du temps après détection
         if flux_detected:
@@ -219,14 +221,15 @@ def measure_boot_time(config, log_dir):
             zone_precedente = zone
 
     cap.release()
-    ffmpeg_process.stdin.close()
-    ffmpeg_process.wait()
+    encoder_stats = zap_functions.close_ffmpeg(ffmpeg_process)
+    black_monitor.stop()
     log_f.close()
 
     final_time = logo_time if logo_detected else stream_time if flux_detected else 90.0
     file.write(f"{video_path}, {final_time}\n")
     file.close()
     logging.info(f"Mesure terminée : {final_time}s — Résultat enregistré dans {results_file}")
+    logging.info(f"Encodeur : {zap_functions.format_encoder_stats(encoder_stats)}")
 
 def main(config, log_dir):
     try:
@@ -0,0 +1,143 @@
+import os
+import shutil
+import threading
+import logging
+from datetime import datetime, timedelta
+
+segment_time_format = "%Y%m%d-%H%M%S"
+
+# Anneaux actifs du processus, prévenus par report_incident()
+active_rings = []
+active_rings_lock = threading.Lock()
+
+
+def report_incident(when, reason):
+    """
+    Signale un incident (écran noir, changement de PID, rafale de
+    LOG_ERROR...) à tous les enregistrements en anneau en cours : les
+    segments autour de when (datetime) seront conservés.
+    """
+    with active_rings_lock:
+        rings = list(active_rings)
+    for ring in rings:
+        ring.mark_incident(when, reason)
+
+
+class SegmentRing:
+    """
+    Enregistrement en segments courts (muxer segment de ffmpeg, un fichier
+    toutes les segment_time secondes, nommé par son heure de début) dans un
+    anneau borné sur disque. Un thread de ménage :
+
+    - déplace dans <directory>/incidents les segments qui recouvrent la
+      fenêtre [incident - before, incident + after] d'un incident signalé ;
+    - supprime les autres segments terminés depuis plus de retention secondes.
+
+    L'espace disque occupé reste donc celui de retention secondes de vidéo
+    plus les incidents, quelle que soit la durée du test. Chaque ffmpeg
+    (relance à un autre niveau d'encodage) a sa propre liste de segments.
+    """
+
+    def __init__(self, directory, prefix="segment", segment_time=10, retention=300, before=60, after=60,
+                 sweep_interval=5):
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_time = segment_time
+        # Un segment doit rester disponible tant qu'un incident futur peut encore le réclamer
+        self.retention = max(retention, before + segment_time)
+        self.before = timedelta(seconds=before)
+        self.after = timedelta(seconds=after)
+        self.sweep_interval = sweep_interval
+        self.incident_dir = os.path.join(directory, "incidents")
+        self.list_files = []
+        self.incidents = []  # (datetime, raison)
+        self.kept = set()
+        self.deleted = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(self.incident_dir, exist_ok=True)
+
+    def ffmpeg_output_args(self):
+        """ Arguments de sortie ffmpeg remplaçant le nom du fichier mp4 (une liste et un préfixe par appel). """
+        part = len(self.list_files)
+        suffix = f"_{part}" if part else ""
+        list_file = os.path.join(self.directory, f"{self.prefix}_list{suffix}.csv")
+        self.list_files.append(list_file)
+        return [
+            '-force_key_frames', f'expr:gte(t,n_forced*{self.segment_time})',
+            '-f', 'segment',
+            '-segment_time', f"{self.segment_time}",
+            '-segment_format', 'mp4',
+            '-segment_list', list_file,
+            '-segment_list_type', 'csv',
+            '-reset_timestamps', '1',
+            '-strftime', '1',
+            os.path.join(self.directory, f"{self.prefix}{suffix.replace('_', '-')}_%Y%m%d-%H%M%S.mp4"),
+        ]
+
+    def start(self):
+        with active_rings_lock:
+            active_rings.append(self)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Arrête le ménage après un dernier passage (à appeler après la fin de ffmpeg). """
+        with active_rings_lock:
+            if self in active_rings:
+                active_rings.remove(self)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sweep(final=True)
+        logging.info(f"Anneau {self.directory} : {len(self.kept)} segments conservés, {self.deleted} supprimés")
+
+    def mark_incident(self, when, reason):
+        with self._lock:
+            self.incidents.append((when, reason))
+        with open(os.path.join(self.incident_dir, "incidents.txt"), 'a') as f:
+            f.write(f"{when} - {reason}\n")
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except OSError as e:
+                logging.error(f"Ménage des segments de {self.directory} impossible : {e}")
+
+    def segment_start(self, name):
+        stamp = name[:-len(".mp4")].rsplit('_', 1)[-1]
+        try:
+            return datetime.strptime(stamp, segment_time_format)
+        except ValueError:
+            return None
+
+    def completed_segments(self):
+        """ Segments fermés par ffmpeg (présents dans la liste csv), avec leur heure de début. """
+        segments = []
+        for list_file in self.list_files:
+            if not os.path.exists(list_file):
+                continue
+            with open(list_file) as f:
+                for line in f:
+                    name = line.split(',', 1)[0].strip()
+                    start = self.segment_start(name)
+                    if start is not None and os.path.exists(os.path.join(self.directory, name)):
+                        segments.append((name, start))
+        return segments
+
+    def sweep(self, final=False):
+        now = datetime.now()
+        with self._lock:
+            incidents = list(self.incidents)
+        for name, start in self.completed_segments():
+            end = start + timedelta(seconds=self.segment_time)
+            if any(start <= when + self.after and end >= when - self.before for when, _ in incidents):
+                shutil.move(os.path.join(self.directory, name), os.path.join(self.incident_dir, name))
+                self.kept.add(name)
+            elif final or (now - end).total_seconds() > self.retention:
+                os.remove(os.path.join(self.directory, name))
+                self.deleted += 1
@@ -0,0 +1,147 @@
+"""
+Vidéos et séquences de frames STB synthétiques, à vérité terrain connue,
+pour mesurer les détecteurs sans box ni carte de capture (benchmark.py).
+
+- boot : écran noir, puis menu avec le logo ref.png dans focus_region à
+  logo_time, puis flux en mouvement dans stream_region à stream_time
+  (mêmes zones que script_reboot)
+- zap : bandeau de zap (zones noires, liste des chaînes, logo de chaîne)
+  à logo_time, puis flux en mouvement à stream_time (zones de zap2)
+- écran d'erreur : rectangles bleu et rouge de zap2 et texte d'erreur
+
+    truth = write_video("boot.mp4", boot_frames(logo_time=2, stream_time=4))
+"""
+import logging
+import cv2
+import numpy as np
+
+frame_size = (1920, 1080)
+default_fps = 30
+# Zones reprises de script_reboot et zap2 (sans les importer : elles pourront y être modifiées)
+reboot_focus_region = (77, 36, 177, 136)  # (x1, y1, x2, y2)
+reboot_stream_region = (150, 563, 1025, 1868)  # (y1, y2, x1, x2)
+zap_regions = {
+    "chaines": (4, 475, 12, 125),
+    "logo_chaine": (40, 140, 200, 300),  # logo de chaîne, hors des zones noires
+    "flux": (6, 285, 150, 550),  # zone du flux de zap2, sans la zone noir_2
+    "erreur_bleu": (315, 399, 374, 411),
+    "erreur_rouge": (411, 473, 374, 395),
+    "erreur_titre": (14, 96, 382, 632),
+    "erreur_code": (414, 474, 400, 632),
+}
+error_blue = (104, 76, 30)  # BGR attendus par zap2.detect_error
+error_red = (52, 50, 116)
+
+
+def load_logo(path="ref.png", size=(100, 100)):
+    """ Logo de référence en BGR ; un motif de remplacement si le fichier est absent. """
+    logo = cv2.imread(path)
+    if logo is None:
+        logging.debug(f"{path} introuvable, logo synthétique")
+        logo = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        cv2.circle(logo, (size[0] // 2, size[1] // 2), min(size) // 3, (255, 255, 255), -1)
+        cv2.putText(logo, "TV", (size[0] // 4, size[1] * 3 // 5), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    return logo
+
+
+def moving_pattern(height, width, index, period=32, speed=16):
+    """ Bandes verticales qui défilent de speed pixels par frame : environ la moitié des pixels change. """
+    x = (np.arange(width) + index * speed) // period % 2
+    row = np.where(x, 200, 40).astype(np.uint8)
+    return np.repeat(np.broadcast_to(row, (height, width))[:, :, None], 3, axis=2)
+
+
+def _paste(frame, image, x1, y1):
+    height, width = image.shape[:2]
+    frame[y1:y1 + height, x1:x1 + width] = image
+
+
+def boot_frames(duration=8.0, fps=default_fps, logo_time=2.0, stream_time=4.0, size=frame_size,
+                logo_path="ref.png"):
+    """ Générateur de (index, frame, timestamp_s) d'un démarrage de box. """
+    width, height = size
+    logo = load_logo(logo_path)
+    x1, y1, _, _ = reboot_focus_region
+    sy1, sy2, sx1, sx2 = reboot_stream_region
+    menu = np.zeros((height, width, 3), dtype=np.uint8)
+    menu[:] = (60, 40, 30)
+    _paste(menu, logo, x1, y1)
+
+    for index in range(int(duration * fps)):
+        timestamp = index / fps
+        if timestamp < logo_time:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+        else:
+            frame = menu.copy()
+            if timestamp >= stream_time:
+                frame[sy1:sy2, sx1:sx2] = moving_pattern(sy2 - sy1, sx2 - sx1, index)
+        yield index, frame, timestamp
+
+
+def zap_frames(duration=3.0, fps=default_fps, logo_time=0.5, stream_time=1.0, size=frame_size,
+               logo_path="ref.png"):
+    """ Générateur de (index, frame, timestamp_s) d'un zap : bandeau puis flux. """
+    width, height = size
+    logo = load_logo(logo_path)
+    banner = np.zeros((height, width, 3), dtype=np.uint8)
+    y1, y2, x1, x2 = zap_regions["chaines"]
+    banner[y1:y2, x1:x2] = 80
+    for n, y in enumerate(range(y1 + 30, y2, 60)):
+        cv2.putText(banner, str(n + 1), (x1 + 10, y), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    ly1, _, lx1, _ = zap_regions["logo_chaine"]
+    _paste(banner, logo, lx1, ly1)
+    fy1, fy2, fx1, fx2 = zap_regions["flux"]
+
+    for index in range(int(duration * fps)):
+        timestamp = index / fps
+        if timestamp < logo_time:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+        else:
+            frame = banner.copy()
+            if timestamp >= stream_time:
+                frame[fy1:fy2, fx1:fx2] = moving_pattern(fy2 - fy1, fx2 - fx1, index)
+        yield index, frame, timestamp
+
+
+def error_frame(size=frame_size, code="S1234"):
+    """ Écran d'erreur de zap2 (rectangles bleu et rouge, titre et code). """
+    width, height = size
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    y1, y2, x1, x2 = zap_regions["erreur_bleu"]
+    frame[y1:y2, x1:x2] = error_blue
+    y1, y2, x1, x2 = zap_regions["erreur_rouge"]
+    frame[y1:y2, x1:x2] = error_red
+    y1, y2, x1, x2 = zap_regions["erreur_titre"]
+    cv2.putText(frame, "Service indisponible", (x1 + 4, y2 - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    y1, y2, x1, x2 = zap_regions["erreur_code"]
+    cv2.putText(frame, f"Code erreur : {code}", (x1 + 4, y2 - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    return frame
+
+
+def error_frames(duration=1.0, fps=default_fps, size=frame_size):
+    frame = error_frame(size)
+    for index in range(int(duration * fps)):
+        yield index, frame, index / fps
+
+
+def write_video(path, frames, fps=default_fps, fourcc="mp4v"):
+    """
+    Écrit les frames de l'itérable (index, frame, timestamp_s) dans path.
+    Retourne le nombre de frames écrites.
+    """
+    writer = None
+    count = 0
+    try:
+        for _, frame, _ in frames:
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+                if not writer.isOpened():
+                    raise OSError(f"impossible d'écrire {path} ({fourcc})")
+            writer.write(frame)
+            count += 1
+    finally:
+        if writer is not None:
+            writer.release()
+    logging.debug(f"{path} : {count} frames synthétiques")
+    return count
@@ -0,0 +1,104 @@
+import os
+import threading
+import logging
+import cv2
+
+
+class Template:
+    """ Image de référence en niveaux de gris et ses statistiques précalculées. """
+
+    def __init__(self, name, path, image, mtime):
+        self.name = name
+        self.path = path
+        self.image = image
+        self.mtime = mtime
+        self.height, self.width = image.shape[:2]
+        self.mean = float(image.mean())
+        self.std = float(image.std())
+        self._scaled = {}
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def scaled(self, scale):
+        """ Version redimensionnée du template (pour les flux d'analyse réduits), calculée une fois. """
+        if scale == 1.0:
+            return self.image
+        if scale not in self._scaled:
+            self._scaled[scale] = cv2.resize(self.image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return self._scaled[scale]
+
+
+class TemplateRegistry:
+    """
+    Registre des templates partagé par tout le processus.
+    Chaque image n'est lue et décodée qu'une seule fois, puis rechargée
+    uniquement si la date de modification du fichier change.
+    """
+
+    def __init__(self):
+        self._paths = {}
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        """ Associe un nom à un fichier de référence et le charge immédiatement. """
+        with self._lock:
+            self._paths[name] = path
+            self._templates.pop(name, None)
+        return self.get(name)
+
+    def unregister(self, name):
+        with self._lock:
+            self._paths.pop(name, None)
+            self._templates.pop(name, None)
+
+    def names(self):
+        with self._lock:
+            return list(self._paths)
+
+    def get(self, name):
+        """
+        Retourne le Template enregistré sous ce nom (ou ce chemin), None si
+        le fichier est introuvable ou illisible. Un chemin non enregistré
+        est enregistré automatiquement sous son propre nom.
+        """
+        with self._lock:
+            path = self._paths.setdefault(name, name)
+            cached = self._templates.get(name)
+
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                logging.error(f"Template introuvable : {path}")
+                self._templates.pop(name, None)
+                return None
+
+            if cached is not None and cached.mtime == mtime:
+                return cached
+
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                logging.error(f"Impossible de décoder le template : {path}")
+                self._templates.pop(name, None)
+                return None
+
+            template = Template(name, path, image, mtime)
+            self._templates[name] = template
+            logging.debug(f"Template {name} chargé ({template.width}x{template.height}, "
+                          f"moyenne {template.mean:.2f}, écart-type {template.std:.2f})")
+            return template
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._templates.clear()
+
+
+# Registre unique pour le processus
+template_registry = TemplateRegistry()
+
+
+def get_template(name):
+    return template_registry.get(name)
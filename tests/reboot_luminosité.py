@@ -5,6 +5,7 @@ import numpy as np
 import subprocess
 import sys
 import importlib.util
+from blackscreen import luma_estimate
 
 # Paramètres
 black_screen_threshold = 20  # Ajuster en fonction des valeurs de l’écran noir
@@ -13,8 +14,7 @@ result_base_dir = "results/"  # Définition en dur du chemin de stockage des ré
 
 # Fonction pour vérifier si une frame est noire
 def is_black_frame(frame, threshold=black_screen_threshold):
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    avg_luminance = np.mean(gray_frame)
+    avg_luminance = luma_estimate(frame)
     print(f"Luminosité moyenne : {avg_luminance}")  # Debug luminosité
     return avg_luminance < threshold
 
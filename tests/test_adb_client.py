@@ -0,0 +1,101 @@
+"""
+Tests de adb_client contre le faux serveur adb (fake_adb), sans box ni
+binaire adb : bibliothèque standard seulement.
+
+    python3 -m pytest tests/test_adb_client.py
+"""
+import os
+import sys
+import time
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adb_client import AdbClient  # noqa: E402
+from fake_adb import FakeAdbServer, FakeDevice  # noqa: E402
+
+SERIAL = "192.168.1.81:5555"
+
+
+@pytest.fixture
+def server():
+    server = FakeAdbServer().start()
+    yield server
+    server.stop()
+
+
+def make_client(server, device, timeout=5):
+    server.add_device(SERIAL, device)
+    return AdbClient(port=server.port, timeout=timeout)
+
+
+def test_shell_exit_codes(server):
+    device = FakeDevice(responses={"echo ok": "ok\n", "false": lambda command: ("", 1)})
+    client = make_client(server, device)
+    try:
+        assert client.run(SERIAL, "echo ok") == ("ok\n", 0)
+        assert client.run(SERIAL, "false") == ("", 1)
+        assert client.run(SERIAL, "commande_inconnue")[1] == 127
+        # La session reste utilisable après une commande en échec
+        assert client.shell(SERIAL, "echo ok") == "ok\n"
+    finally:
+        client.close_sessions()
+
+
+def test_properties_cache_invalidated_on_boot_id_change(server):
+    device = FakeDevice(properties={"ro.build.version.incremental": "1.0"})
+    client = make_client(server, device)
+    try:
+        assert client.properties(SERIAL)["ro.build.version.incremental"] == "1.0"
+        getprops = device.commands.count("getprop")
+
+        # Reboot externe (hors adb_client) avec une nouvelle version
+        device.properties["ro.build.version.incremental"] = "2.0"
+        device.boot_id = "nouveau-boot-id"
+        assert client.properties(SERIAL)["ro.build.version.incremental"] == "1.0"
+        assert device.commands.count("getprop") == getprops
+        assert client.properties(SERIAL, check_boot=True)["ro.build.version.incremental"] == "2.0"
+        assert device.commands.count("getprop") == getprops + 1
+    finally:
+        client.close_sessions()
+
+
+def test_reboot_then_wait_for_boot_completed(server):
+    device = FakeDevice(offline_time=0.3, boot_time=0.3)
+    client = make_client(server, device)
+    try:
+        boot_id = client.boot_id(SERIAL)
+        reboot_time = time.time()
+        client.reboot(SERIAL)
+        completed = client.wait_for_boot_completed(SERIAL, timeout=10, previous_boot_id=boot_id, interval=0.05)
+        assert completed is not None
+        assert completed >= reboot_time + 0.6 - 0.05
+        assert client.boot_id(SERIAL) != boot_id
+        assert client.properties(SERIAL)["sys.boot_completed"] == "1"
+    finally:
+        client.close_sessions()
+
+
+def test_wait_for_boot_completed_timeout(server):
+    device = FakeDevice()
+    client = make_client(server, device)
+    device.power_off()
+    start = time.monotonic()
+    assert client.wait_for_boot_completed(SERIAL, timeout=0.5, interval=0.05) is None
+    assert time.monotonic() - start < 2
+
+
+def test_wait_for_device_without_timeout_outlasts_client_timeout(server):
+    # timeout=None : attente sans limite, pas celle (0.2 s) des commandes du client
+    device = FakeDevice(offline_time=0.6)
+    client = make_client(server, device, timeout=0.2)
+    device.power_off()
+    threading.Timer(0.1, device.power_on).start()
+    start = time.monotonic()
+    client.wait_for_device(SERIAL)
+    assert time.monotonic() - start >= 0.5
+
+    device.power_off()
+    with pytest.raises(OSError):
+        client.wait_for_device(SERIAL, timeout=0.2)
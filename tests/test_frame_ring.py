@@ -0,0 +1,94 @@
+"""
+Tests de frame_ring (séquences de début/fin d'écriture, détection des
+lectures déchirées ou réécrites) dans un seul processus. Nécessite numpy
+et opencv (capture.py), comme les scripts.
+
+    python3 -m pytest tests/test_frame_ring.py
+"""
+import os
+import sys
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_ring import FrameRing  # noqa: E402
+
+SHAPE = (4, 6, 3)
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(SHAPE, slots=4)
+    yield ring
+    ring.close()
+
+
+def frame(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+def test_reader_attached_by_spec_sees_frames(ring):
+    reader = FrameRing.attach(ring.spec())
+    try:
+        seq = ring.write(frame(7), timestamp=12.5)
+        item = reader.read(seq)
+        assert item.index == seq
+        assert item.timestamp == 12.5
+        assert (item.frame == 7).all()
+        assert reader.valid(seq)
+    finally:
+        reader.close()
+
+
+def test_write_in_progress_is_not_readable(ring):
+    first = ring.write(frame(1), timestamp=1.0)
+    ring.write(frame(2), timestamp=2.0)
+    ring.write(frame(3), timestamp=3.0)
+    ring.write(frame(4), timestamp=4.0)
+    observed = {}
+
+    def extract(source, out):
+        # Au milieu de l'écriture de la séquence 5 (même emplacement que la 1)
+        observed["new"] = ring.read(first + ring.slots)
+        observed["old"] = ring.read(first)
+        observed["old_valid"] = ring.valid(first)
+        np.copyto(out, source)
+
+    seq = ring.write(frame(5), timestamp=5.0, extract=extract)
+    assert seq == first + ring.slots
+    assert observed == {"new": None, "old": None, "old_valid": False}
+    assert (ring.read(seq).frame == 5).all()
+
+
+def test_valid_detects_frame_rewritten_during_analysis(ring):
+    seq = ring.write(frame(1), timestamp=1.0)
+    item = ring.read(seq)
+    for value in range(2, 2 + ring.slots):
+        ring.write(frame(value), timestamp=float(value))
+    # La vue lue pointe désormais sur une autre frame : valid() le signale
+    assert not ring.valid(item.index)
+    assert ring.read(seq) is None
+    assert (item.frame == 1 + ring.slots).all()
+
+
+def test_frames_counts_skipped_and_overwritten(ring):
+    reader = ring.frames(poll=0)
+    ring.write(frame(1), timestamp=1.0)
+    item = next(reader)
+    assert item.index == 1
+    # Le lecteur garde la frame 1 pendant que l'écrivain fait le tour de l'anneau
+    for value in range(2, 2 + ring.slots + 2):
+        ring.write(frame(value), timestamp=float(value))
+    item = next(reader)
+    assert ring.overwritten == 1
+    # Reprise à la plus récente, les intermédiaires sont sautées
+    assert item.index == ring.head
+    assert ring.skipped == ring.head - 2
+
+    ring.close_writer()
+    assert list(reader) == []
+    assert ring.stats() == {"written": ring.head, "read": 2,
+                            "skipped": ring.head - 2, "overwritten": 1}
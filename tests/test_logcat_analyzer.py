@@ -0,0 +1,93 @@
+"""
+Tests de logcat_analyzer sur des fichiers logcat écrits à la main :
+bibliothèque standard seulement.
+
+    python3 -m pytest tests/test_logcat_analyzer.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logcat_analyzer import LogcatAnalyzer  # noqa: E402
+
+F3411 = "10-18 10:00:00.000 E TAG: LOG_ERROR: app;LIVE;F3411;timeout;tf1\n"
+F3413 = "10-18 10:00:01.000 E TAG: LOG_ERROR: app;LIVE;F3413;drm;m6\n"
+INFO = "10-18 10:00:02.000 I TAG: lecture en cours\n"
+
+
+def append(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+
+
+def test_counts_across_small_chunks(tmp_path):
+    # Blocs plus petits qu'une ligne : les lignes sont recollées entre blocs
+    log_file = str(tmp_path / "logcat.txt")
+    append(log_file, F3411 + INFO + F3413 + F3411)
+    analyzer = LogcatAnalyzer(log_file, chunk_size=7)
+    analyzer.update()
+    f3411, f3413, grep_output = analyzer.results()
+    assert (f3411, f3413) == (2, 1)
+    assert "LIVE;F3411;timeout;tf1=2" in grep_output.split('|')
+    assert "LIVE;F3413;drm;m6" in grep_output.split('|')
+
+
+def test_partial_line_completed_by_next_update(tmp_path):
+    log_file = str(tmp_path / "logcat.txt")
+    append(log_file, INFO + F3411[:30])
+    analyzer = LogcatAnalyzer(log_file)
+    analyzer.update()
+    assert analyzer.results()[0] == 0
+
+    append(log_file, F3411[30:])
+    analyzer.update()
+    assert analyzer.results()[0] == 1
+    # Rien de nouveau : pas de double comptage
+    assert analyzer.update() == 0
+    assert analyzer.results()[0] == 1
+
+
+def test_checkpoint_resume_with_partial_line(tmp_path):
+    log_file = str(tmp_path / "logcat.txt")
+    checkpoint = str(tmp_path / "logcat.checkpoint")
+    append(log_file, F3411 + F3413[:25])
+    analyzer = LogcatAnalyzer(log_file, checkpoint_file=checkpoint)
+    analyzer.update()
+    assert analyzer.results()[:2] == (1, 0)
+
+    # Redémarrage du script : la ligne incomplète est relue depuis son début
+    append(log_file, F3413[25:] + F3411)
+    resumed = LogcatAnalyzer(log_file, checkpoint_file=checkpoint)
+    assert resumed.offset == len(F3411)
+    resumed.update()
+    assert resumed.results()[:2] == (2, 1)
+    assert resumed.error_counts["LIVE;F3411;timeout;tf1"] == 2
+
+
+def test_truncated_file_restarts_from_beginning(tmp_path):
+    log_file = str(tmp_path / "logcat.txt")
+    checkpoint = str(tmp_path / "logcat.checkpoint")
+    append(log_file, F3411 + F3411 + F3411)
+    analyzer = LogcatAnalyzer(log_file, checkpoint_file=checkpoint)
+    analyzer.update()
+    assert analyzer.results()[0] == 3
+
+    # Nouveau logcat plus court que l'offset sauvegardé
+    with open(log_file, 'w') as f:
+        f.write(F3413)
+    resumed = LogcatAnalyzer(log_file, checkpoint_file=checkpoint)
+    resumed.update()
+    assert resumed.results()[:2] == (0, 1)
+
+
+def test_unreadable_checkpoint_ignored(tmp_path):
+    log_file = str(tmp_path / "logcat.txt")
+    checkpoint = str(tmp_path / "logcat.checkpoint")
+    append(log_file, F3411)
+    with open(checkpoint, 'w') as f:
+        f.write("{pas du json")
+    analyzer = LogcatAnalyzer(log_file, checkpoint_file=checkpoint)
+    assert analyzer.offset == 0
+    analyzer.update()
+    assert analyzer.results()[0] == 1
@@ -0,0 +1,76 @@
+"""
+Tests de logcat_index (index écrit au fil des blocs, requêtes par fenêtre
+de temps, rafales de LOG_ERROR) : bibliothèque standard seulement.
+
+    python3 -m pytest tests/test_logcat_index.py
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logcat_index  # noqa: E402
+from logcat_index import LogcatIndex, LogcatIndexWriter  # noqa: E402
+
+YEAR = 2024
+
+
+def line(second, text):
+    return f"10-18 10:00:{second:02d}.000  1234  1234 I TAG: {text}\n".encode()
+
+
+def epoch(second):
+    return datetime(YEAR, 10, 18, 10, 0, second).timestamp()
+
+
+def capture(log_file, lines, chunk_size, **kwargs):
+    """ Écrit le logcat par blocs de chunk_size octets, comme la capture. """
+    data = b''.join(lines)
+    writer = LogcatIndexWriter(log_file, year=YEAR, **kwargs)
+    with open(log_file, 'wb') as lf:
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start:start + chunk_size]
+            lf.write(chunk)
+            lf.flush()
+            writer.feed(chunk)
+    writer.close()
+
+
+def test_time_window_queries_with_lines_split_across_chunks(tmp_path):
+    log_file = str(tmp_path / "logcat.txt")
+    lines = [line(s, f"ligne {s}") for s in range(10)]
+    lines.insert(5, line(4, "LOG_ERROR: app;LIVE;F3411;timeout;tf1"))
+    capture(log_file, lines, chunk_size=13)
+
+    index = LogcatIndex(log_file)
+    selected = index.lines(epoch(3), epoch(5))
+    assert [text.split("TAG: ")[1] for text in selected] == [
+        "ligne 3", "ligne 4", "LOG_ERROR: app;LIVE;F3411;timeout;tf1", "ligne 5"]
+    assert index.error_lines(epoch(0), epoch(9)) == [lines[5].decode().rstrip('\n')]
+    assert index.error_lines(epoch(5), epoch(9)) == []
+    assert len(index.around(epoch(4), before=1, after=1)) == 4
+    assert index.lines(epoch(30), epoch(40)) == []
+
+
+def test_index_reloaded_while_capture_grows(tmp_path):
+    log_file = str(tmp_path / "logcat.txt")
+    writer = LogcatIndexWriter(log_file, year=YEAR)
+    index = LogcatIndex(log_file)
+    with open(log_file, 'wb') as lf:
+        for second in range(3):
+            chunk = line(second, f"ligne {second}")
+            lf.write(chunk)
+            lf.flush()
+            writer.feed(chunk)
+            assert len(index.lines(epoch(0), epoch(59))) == second + 1
+    writer.close()
+
+
+def test_error_burst_reported_once(tmp_path, monkeypatch):
+    reported = []
+    monkeypatch.setattr(logcat_index, "report_incident", lambda when, reason: reported.append((when, reason)))
+    log_file = str(tmp_path / "logcat.txt")
+    errors = [line(s, "LOG_ERROR: app;LIVE;F3413;drm;m6") for s in (0, 1, 2, 3, 30)]
+    capture(log_file, errors, chunk_size=64, burst_count=3, burst_window=10)
+    assert reported == [(datetime.fromtimestamp(epoch(0)), "rafale de 3 LOG_ERROR")]
@@ -0,0 +1,64 @@
+"""
+Tests du cache de OcrEngine sur des zones synthétiques (cv2.putText), sans
+appeler tesseract : _recognize est remplacé par un compteur. Nécessite
+numpy, opencv et pytesseract (importé par ocr.py), comme zap2.
+
+    python3 -m pytest tests/test_ocr.py
+"""
+import os
+import sys
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("pytesseract")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr import OcrEngine  # noqa: E402
+
+
+def error_zone(code, seed):
+    """ Zone 'code erreur' avec un bruit de capture différent à chaque frame. """
+    image = np.full((60, 320, 3), 40, dtype=np.uint8)
+    cv2.putText(image, f"Code erreur {code}", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (230, 230, 230), 2)
+    noise = np.random.default_rng(seed).integers(-6, 7, image.shape)
+    return np.clip(image.astype(int) + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.fixture
+def engine():
+    engine = OcrEngine()
+    engine.recognized = []
+
+    def recognize(image):
+        engine.recognized.append(image)
+        return f"lecture {len(engine.recognized)}"
+
+    engine._recognize = recognize
+    return engine
+
+
+def test_same_screen_read_once_despite_noise(engine):
+    engine.configure_zone("erreur_code", pixel_check=24)
+    texts = {engine.read(error_zone("S1004", seed), "erreur_code") for seed in range(20)}
+    assert texts == {"lecture 1"}
+    assert (engine.misses, engine.hits) == (1, 19)
+
+
+def test_one_digit_change_is_read_again(engine):
+    engine.configure_zone("erreur_code", pixel_check=24)
+    assert engine.read(error_zone("S1004", 0), "erreur_code") == "lecture 1"
+    assert engine.read(error_zone("S1005", 1), "erreur_code") == "lecture 2"
+    assert engine.read(error_zone("S1004", 2), "erreur_code") == "lecture 1"
+    assert engine.misses == 2
+
+
+def test_zones_have_separate_caches(engine):
+    image = error_zone("S1004", 0)
+    engine.read(image, "erreur_code")
+    engine.read(image, "erreur_message")
+    assert engine.misses == 2
+    engine.clear()
+    engine.read(image, "erreur_code")
+    assert engine.misses == 3
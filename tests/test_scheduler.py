@@ -0,0 +1,101 @@
+"""
+Tests de l'ordonnanceur (plafonds d'encodeurs/décodeurs, carte de capture
+exclusive) sans lancer de vrai test reboot : bibliothèque standard seulement.
+
+    python3 -m pytest tests/test_scheduler.py
+"""
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler  # noqa: E402
+from scheduler import Job, Scheduler, job_resources  # noqa: E402
+
+
+def make_scheduler(tmp_path, **kwargs):
+    return Scheduler(log_dir=str(tmp_path), **kwargs)
+
+
+def add_job(sched, name, hdmi):
+    job = Job(name, {f"hdmi:{hdmi}"})
+    sched.jobs.append(job)
+    return job
+
+
+def test_job_resources():
+    config = SimpleNamespace(hdmi="/dev/video0", PDU="10.0.0.5 3")
+    assert job_resources(config) == {"hdmi:/dev/video0"}
+    power_cycle = next(iter(scheduler.power_cycle_modules))
+    assert job_resources(config, power_cycle) == {"hdmi:/dev/video0", "pdu:10.0.0.5"}
+    assert job_resources(SimpleNamespace()) == set()
+
+
+def test_same_capture_card_never_runs_twice(tmp_path):
+    sched = make_scheduler(tmp_path, max_encoders=4, max_decoders=4)
+    first = add_job(sched, "a.py", "/dev/video0")
+    second = add_job(sched, "b.py", "/dev/video0")
+    third = add_job(sched, "c.py", "/dev/video1")
+
+    assert sched._take_next() is first
+    # b.py attend video0 mais ne bloque pas c.py
+    assert sched._take_next() is third
+    assert not sched._fits(second)
+
+    first.status = "termine"
+    sched._release(first)
+    assert sched._take_next() is second
+    assert sched.held == {"hdmi:/dev/video0", "hdmi:/dev/video1"}
+
+
+def test_encoder_and_decoder_caps(tmp_path):
+    sched = make_scheduler(tmp_path, max_encoders=2, max_decoders=3)
+    jobs = [add_job(sched, f"{n}.py", f"/dev/video{n}") for n in range(3)]
+
+    assert sched._take_next() is jobs[0]
+    assert sched._take_next() is jobs[1]
+    assert sched.in_use == {"encoder": 2, "decoder": 2}
+    assert not sched._fits(jobs[2])
+
+    jobs[0].status = "termine"
+    sched._release(jobs[0])
+    assert sched._take_next() is jobs[2]
+    assert sched.in_use == {"encoder": 2, "decoder": 2}
+
+    # Un test plus gourmand en décodeurs bute sur le plafond de décodeurs
+    heavy = Job("lourd.py", {"hdmi:/dev/video9"}, costs={"encoder": 0, "decoder": 2})
+    sched.jobs.append(heavy)
+    assert not sched._fits(heavy)
+
+
+def test_run_respects_limits(tmp_path):
+    sched = make_scheduler(tmp_path, max_workers=4, max_encoders=2, max_decoders=4)
+    for n, hdmi in enumerate(["video0", "video0", "video1", "video2", "video0"]):
+        add_job(sched, f"{n}.py", f"/dev/{hdmi}")
+
+    lock = threading.Lock()
+    running = []
+    peaks = {"jobs": 0, "video0": 0}
+
+    def fake_run_job(job):
+        with lock:
+            running.append(job)
+            peaks["jobs"] = max(peaks["jobs"], len(running))
+            peaks["video0"] = max(peaks["video0"], sum("hdmi:/dev/video0" in j.resources for j in running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(job)
+        job.status = "termine"
+        sched._release(job)
+
+    sched._run_job = fake_run_job
+    sched.run()
+
+    assert all(job.status == "termine" for job in sched.jobs)
+    assert peaks == {"jobs": 2, "video0": 1}
+    assert sched.in_use == {"encoder": 0, "decoder": 0}
+    assert not sched.held
+    assert not os.path.exists(sched.state_file)
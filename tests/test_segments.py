@@ -0,0 +1,60 @@
+"""
+Tests du ménage de segments (SegmentRing.sweep) sur des segments et des
+listes csv écrits à la main, sans ffmpeg : bibliothèque standard seulement.
+
+    python3 -m pytest tests/test_segments.py
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segments import SegmentRing  # noqa: E402
+
+
+def fake_segments(ring, starts):
+    """ Segments que le ffmpeg de ring.ffmpeg_output_args() aurait fermés. """
+    args = ring.ffmpeg_output_args()
+    list_file = args[args.index('-segment_list') + 1]
+    pattern = os.path.basename(args[-1])
+    names = []
+    with open(list_file, 'w') as f:
+        for start in starts:
+            name = start.strftime(pattern)
+            open(os.path.join(ring.directory, name), 'w').close()
+            f.write(f"{name},0.0,{ring.segment_time}.0\n")
+            names.append(name)
+    return names
+
+
+def test_sweep_keeps_incident_window_and_expires_the_rest(tmp_path):
+    ring = SegmentRing(str(tmp_path), segment_time=10, retention=60, before=20, after=20)
+    now = datetime.now().replace(microsecond=0)
+    old = [now - timedelta(seconds=300 - 10 * n) for n in range(6)]
+    recent = [now - timedelta(seconds=30)]
+    names = fake_segments(ring, old + recent)
+    ring.mark_incident(old[3] + timedelta(seconds=5), "écran noir")
+
+    ring.sweep()
+    # Fenêtre [incident - 20 s, incident + 20 s] : segments 1 à 5
+    assert ring.kept == set(names[1:6])
+    assert sorted(os.listdir(ring.incident_dir)) == sorted(names[1:6] + ["incidents.txt"])
+    # Le segment 0 a dépassé retention, le plus récent reste dans l'anneau
+    assert ring.deleted == 1
+    assert os.path.exists(os.path.join(str(tmp_path), names[6]))
+
+    ring.sweep(final=True)
+    assert ring.deleted == 2
+    assert not os.path.exists(os.path.join(str(tmp_path), names[6]))
+
+
+def test_each_ffmpeg_has_its_own_segment_list(tmp_path):
+    ring = SegmentRing(str(tmp_path), segment_time=10)
+    start = datetime.now().replace(microsecond=0) - timedelta(seconds=20)
+    first = fake_segments(ring, [start])
+    # Relance de ffmpeg à un autre niveau d'encodage, dans la même seconde
+    second = fake_segments(ring, [start])
+    assert first != second
+    assert len(ring.list_files) == 2
+    assert sorted(ring.completed_segments()) == sorted([(first[0], start), (second[0], start)])
@@ -0,0 +1,320 @@
+import logging
+import re
+import threading
+import cv2
+from motion import MotionDetector
+from features import FrameFeatures, features_of
+
+# Strides successifs (en frames) de la recherche grossière puis fine
+default_strides = (150, 15, 1)
+# Au-delà de cet écart on repositionne la vidéo, en deçà on enchaîne des grab()
+seek_threshold = 60
+# Timestamp de début d'entrée affiché par ffmpeg ("Duration: N/A, start: 1712345678.123456, ...")
+ffmpeg_start_pattern = re.compile(r'start: (\d+\.\d+)')
+
+
+def frame_timestamp(cap, index, fps):
+    """
+    Position dans la vidéo (s) de la frame qui vient d'être lue, d'après
+    son PTS ; à défaut index / fps si le backend ne fournit pas le PTS.
+    """
+    msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if msec > 0:
+        return msec / 1000
+    return index / fps
+
+
+def read_ffmpeg_start_time(ffmpeg_log_path):
+    """
+    Heure (epoch) de la première frame capturée, lue dans le log d'un ffmpeg
+    lancé avec '-ts mono2abs' sur l'entrée v4l2 (horloge monotone
+    convertie en heure absolue). None si introuvable.
+    """
+    try:
+        with open(ffmpeg_log_path, 'r', errors='replace') as f:
+            for line in f:
+                match = ffmpeg_start_pattern.search(line)
+                if match:
+                    start = float(match.group(1))
+                    # Un timestamp monotone (uptime) n'est pas utilisable comme ancre
+                    return start if start > 1e9 else None
+    except OSError as e:
+        logging.error(f"Lecture du log ffmpeg impossible : {e}")
+    return None
+
+
+class FrameProber:
+    """
+    Lecture aléatoire d'une vidéo : seek pour les grands sauts, grab() pour
+    avancer sans conversion couleur, retrieve() uniquement sur les frames testées.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        self.timestamps = {}  # index -> position (s) des frames testées
+        self.position = 0  # index de la prochaine frame lue par grab()
+        self.seeks = 0
+        self.grabs = 0
+        self.retrieves = 0
+
+    def read_at(self, index):
+        if index < self.position or index - self.position > seek_threshold:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self.position = index
+            self.seeks += 1
+
+        while self.position <= index:
+            if not self.cap.grab():
+                return None
+            self.position += 1
+            self.grabs += 1
+
+        ret, frame = self.cap.retrieve()
+        self.retrieves += 1
+        if not ret:
+            return None
+        self.timestamps[index] = frame_timestamp(self.cap, index, self.fps)
+        return frame
+
+
+def coarse_to_fine_search(cap, predicate, strides=default_strides, start=0, end=None):
+    """
+    Cherche la première frame pour laquelle predicate(frame) est vrai.
+    La vidéo est sondée avec le plus grand stride, puis l'intervalle qui
+    précède le premier succès est affiné avec les strides suivants jusqu'à
+    la frame près (le dernier stride doit valoir 1).
+    Retourne (index_frame, timestamp_s), ou None si rien n'est trouvé.
+    """
+    if end is None:
+        end = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    prober = FrameProber(cap)
+    lo, hi = start, end - 1
+    known_hit = None  # succès du niveau précédent, borne haute de l'intervalle
+
+    for stride in strides:
+        hit = None
+        indexes = list(range(lo, hi + 1, stride))
+        # Toujours tester la borne haute pour ne pas rater la fin de l'intervalle
+        if indexes and indexes[-1] != hi:
+            indexes.append(hi)
+        for index in indexes:
+            if index == known_hit:
+                hit = index
+                break
+            frame = prober.read_at(index)
+            if frame is None:
+                break
+            if predicate(frame):
+                hit = index
+                break
+
+        # Aucun succès plus tôt à ce niveau : le succès précédent reste le plus tôt
+        if hit is None:
+            hit = known_hit
+        if hit is None:
+            break
+        known_hit = hit
+        lo, hi = max(start, hit - stride + 1), hit
+
+    logging.debug(f"Recherche grossière/fine : {prober.seeks} seeks, {prober.grabs} grabs, "
+                  f"{prober.retrieves} frames décodées et testées")
+    if known_hit is None:
+        return None
+    return known_hit, round(prober.timestamps[known_hit], 3)
+
+
+def find_first_frame(video_path, predicate, strides=default_strides):
+    """
+    Ouvre la vidéo et retourne (index_frame, timestamp_s) de la première
+    frame vérifiant predicate, ou None.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logging.error(f"Impossible d'ouvrir la vidéo {video_path}")
+        return None
+
+    try:
+        return coarse_to_fine_search(cap, predicate, strides)
+    finally:
+        cap.release()
+
+
+class Detector:
+    """
+    Détecteur alimenté frame par frame, dans l'ordre, par run_detectors.
+    Les événements sont des tuples (label, index_frame, timestamp_s), le
+    timestamp étant la position de la frame dans la vidéo (PTS), pas la
+    durée de l'analyse. La frame reçue par process() est un FrameFeatures
+    (ou un tableau numpy) : features_of(frame) donne accès aux
+    représentations partagées, features_of(frame).frame à l'image brute.
+    """
+    name = "detector"
+
+    def __init__(self, after=None):
+        self.events = []
+        self.done = False  # plus rien à chercher, le détecteur peut être ignoré
+        self.after = after  # détecteur qui doit avoir émis un événement avant de commencer
+        self.detected = threading.Event()  # levé au premier événement (analyse en direct)
+
+    def process(self, frame, index, timestamp):
+        raise NotImplementedError
+
+    def finish(self, index, timestamp):
+        """ Appelé une fois à la fin de la vidéo. """
+        pass
+
+    def emit(self, label, index, timestamp):
+        self.events.append((label, index, timestamp))
+        self.detected.set()
+        logging.debug(f"[{self.name}] {label} à la frame {index} ({timestamp:.2f}s)")
+
+
+class LogoDetector(Detector):
+    """ Première frame (testée toutes les `every` frames) où predicate(frame) est vrai. """
+    name = "logo"
+
+    def __init__(self, predicate, every=10):
+        super().__init__()
+        self.predicate = predicate
+        self.every = every
+
+    def process(self, frame, index, timestamp):
+        # predicate reçoit les FrameFeatures partagées (compare_images les accepte)
+        if index % self.every == 0 and self.predicate(frame):
+            self.emit("logo", index, timestamp)
+            self.done = True
+
+
+class StreamDetector(Detector):
+    """ Mouvement continu dans une zone : même critère que detect_stream_from_video. """
+    name = "flux"
+
+    def __init__(self, y1, y2, x1, x2, seuil_diff=5, frames_consecutives=20, after=None):
+        super().__init__(after)
+        self.motion = MotionDetector(roi=(slice(y1, y2), slice(x1, x2)), motion_threshold=seuil_diff)
+        self.frames_consecutives = frames_consecutives
+        self.compteur = 0
+
+    def process(self, frame, index, timestamp):
+        if self.motion.is_moving(features_of(frame).frame):
+            self.compteur += 1
+            if self.compteur >= self.frames_consecutives:
+                self.emit("flux", index, timestamp)
+                self.motion.log_stats(self.name)
+                self.done = True
+        else:
+            self.compteur = 0
+
+
+class _DurationDetector(Detector):
+    """ Émet 'début' quand une condition tient plus de min_duration secondes, puis 'fin'. """
+
+    def __init__(self, min_duration):
+        super().__init__()
+        self.min_duration = min_duration
+        self.since = None  # (index, timestamp) du début de la condition
+        self.active = False
+
+    def update(self, condition, index, timestamp):
+        if condition:
+            if self.since is None:
+                self.since = (index, timestamp)
+            if not self.active and timestamp - self.since[1] >= self.min_duration:
+                self.active = True
+                self.emit("début", *self.since)
+        else:
+            if self.active:
+                self.emit("fin", index, timestamp)
+            self.since = None
+            self.active = False
+
+    def finish(self, index, timestamp):
+        if self.active:
+            self.emit("fin", index, timestamp)
+            self.active = False
+
+
+class BlackScreenDetector(_DurationDetector):
+    """ Écran noir : luminance moyenne estimée sur une frame sous-échantillonnée. """
+    name = "ecran_noir"
+
+    def __init__(self, threshold=10, min_duration=5.0, stride=8):
+        super().__init__(min_duration)
+        self.threshold = threshold
+        self.stride = stride
+
+    def process(self, frame, index, timestamp):
+        luma = features_of(frame).small(self.stride).mean()
+        self.update(luma < self.threshold, index, timestamp)
+
+
+class FrozenDetector(_DurationDetector):
+    """ Image figée : écart moyen quasi nul entre frames sous-échantillonnées successives. """
+    name = "image_figee"
+
+    def __init__(self, threshold=1.0, min_duration=5.0, stride=8):
+        super().__init__(min_duration)
+        self.threshold = threshold
+        self.stride = stride
+        self.previous = None
+
+    def process(self, frame, index, timestamp):
+        small = features_of(frame).small(self.stride)
+        if self.previous is not None and small.shape == self.previous.shape:
+            self.update(cv2.absdiff(small, self.previous).mean() < self.threshold, index, timestamp)
+        self.previous = small
+
+
+def run_detectors(frames, detectors, stop_when_done=True):
+    """
+    Passe chaque (index, frame, timestamp) de l'itérable, dans l'ordre, à
+    tous les détecteurs encore actifs, la frame étant enveloppée dans un
+    FrameFeatures partagé par les détecteurs. Retourne {nom_détecteur: événements}.
+    Avec stop_when_done=False l'itérable est consommé jusqu'au bout, ce qui
+    est nécessaire pour continuer à vider un pipe ffmpeg en direct.
+    """
+    count = 0
+    index, timestamp = 0, 0.0
+    for index, frame, timestamp in frames:
+        active = [d for d in detectors if not d.done]
+        if stop_when_done and not active:
+            break
+        features = FrameFeatures(frame)
+        for detector in active:
+            if detector.after is not None and not detector.after.events:
+                continue
+            detector.process(features, index, timestamp)
+        count += 1
+
+    for detector in detectors:
+        detector.finish(index, timestamp)
+    logging.debug(f"{count} frames analysées en une passe")
+    return {detector.name: detector.events for detector in detectors}
+
+
+def analyze_video(video_path, detectors, stop_when_done=True):
+    """
+    Décode la vidéo une seule fois et passe chaque frame, dans l'ordre, à
+    tous les détecteurs encore actifs. Retourne {nom_détecteur: événements},
+    ou None si la vidéo ne peut pas être ouverte.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logging.error(f"Impossible d'ouvrir la vidéo {video_path}")
+        return None
+
+    def frames():
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield index, frame, frame_timestamp(cap, index, fps)
+            index += 1
+
+    try:
+        return run_detectors(frames(), detectors, stop_when_done)
+    finally:
+        cap.release()
@@ -1,7 +1,4 @@
-import subprocess
-import pytesseract
 import numpy as np
-from multiprocessing import Process
 from threading import Thread
 import logging
 import cv2 
@@ -9,18 +6,44 @@ import sys
 import time
 import os
 import zap_functions
+from capture import RoiLayout, CaptureThread
+from motion import MotionDetector
+from blackscreen import BlackScreenMonitor
+from ocr import ocr_engine
+from features import features_of
+from capture_broker import open_capture
+from frame_ring import FrameRing, DetectionProcess
+from adb_client import adb, device_serial
 
 home_path = os.path.expanduser("~")
 save_path = os.path.join(home_path, "IVS/results/")
 expected_kpi = 3.50
 number_of_zaps = 4
 
+# Zones (y1, y2, x1, x2) en pleine résolution lues par les détecteurs de zap.
+# Les détecteurs ne reçoivent que leur union (frame réduite), l'enregistrement garde la frame entière.
+zap_rois = {
+    "noir_1": (361, 426, 155, 463),
+    "noir_2": (79, 229, 554, 618),
+    "chaines": (4, 475, 12, 125),
+    "logo_chaine": (6, 283, 141, 568),
+    "flux": (6, 285, 150, 568),
+    "erreur_bleu": (315, 399, 374, 411),
+    "erreur_rouge": (411, 473, 374, 395),
+    "erreur_titre": (14, 96, 382, 632),
+    "erreur_code": (414, 474, 382, 632),
+}
+zap_layout = RoiLayout(zap_rois)
+# Moteur de détection de mouvement de la zone du flux : la référence reste la dernière image statique
+stream_motion = MotionDetector(roi=zap_layout.slices("flux"), hold_reference=True, motion_threshold=5)
+# Code d'erreur : un chiffre différent doit être relu, pas repris du cache d'un autre code
+ocr_engine.configure_zone("erreur_code", pixel_check=24)
+
 
 def stop_all(capture_hdmi, file, process_ffmpeg, log_f):
     # Close capture, output video, and opencv frame 
     file.close()
-    process_ffmpeg.stdin.close()
-    process_ffmpeg.wait()
+    zap_functions.close_ffmpeg(process_ffmpeg)
     log_f.close()
     capture_hdmi.release()  
     logging.info("déconnexion réussie")
@@ -34,7 +57,8 @@ def create_repository(ip, save_path):
 
 def setup_capture_hdmi(hdmi_path):
     # Create an object to read HDMI
-    capture_hdmi = cv2.VideoCapture(hdmi_path) 
+    # Via le broker de la carte s'il tourne (capture partagée), sinon ouverture directe
+    capture_hdmi = open_capture(hdmi_path)
     if (capture_hdmi.isOpened() == False): 
         logging.error("erreur lors de la lecture du flux HDMI") 
         exit(1)
@@ -67,37 +91,53 @@ def zap_routine(ip, capture_hdmi, log_dir):
 
     logging.info("placement sur la chaine 1...")
     # Going to the first channel
-    subprocess.run(["adb", "-s", ip, "shell", "input", "keyevent", "KEYCODE_HOME"], check=True)
+    adb.shell(device_serial(ip), "input keyevent KEYCODE_HOME")
     time.sleep(2)
     logging.info("commande home entrée...")
-    subprocess.run(["adb", "-s", ip, "shell", "input", "keyevent", "KEYCODE_1"], check=True)
+    adb.shell(device_serial(ip), "input keyevent KEYCODE_1")
     time.sleep(5)
     logging.info("commande chaine 1 entrée...")
 
+    # Détecteurs dans un processus à part (autre cœur), lancé une fois pour tous les zaps
+    detector = DetectionProcess(detection_worker, zap_layout.shape, extract=zap_layout.extract).start()
+
     for channel_number in range(1, number_of_zaps+1):
         logging.info(f"enregistrement zap entre la chaine {channel_number} et {channel_number+1}...")
         # Changing file name of video
         filename = filename[0:-5] + str(channel_number) + filename[-4:]
         process_ffmpeg = zap_functions.setup_ffmpeg(int(capture_hdmi.get(3)), int(capture_hdmi.get(4)), 30, path+filename)
-        zap_time_taken = manage_video(ip, capture_hdmi, process_ffmpeg, log_f, blackscreen_events)
+        zap_time_taken = manage_video(ip, capture_hdmi, process_ffmpeg, log_f, blackscreen_events, detector)
         write_zap_time(file, path+filename, zap_time_taken)
+        # Un encodeur par zap : fermé ici pour finaliser la vidéo et adapter le réglage du suivant
+        encoder_stats = zap_functions.close_ffmpeg(process_ffmpeg)
+        log_f.write(f"{path+filename} - Encodeur : {zap_functions.format_encoder_stats(encoder_stats)}\n")
 
+    detector.stop()
     stop_all(capture_hdmi, file, process_ffmpeg, log_f)
 
 
-def manage_video(ip, capture_hdmi, process_ffmpeg, log_f, blackscreen_events):
+def manage_video(ip, capture_hdmi, process_ffmpeg, log_f, blackscreen_events, detector):
     status = "debut_video"
     timer = time.time()
-    process = Process(target=press_key, args=(ip,))
-    compteur_frames_noires = 0
-    est_noir = False
-
-    while True:
-        ret, frame = capture_hdmi.read() 
-        if not ret: 
-            break 
-
-        if time.time() - timer >= 5 and status != "zapping": # Check if timer has reached 5 seconds
+    zap_time_taken = 0
+    # Le client adb est partagé entre threads : pas besoin d'un processus pour appuyer en parallèle
+    process = Thread(target=press_key, args=(ip,))
+    black_monitor = BlackScreenMonitor(log_f, blackscreen_events).start()
+
+    # Capture dans son propre thread : l'enregistrement et la détection consomment chacun
+    # leur file, les temps sont ceux de la capture des frames. Les zones de détection sont
+    # écrites dans l'anneau partagé avec le processus de détection (detection_worker).
+    capture = CaptureThread(capture_hdmi)
+    recording = capture.subscribe("enregistrement", maxsize=30)
+    detection = capture.subscribe("detection", maxsize=5)
+    recorder = Thread(target=zap_functions.record_frames, args=(recording, process_ffmpeg, black_monitor))
+    capture.start()
+    recorder.start()
+
+    for item in detection:
+        detector.submit(item)
+
+        if item.timestamp - timer >= 5 and status != "zapping": # Check if timer has reached 5 seconds
             if status == "debut_video":
                 # Pressing key in parallel while analysing frames
                 if process.is_alive():  
@@ -105,34 +145,76 @@ def manage_video(ip, capture_hdmi, process_ffmpeg, log_f, blackscreen_events):
                 process.start() 
                 # Using timer to record zapping time
                 timer = time.time() 
+                detector.analyse_from(timer)
                 logging.debug("bouton zap appuyé...")
                 status = "zapping"
 
             if status == "fin_video":
                 break
             
-        if status == "zapping":
-            if time.time() - timer >= 15 :
+        if status == "zapping" and item.timestamp >= timer:
+            zap_result = None
+            if item.timestamp - timer >= 15 :
                 logging.debug("délai d'attente dépassé...")
-                zap_result = "erreur" 
-                detect_stream.active = False
-                detect_stream.frames_after_detection = 0
+                zap_result, result_time = "erreur", item.timestamp
             else :
-                zap_result = detect_zap(frame)
+                result = detector.poll()
+                # Résultat d'une frame capturée avant l'appui : reste d'un zap précédent
+                if result is not None and result[1] >= timer:
+                    _, result_time, zap_result = result
 
             if zap_result in ["flux", "erreur"]:
                 logging.debug("fin temps de zap...")
+                # Le processus de détection se remet en attente (et remet ses détecteurs à zéro)
+                detector.analyse_from(0)
                 status = "fin_video"
-                zap_time_taken = round(time.time() - timer, 2) if zap_result == "flux" else 0  
-                timer = time.time() # Waiting 5 seconds before ending recording
+                zap_time_taken = round(result_time - timer, 2) if zap_result == "flux" else 0  
+                timer = item.timestamp # Waiting 5 seconds before ending recording
 
-        compteur_frames_noires, est_noir = zap_functions.save_frame(frame, process_ffmpeg, log_f, blackscreen_events, compteur_frames_noires, est_noir)
+    capture.stop()
+    recorder.join()
+    capture.log_stats()
+    black_monitor.stop()
     return zap_time_taken
 
+def detection_worker(ring_spec, start, results):
+    """
+    Processus de détection (DetectionProcess) : applique detect_zap aux zones
+    de zap écrites dans l'anneau par manage_video, pour les frames capturées
+    après l'appui sur la touche (start.value), et renvoie (index, heure de
+    capture, résultat) quand le flux ou un écran d'erreur est détecté.
+    """
+    ring = FrameRing.attach(ring_spec)
+    zap_start = 0.0
+    try:
+        for item in ring.frames():
+            if start.value != zap_start:
+                # Nouveau zap ou fin du zap : détecteurs remis à zéro
+                zap_start = start.value
+                detect_stream.active = False
+                detect_stream.frames_after_detection = 0
+            if not zap_start or item.timestamp < zap_start:
+                continue
+            zap_result = detect_zap(item.frame)
+            if zap_result == "rien":
+                continue
+            if not ring.valid(item.index):
+                # Emplacement réécrit pendant l'analyse : résultat tiré d'une frame mêlée, écarté
+                logging.debug(f"Frame {item.index} réécrite pendant l'analyse, résultat '{zap_result}' écarté")
+                continue
+            results.put((item.index, item.timestamp, zap_result))
+    finally:
+        logging.debug(f"Processus de détection : {ring.stats()}")
+        ocr_engine.close()
+        ring.close()
+
 def press_key(ip):
-    subprocess.run(["adb", "-s", ip, "shell", "input", "keyevent", "KEYCODE_CHANNEL_UP"], check=True)
+    adb.shell(device_serial(ip), "input keyevent KEYCODE_CHANNEL_UP")
 
 def detect_zap(frame):
+    """ frame : union des zones de zap_rois, extraite par zap_layout """
+    # Représentations de la frame (gris, moyennes de zones) partagées par les détecteurs
+    frame = features_of(frame)
     if detect_logo(frame) and detect_stream.active == False:
         detect_stream(frame, first_use=True)
 
@@ -153,6 +235,7 @@ def detect_zap(frame):
     if detect_stream.frames_after_detection != 0:
         if detect_stream.frames_after_detection >= 20:
             logging.info("flux détecté ...")
+            stream_motion.log_stats("flux")
             detect_stream.frames_after_detection = 0
             detect_stream.active = False
             return "flux"
@@ -163,41 +246,37 @@ def detect_zap(frame):
 
 
 def detect_stream(frame, first_use=False):
-    cropped_frame = frame[6:285,150:568] 
     if first_use:
         detect_stream.active = True
         detect_stream.frames_after_detection = 0
-        detect_stream.last_frame = cropped_frame
+        stream_motion.reset(features_of(frame).frame)
         return False
 
-    # Calculate the difference between the two images
-    difference = cv2.absdiff(cropped_frame, detect_stream.last_frame)
-    non_identical_pixels = np.sum(difference > 10)
-    total_pixels = difference.size
-    percentage_difference = (non_identical_pixels / total_pixels) * 100
+    # Calculate the difference with the last static image of the area
+    percentage_difference = stream_motion.update(features_of(frame).frame)
     logging.debug(f"Pourcentage de différence entre cette frame et la précédente : {round(percentage_difference,3)}")
 
-    if percentage_difference > 5:
-        return True
-
-    detect_stream.last_frame = cropped_frame
-    return False
+    return percentage_difference > stream_motion.motion_threshold
 
 
 def detect_logo(frame):
+    features = features_of(frame)
     # Checking presence of black areas
-    black_area1 = 0 <= np.average(frame[361:426, 155:463]) < 7.653
-    black_area2 = np.average(frame[79:229, 554:618]) <= 0.1
-    channel_area = np.average(frame[4:475, 12:125]) > 20
+    mean_black1 = features.mean(zap_layout.slices("noir_1"))
+    mean_black2 = features.mean(zap_layout.slices("noir_2"))
+    mean_channels = features.mean(zap_layout.slices("chaines"))
+    black_area1 = 0 <= mean_black1 < 7.653
+    black_area2 = mean_black2 <= 0.1
+    channel_area = mean_channels > 20
 
     logo_visible = False
-    logging.debug(f"pixels zone noire 1 (attendu ~7.65) : {round(np.average(frame[361:426, 155:463]),2)}")
-    logging.debug(f"pixels zone noire 2 (attendu ~0.09) : {round(np.average(frame[79:229, 554:618]),2)}")
-    logging.debug(f"pixels zone chaines (attendu > 20)  : {round(np.average(frame[4:475, 12:125]),2)}")
+    logging.debug(f"pixels zone noire 1 (attendu ~7.65) : {round(mean_black1,2)}")
+    logging.debug(f"pixels zone noire 2 (attendu ~0.09) : {round(mean_black2,2)}")
+    logging.debug(f"pixels zone chaines (attendu > 20)  : {round(mean_channels,2)}")
 
     if black_area1 and black_area2 and channel_area:
         # Check presence of channel logo
-        gray = cv2.cvtColor(frame[6:283,141:568],cv2.COLOR_BGR2GRAY)
+        gray = features.gray_roi(zap_layout.slices("logo_chaine"))
         thresh = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY)[1]
 
         contours = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
@@ -211,15 +290,17 @@ def detect_logo(frame):
 
 
 def detect_error(frame):
+    features = features_of(frame)
+    frame = features.frame
     detect_error.on_screen = False
     # Check if error screen is present
     blue_expected = np.array([103.5, 75.5, 29.7])
     red_expected = np.array([52, 50, 116])
     threshold = 20
     # Average pixel value on the blue and red area
-    mean_color_blue = cv2.mean(frame[315:399, 374:411])
+    mean_color_blue = features.channel_means(zap_layout.slices("erreur_bleu"))
     logging.debug(f"rectangle bleu erreur : {mean_color_blue[:3]}")
-    mean_color_red = cv2.mean(frame[411:473, 374:395])
+    mean_color_red = features.channel_means(zap_layout.slices("erreur_rouge"))
     logging.debug(f"rectangle rouge erreur : {mean_color_red[:3]}")
 
     distance_blue = np.abs(blue_expected - mean_color_blue[:3])
@@ -231,11 +312,12 @@ def detect_error(frame):
     logging.debug(f"zone rouge -> {red_rectangle} / zone bleue -> {blue_rectangle}")
 
     if blue_rectangle and red_rectangle:
-        # Retrieve error text
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        resize_frame = cv2.resize(img_rgb[414:474, 382:632], None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
-        top_text = pytesseract.image_to_string(img_rgb[14:96, 382:632])
-        bottom_text = pytesseract.image_to_string(resize_frame)
+        # Retrieve error text (moteur OCR persistant, un écran inchangé n'est lu qu'une fois)
+        title_rgb = cv2.cvtColor(frame[zap_layout.slices("erreur_titre")], cv2.COLOR_BGR2RGB)
+        code_rgb = cv2.cvtColor(frame[zap_layout.slices("erreur_code")], cv2.COLOR_BGR2RGB)
+        resize_frame = cv2.resize(code_rgb, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
+        top_text = ocr_engine.read(title_rgb, "erreur_titre")
+        bottom_text = ocr_engine.read(resize_frame, "erreur_code")
         error_code = bottom_text[bottom_text.find(':') + 1:bottom_text.find('\n')].strip()
         top_text = top_text.replace("\n", " ").strip()
         
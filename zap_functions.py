@@ -2,39 +2,56 @@ import subprocess
 import time
 import threading
 from datetime import datetime
-import importlib.util
 import os
 import sys
-import re
 import logging
-from collections import Counter
 import cv2
 import numpy as np
+from adb_client import adb, device_serial, AdbError
+from process_watcher import ProcessWatcher
+from logcat_analyzer import LogcatAnalyzer
+from logcat_index import LogcatIndex, LogcatIndexWriter
+from blackscreen import BlackScreenMonitor
+from encoder import EncoderMonitor, current_encoder_settings, format_encoder_stats, set_level
+from segments import SegmentRing, report_incident
+from capture import CaptureThread
+from capture_broker import open_capture
+from config_loader import load_config  # noqa: F401 (réexporté pour les scripts)
 
 stop_event = threading.Event()
+# Statistiques de l'encodeur de record_video, tenues à jour pendant l'enregistrement
+# et reportées par generate_results_file
+encoder_stats = {}
 
 def connect_adb(ip='192.168.1.122', port=5555):
     logging.info(f"tentative de connexion à {ip} ...")
-    connection_status = subprocess.run(['adb', 'connect', f'{ip}:{port}'], capture_output=True)
-    if "connected" not in str(connection_status.stdout):
-        error_msg = str(connection_status.stdout)[2:-3]
-        logging.error(f"connexion échouée, {error_msg}")
+    try:
+        connection_status = adb.connect(ip, port)
+    except (AdbError, OSError) as e:
+        connection_status = str(e)
+    if "connected" not in connection_status:
+        logging.error(f"connexion échouée, {connection_status}")
         sys.exit(1)
 
     logging.info("connexion réussie")
 
 
 def get_pid(package_name, ip):
-    result = subprocess.run(['adb', '-s', f'{ip}:5555', 'shell', 'pidof', package_name], capture_output=True, text=True)
-    pid = result.stdout.strip()
+    try:
+        pid = adb.shell(device_serial(ip), f"pidof {package_name}").strip()
+    except (AdbError, OSError) as e:
+        logging.debug(f"pidof {package_name} impossible : {e}")
+        pid = ''
     return int(pid) if pid else None
 
 
 def is_app_in_foreground(package_name, ip):
-    result = subprocess.run(
-        ['adb', '-s', f'{ip}:5555', 'shell', 'dumpsys', 'window', '|', 'grep', 'mCurrentFocus'],
-        capture_output=True, text=True)
-    return package_name in result.stdout
+    try:
+        output = adb.shell(device_serial(ip), "dumpsys window | grep mCurrentFocus")
+    except (AdbError, OSError) as e:
+        logging.debug(f"dumpsys window impossible : {e}")
+        output = ''
+    return package_name in output
     lines = output.splitlines()
     for line in lines:
         if "mResumedActivity" in line and package_name in line:
@@ -44,72 +61,92 @@ def is_app_in_foreground(package_name, ip):
 
 
 def initialize_logcat(log_file, ip):
-    subprocess.run(['adb', '-s', f'{ip}:5555', 'logcat', '-c'])
-    subprocess.run(['adb', '-s', f'{ip}:5555', 'logcat', '-G', '2M'])
-    with open(log_file, 'w') as lf:
-        subprocess.Popen(['adb', '-s', f'{ip}:5555', 'logcat'], stdout=lf)
+    serial = device_serial(ip)
+    adb.shell(serial, "logcat -c")
+    adb.shell(serial, "logcat -G 2M")
+    stream = adb.open_stream(serial, "shell:logcat")
+    lf = open(log_file, 'wb')
+    # Nouveau fichier : l'analyse précédente n'est plus valable
+    logcat_analyzers.pop(log_file, None)
+    if os.path.exists(logcat_checkpoint(log_file)):
+        os.remove(logcat_checkpoint(log_file))
+    index = LogcatIndexWriter(log_file)
+    threading.Thread(target=pump_logcat, args=(stream, lf, index), daemon=True).start()
+
+
+def pump_logcat(stream, lf, index=None):
+    # Recopie le flux logcat dans le fichier jusqu'à la fermeture de la connexion,
+    # en tenant à jour l'index temporel (<log_file>.idx)
+    try:
+        while True:
+            chunk = stream.recv(65536)
+            if not chunk:
+                break
+            lf.write(chunk)
+            lf.flush()
+            if index is not None:
+                index.feed(chunk)
+    except OSError as e:
+        logging.error(f"flux logcat interrompu : {e}")
+    finally:
+        lf.close()
+        stream.close()
+        if index is not None:
+            index.close()
+
+
+def logcat_window(log_file, t, before=30, after=30, errors_only=False):
+    """ Lignes logcat autour de l'instant t (datetime), via l'index de la capture. """
+    return LogcatIndex(log_file).around(t, before, after, errors_only)
 
 
 import subprocess
 
 
-def load_config(config_path):
-    if not os.path.isfile(config_path):
-        logging.error(f"le fichier de configuration {config_path} n'existe pas")
-        sys.exit(1)
-    
-    spec = importlib.util.spec_from_file_location("config", config_path)
-    config = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(config)
-    return config
+def get_device_properties(ip, refresh=False):
+    """
+    Propriétés de la box (un seul 'getprop' par session adb, invalidé au reboot).
+    Retourne None si la box ne répond pas.
+    """
+    try:
+        return adb.properties(device_serial(ip), refresh=refresh)
+    except (AdbError, OSError) as e:
+        logging.error(f"Erreur lors de la lecture des propriétés de {ip} : {e}")
+        return None
 
 
 def get_device_model(ip):
-    result = subprocess.run(["adb", "-s", ip, "shell", "getprop", "ro.product.device"], capture_output=True, text=True, check=True)
-    if result.returncode == 0:
-        return result.stdout[:-1]
-    else:
+    properties = get_device_properties(ip)
+    if properties is None:
         logging.error("Erreur lors de la récupération du device model")
         return None
+    return properties.get("ro.product.device", "")
 
 def get_os_version(ip, timeout=30):
-    result = subprocess.run(["adb", "-s", ip, "shell", "getprop", "ro.build.version.incremental"], capture_output=True, text=True, check=True)
-    if result.returncode == 0:
-        return result.stdout[:-1]
-    else:
+    properties = get_device_properties(ip)
+    if properties is None:
         logging.error("Erreur lors de la récupération de la version")
         return None
+    return properties.get("ro.build.version.incremental", "")
 
 
 def get_os_version_and_imei(ip, timeout=30):
-    try:
-        # Exécution de la commande pour obtenir la version de l'OS avec un timeout
-        os_version_result = subprocess.run(
-            ['adb', '-s', f'{ip}:5555', 'shell', 'getprop', 'ro.build.version.incremental'],
-            capture_output=True, text=True, timeout=timeout
-        )
-        os_version = os_version_result.stdout.strip()
-
-        # Exécution de la commande pour obtenir le numéro de série avec un timeout
-        serial_number_result = subprocess.run(
-            ['adb', '-s', f'{ip}:5555', 'shell', 'getprop'],
-            capture_output=True, text=True, timeout=timeout
-        )
-
-        serial_number = ''
-        for line in serial_number_result.stdout.splitlines():
-            if 'serial' in line.lower():
-                serial_number = line.split(': ')[1].strip().strip('[]')
-                break
-
-        os_version_serialnumber = f"{os_version}_{serial_number}"
-        return os_version_serialnumber
-
-    except subprocess.TimeoutExpired:
-        # En cas de dépassement du délai
+    properties = get_device_properties(ip)
+    if properties is None:
         print(f"La commande adb a dépassé le délai d'attente pour {ip}")
         return None
 
+    os_version = properties.get("ro.build.version.incremental", "")
+    # Première propriété (dans l'ordre de getprop) dont la ligne mentionne 'serial'
+    serial_number = ''
+    for key, value in sorted(properties.items()):
+        if 'serial' in f"[{key}]: [{value}]".lower():
+            serial_number = value.strip()
+            break
+
+    os_version_serialnumber = f"{os_version}_{serial_number}"
+    return os_version_serialnumber
+
 
 def monitor_processes(ip):
     packages = {
@@ -124,28 +161,41 @@ def monitor_processes(ip):
 
     critical_processes = ['middleware', 'comedia', 'system_server']
 
-    current_pids = {name: get_pid(pkg, ip) for name, pkg in packages.items()}
-    bbui_in_foreground = is_app_in_foreground(packages['bbui'], ip)
+    # Une seule session shell sur la box remonte les changements de PID et de premier plan
+    watcher = ProcessWatcher(ip, packages).start()
+    snapshot = None
+    while snapshot is None and not stop_event.is_set():
+        snapshot = watcher.get(timeout=1)
+    if snapshot is None:
+        watcher.stop()
+        return [], {name: 0 for name in ['tr069', 'custo', 'power']}
+
+    current_pids = dict(snapshot.pids)
+    bbui_in_foreground = packages['bbui'] in snapshot.focus
     pid_changes = []
     persistent_pid_changes = {name: 0 for name in ['tr069', 'custo', 'power']}
 
     print(f"[DEBUG] Initial PIDs: {current_pids}, bbui in foreground: {bbui_in_foreground}")
 
     while not stop_event.is_set():
-        new_pids = {name: get_pid(pkg, ip) for name, pkg in packages.items()}
-        new_bbui_in_foreground = is_app_in_foreground(packages['bbui'], ip)
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[DEBUG] {current_time} - Current PIDs: {new_pids}, bbui in foreground: {new_bbui_in_foreground}")
+        snapshot = watcher.get(timeout=1)
+        if snapshot is None:
+            continue
+        new_pids = snapshot.pids
+        new_bbui_in_foreground = packages['bbui'] in snapshot.focus
+        # Horodatage côté box : heure réelle du changement, pas celle de la lecture
+        change_time = snapshot.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[DEBUG] {change_time} - Current PIDs: {new_pids}, bbui in foreground: {new_bbui_in_foreground}")
         if current_pids['bbui'] != new_pids['bbui']:
-            change_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             pid_changes.append(f"bbui PID changed from {current_pids['bbui']} to {new_pids['bbui']} at {change_time}")
+            report_incident(snapshot.timestamp, "bbui PID")
 
             if bbui_in_foreground:
                 print("[ERROR] bbui PID a changé alors qu'il était au premier plan.")
                 print("[ERROR] attente de 60secondes .")
 
                 time.sleep(60)
-                subprocess.run(['adb', 'disconnect', f'{ip}:5555'])
+                adb.disconnect(device_serial(ip))
                 stop_event.set()
                 break
             else:
@@ -156,15 +206,15 @@ def monitor_processes(ip):
                 print("[ERROR] bbui PID a changé .")
                 continue
             if new_pid != current_pids[name] and name in critical_processes:
-                change_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 pid_changes.append(f"{name} PID changed from {current_pids[name]} to {new_pid} at {change_time}")
+                report_incident(snapshot.timestamp, f"{name} PID")
                 current_pids[name] = new_pid
 
                 if name in critical_processes:
                     print(f"[ERROR] {name} was killed.")
                     print("[ERROR] attente de 40secondes .")
                     time.sleep(40)
-                    subprocess.run(['adb', 'disconnect', f'{ip}:5555'])
+                    adb.disconnect(device_serial(ip))
                     stop_event.set()
                     break
 
@@ -174,49 +224,36 @@ def monitor_processes(ip):
         if current_pids['bbui']:
             bbui_in_foreground = new_bbui_in_foreground
 
-        time.sleep(10)
-
+    watcher.stop()
     return pid_changes, persistent_pid_changes
 
 
-def record_logs(log_file, error_log_file, ip):
-    f3411_count = 0
-    f3413_count = 0
+# Un analyseur par fichier logcat, conservé entre deux rapports
+logcat_analyzers = {}
 
-    logging.debug(f"Lecture du fichier de logs: {log_file}")
-    with open(log_file, 'r') as lf:
-        log_content = lf.read()
-    logging.debug(f"Contenu du fichier lu avec succès")
 
-    logging.debug("Recherche des occurrences de LOG_ERROR dans le contenu des logs")
-    log_error_entries = re.findall(r'.*LOG_ERROR.*', log_content)
-    logging.debug(f"Nombre d'entrées trouvées contenant LOG_ERROR: {len(log_error_entries)}")
+def logcat_checkpoint(log_file):
+    return f"{log_file}.checkpoint"
 
-    formatted_errors = []
-    for entry in log_error_entries:
-        match = re.search(r'LOG_ERROR: (.*)', entry)
-        if match:
-            log_error_content = match.group(1).strip()
-            if 'LIVE;F3411' in log_error_content:
-                f3411_count += 1
-            if 'LIVE;F3413' in log_error_content:
-                f3413_count += 1
 
-            elements = log_error_content.split(';')
-            if len(elements) >= 4:
-                formatted_error = ';'.join(elements[-4:])
-                formatted_errors.append(formatted_error)
+def record_logs(log_file, error_log_file, ip):
+    analyzer = logcat_analyzers.get(log_file)
+    if analyzer is None:
+        analyzer = LogcatAnalyzer(log_file, checkpoint_file=logcat_checkpoint(log_file))
+        logcat_analyzers[log_file] = analyzer
 
-    error_counts = Counter(formatted_errors)
-    grep_output = '|'.join([f"{error}={count}" if count > 1 else error for error, count in error_counts.items()])
+    logging.debug(f"Analyse des nouvelles lignes du fichier de logs: {log_file}")
+    analyzer.update()
+    logging.debug(f"Nombre de signatures LOG_ERROR distinctes: {len(analyzer.error_counts)}")
 
-    return f3411_count, f3413_count, grep_output
+    return analyzer.results()
 
 
 
 def setup_capture(hdmi, nouveau_fps=None):
     # Initialiser l'objet de capture vidéo
-    cap = cv2.VideoCapture(hdmi)
+    # Via le broker de la carte s'il tourne (capture partagée), sinon ouverture directe
+    cap = open_capture(hdmi)
     if not cap.isOpened():
         print("[ERREUR] Impossible d'ouvrir la source vidéo")
         return
@@ -232,76 +269,186 @@ def setup_capture(hdmi, nouveau_fps=None):
     return (cap, frame_rate)
 
 
-def setup_ffmpeg(frame_height, frame_width, frame_rate, video_name):
+# Police de l'horloge incrustée (IVS_OVERLAY_FONT pour la changer) ; si le fichier manque,
+# drawtext s'en remet à fontconfig
+overlay_font = os.environ.get("IVS_OVERLAY_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+
+def drawtext_available():
+    """ Vrai si le ffmpeg du banc a le filtre drawtext (libfreetype) ; vérifié une fois par processus. """
+    if drawtext_available.result is None:
+        try:
+            output = subprocess.run(['ffmpeg', '-hide_banner', '-filters'], capture_output=True, text=True,
+                                    timeout=10).stdout
+            drawtext_available.result = any(line.split()[1:2] == ['drawtext'] for line in output.splitlines())
+        except (OSError, subprocess.TimeoutExpired):
+            drawtext_available.result = False
+        if not drawtext_available.result:
+            logging.warning("ffmpeg sans filtre drawtext : vidéos enregistrées sans horloge incrustée")
+    return drawtext_available.result
+
+drawtext_available.result = None
+
+
+def timestamp_overlay(start_time):
+    """
+    Horloge incrustée par ffmpeg (drawtext) au lieu d'un cv2.putText sur une
+    copie de chaque frame. L'heure affichée est tirée du timestamp de la
+    frame (heure d'arrivée chez ffmpeg, -use_wallclock_as_timestamps, à
+    partir de 0) ajouté à start_time, l'heure de capture de la première
+    frame : un encodeur en retard n'en décale pas l'affichage, contrairement
+    à %{localtime} évalué au moment du filtrage.
+    """
+    font = f"fontfile='{overlay_font}':" if os.path.isfile(overlay_font) else ""
+    return f"drawtext={font}text='%{{pts\\:localtime\\:{start_time:.3f}}}':x=10:y=8:fontsize=30:fontcolor=white"
+
+
+def log_ffmpeg_errors(process, name):
+    """ Erreurs de ffmpeg (-loglevel error) dans le log du test, au lieu de les perdre (à lancer dans un thread). """
+    for line in process.stderr:
+        logging.error(f"ffmpeg {name} : {line.decode(errors='replace').rstrip()}")
+
+
+def setup_ffmpeg(frame_height, frame_width, frame_rate, video_name, encoder_stats=None, segment_ring=None,
+                 start_time=None):
+    """
+    start_time : heure de capture de la première frame qui sera écrite ;
+    à défaut, l'heure du lancement de ffmpeg (frames écrites aussitôt).
+    """
+    # Réglages d'encodage du niveau courant (voir encoder.encoder_settings)
+    level, settings = current_encoder_settings()
+    output_rate = frame_rate / settings["fps_divider"]
     # Commande ffmpeg pour enregistrer la vidéo directement en MP4 avec codec H.264
     ffmpeg_cmd = [
         'ffmpeg',
         '-y',  # overwrite output file if it exists
+        '-nostats',
+        '-loglevel', 'error',  # stderr : seulement les erreurs (filtre invalide, police absente...)
+        '-progress', 'pipe:1',  # vitesse d'encodage lue par EncoderMonitor
         '-f', 'rawvideo',
         '-vcodec', 'rawvideo',
         '-pix_fmt', 'bgr24',
         '-s', f"{frame_height}x{frame_width}",  # taille de l'image
         '-r', f"{frame_rate}",  # taux de capture (FPS)
+        '-use_wallclock_as_timestamps', '1',  # une frame abandonnée ne raccourcit pas la vidéo
         '-i', '-',  # lire les données de stdin
         '-an',  # pas de capture audio
+    ]
+    if drawtext_available():
+        ffmpeg_cmd += ['-vf', timestamp_overlay(time.time() if start_time is None else start_time)]
+    ffmpeg_cmd += [
         '-vcodec', 'libx264',
+        '-preset', settings["preset"],
+        '-crf', f"{settings['crf']}",
+        '-vsync', 'cfr',
+        '-r', f"{output_rate}",
         '-pix_fmt', 'yuv420p',
-        video_name
     ]
+    # En mode anneau, segments courts à la place d'un mp4 unique
+    ffmpeg_cmd += segment_ring.ffmpeg_output_args() if segment_ring is not None else [video_name]
 
-    ffmpeg_process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    ffmpeg_process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    threading.Thread(target=log_ffmpeg_errors, args=(ffmpeg_process, video_name), daemon=True).start()
+    ffmpeg_process.monitor = EncoderMonitor(ffmpeg_process, frame_rate, level, settings["fps_divider"], stats=encoder_stats)
 
     return ffmpeg_process
 
 
-def save_frame(frame, ffmpeg_process, log_f, blackscreen_events, compteur_frames_noires, est_noir):
-    frame_copy = frame.copy()
-    frame_rate = 30
-    seuil_frames_noires = frame_rate * 5  # Seuil pour 5 secondes de frames noires
-    # Ajouter l'heure actuelle à la frame
-    heure_actuelle = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    cv2.putText(frame_copy, heure_actuelle, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-
-    # Envoyer la frame à ffmpeg pour l'enregistrement
-    ffmpeg_process.stdin.write(frame_copy.tobytes())
-
-    # Convertir la frame en niveaux de gris
-    gris = cv2.cvtColor(frame_copy, cv2.COLOR_BGR2GRAY)
-
-    # Vérifier si la frame est noire
-    if np.mean(gris) < 10:  # Ce seuil peut nécessiter un ajustement
-        compteur_frames_noires += 1
-        if compteur_frames_noires >= seuil_frames_noires and not est_noir:
-            est_noir = True
-            temps_event = datetime.now()
-            blackscreen_events.append((temps_event, 'début'))
-            log_f.write(f"{temps_event} - Écran noir détecté pendant plus de 5 secondes\n")
-            print("[DEBUG] Écran noir détecté pendant plus de 5 secondes")
-    else:
-        if est_noir:
-            temps_event = datetime.now()
-            blackscreen_events.append((temps_event, 'fin'))
-            log_f.write(f"{temps_event} - Fin de l'écran noir\n")
-        compteur_frames_noires = 0
-        est_noir = False
-
-    return (compteur_frames_noires, est_noir)
-
-def record_video(video_file, hdmi, log_file, blackscreen_events):
-    cap, frame_rate = setup_capture(hdmi, 10)
-    ffmpeg_process = setup_ffmpeg(int(cap.get(3)), int(cap.get(4)), frame_rate, video_file)
-    # Ouvrir le fichier de log
-    log_f = open(log_file, 'a')
-    compteur_frames_noires = 0
-    est_noir = False
+def close_ffmpeg(ffmpeg_process):
+    """ Termine l'enregistrement et retourne les statistiques de l'encodeur. """
+    if not ffmpeg_process.stdin.closed:
+        ffmpeg_process.stdin.close()
+    ffmpeg_process.wait()
+    return ffmpeg_process.monitor.finish()
+
+
+def write_frame(ffmpeg_process, frame):
+    """ Envoie le buffer de la frame tel quel à ffmpeg (protocole buffer, sans copie). """
+    if not frame.flags['C_CONTIGUOUS']:
+        frame = np.ascontiguousarray(frame)
+    ffmpeg_process.monitor.write(memoryview(frame).cast('B'))
 
-    while cap.isOpened() and not stop_event.is_set():
-        ret, frame = cap.read()
-        if not ret:
-            break
 
-        compteur_frames_noires, est_noir = save_frame(frame, ffmpeg_process, log_f, blackscreen_events, compteur_frames_noires, est_noir)
+def save_frame(frame, ffmpeg_process, black_monitor, capture_time=None):
+    # Envoyer la frame à ffmpeg pour l'enregistrement (l'heure est ajoutée par ffmpeg)
+    write_frame(ffmpeg_process, frame)
 
+    # Détection d'écran noir dans le thread du moniteur
+    black_monitor.submit(frame, capture_time)
+
+
+def record_frames(frames, ffmpeg_process, black_monitor, restart=None):
+    """
+    Consommateur 'enregistrement' d'un CaptureThread, jusqu'à la fin de la
+    capture ou stop_event. Avec restart(ffmpeg_process, heure de capture),
+    un encodeur durablement en retard est remplacé en cours de route par
+    celui que restart retourne. Retourne l'encodeur en service à la fin.
+    """
+    for item in frames:
+        if restart is not None and ffmpeg_process.monitor.needs_lighter_level():
+            ffmpeg_process = restart(ffmpeg_process, item.timestamp)
+        save_frame(item.frame, ffmpeg_process, black_monitor, datetime.fromtimestamp(item.timestamp))
+        if stop_event.is_set():
+            break
+    return ffmpeg_process
+
+def record_video(video_file, hdmi, log_file, blackscreen_events, segment_retention=None):
+    """
+    Enregistre la sortie HDMI jusqu'à stop_event. Avec segment_retention
+    (secondes), la vidéo est écrite en segments dans le dossier
+    <video_file sans extension>/ et seuls les segments autour des
+    incidents (écran noir, changement de PID, rafale de LOG_ERROR) sont
+    gardés, dans son sous-dossier incidents/. Les statistiques de
+    l'encodeur sont tenues à jour dans encoder_stats.
+
+    Un encodeur qui ne tient pas le temps réel est relancé au niveau plus
+    léger suivant (voir encoder.encoder_settings) : la suite est écrite
+    dans <video_file>_<n>.mp4, ou dans une nouvelle liste de segments.
+    """
+    encoder_stats.clear()
+    cap, frame_rate = setup_capture(hdmi, 10)
+    segment_ring = None
+    if segment_retention is not None:
+        segment_ring = SegmentRing(os.path.splitext(video_file)[0], retention=segment_retention).start()
+    # Ouvrir le fichier de log
+    log_f = open(log_file, 'a')
+    black_monitor = BlackScreenMonitor(log_f, blackscreen_events).start()
+
+    # Lecture HDMI dans son propre thread, l'écriture vers ffmpeg ne la ralentit pas
+    capture = CaptureThread(cap)
+    frames = capture.subscribe("enregistrement", maxsize=30)
+    capture.start()
+    base, extension = os.path.splitext(video_file)
+    encoders = []
+    closing = []
+
+    def start_encoder(start_time):
+        name = f"{base}_{len(encoders)}{extension}" if encoders else video_file
+        process = setup_ffmpeg(int(cap.get(3)), int(cap.get(4)), frame_rate, name, encoder_stats, segment_ring,
+                               start_time=start_time)
+        encoders.append(process)
+        return process
+
+    def restart(process, start_time):
+        # Nouvel encodeur lancé avant de finaliser l'ancien (en arrière-plan) : la capture n'attend pas
+        set_level(process.monitor.level + 1)
+        encoder_stats["level_changes"] += 1
+        process.monitor.detach_stats()
+        closer = threading.Thread(target=close_ffmpeg, args=(process,), daemon=True)
+        closer.start()
+        closing.append(closer)
+        return start_encoder(start_time)
+
+    # ffmpeg lancé sur la première frame : son heure de capture ancre l'horloge incrustée
+    first = next(iter(frames), None)
+    ffmpeg_process = start_encoder(first.timestamp if first is not None else None)
+    if first is not None:
+        save_frame(first.frame, ffmpeg_process, black_monitor, datetime.fromtimestamp(first.timestamp))
+        ffmpeg_process = record_frames(frames, ffmpeg_process, black_monitor, restart)
+    capture.stop()
+    capture.log_stats()
+
+    black_monitor.stop()
     log_f.close()
 
     # Attendre 20 secondes supplémentaires après l'arrêt du test
@@ -311,8 +458,11 @@ def record_video(video_file, hdmi, log_file, blackscreen_events):
 
     # Relâcher toutes les ressources une fois le travail terminé
     cap.release()
-    ffmpeg_process.stdin.close()
-    ffmpeg_process.wait()
+    close_ffmpeg(ffmpeg_process)
+    for closer in closing:
+        closer.join()
+    if segment_ring is not None:
+        segment_ring.stop()
 
 
 # Configurer le module logging
@@ -347,3 +497,6 @@ def generate_results_file(os_version_serialnumber, test_name, start_time, durati
             fin = blackscreen_events[i + 1][0] if i + 1 < len(blackscreen_events) else "N/A"
             f.write(f"Début: {debut}, Fin: {fin}\n")
 
+        # Frames retardées ou perdues à l'enregistrement : KPI à vérifier si non nul
+        if encoder_stats:
+            f.write(f"Encoder: {format_encoder_stats(encoder_stats)}\n")